@@ -31,27 +31,57 @@ schema = {
     ],
     'output': {
         'name': 'TABLE_OR_FILE_NAME',
-        'kind': 'sql_csv',  # sql, csv, etc.
+        'kind': 'sql_csv',  # sql, csv, parquet, or arrow (parquet/arrow require `pip install pyarrow`)
         'path': 'DIRECTORY_PATH',
         'driver': 'DB_DRIVER',
         'server': 'DB_SERVER',
         'database': 'DB_DATABASE',
+        # sql output is written in batches, each in its own transaction
+        'batch_size': 1000,  # number of rows written at once
+        'flush_interval': 60,  # also write held rows after this many seconds
+        'fast_executemany': True,  # send each batch as one bulk call (pyodbc only, e.g., SQL Server)
+        # format and write rows from a separate thread, overlapping with the algorithms
+        'background': True,
+        'queue_size': 10000,  # rows waiting to be written (once full, the run waits for the writer)
+        'buffer_size': 1048576,  # bytes held before writing to disk (file output)
+        'row_group_size': 100000,  # parquet/arrow: rows written at once
+        'compression': 'snappy',  # parquet/arrow: codec (default: snappy for parquet, none for arrow)
     },
     'select': {
         'start': 1,
         'end': 200,
         'encoding': 'utf8',
         'filenames': ['FILE_1', 'FILE_2'],  # only these filenames
+        # only process this run's share of the corpus (documents are assigned by name);
+        #  output is named for the shard (or include '{shard}' in the output name)
+        #  combine the output with: python -m apex merge OUTPUT SHARD_OUTPUT [SHARD_OUTPUT ...]
+        'shard': {
+            'index': 0,  # 0 to count - 1
+            'count': 4,
+        },
     },
     'algorithm': {  # see options in apex.algo.__init__.py; remove for all algos
         'names': [
             'ALGORITHM_1',
             'ALGORITHM_2',
-        ]
+        ],
+        'prefilter': True,  # scan for trigger terms first, skip algorithms which cannot apply
     },
     'loginfo': {
         'directory': 'LOG_DIRECTORY',
         'ignore': False,  # ignore writing log information
+        # Matches recorded for the 'matches' column of the log:
+        #  'full' (default): text of each match
+        #  'compact': only names of matched patterns, e.g., iud_expulsion.PARTIAL_EXP (less memory for large documents)
+        #  'off' (default if ignore): nothing
+        'matches': 'full',
+        'background': True,  # as in output
+        'queue_size': 10000,
+        'buffer_size': 1048576,
+        # tsv (default); dedup: tsv which stores each distinct snippet once (in a side file, LOG.snippets),
+        #  read with apex.io.out.iter_log_rows; or parquet/arrow
+        'kind': 'tsv',
+        'row_group_size': 100000,  # as in output
     },
     'skipinfo': {
         # For large datasets, a "SKIP" result can be returned;
@@ -64,6 +94,42 @@ schema = {
     },
     'logger': {
         'verbose': False
+    },
+    'parallel': {  # remove to run in a single process
+        'workers': 4,  # number of worker processes; default is the number of cpus
+        'chunksize': 100,  # number of documents sent to a worker at a time
+    },
+    'regex': {  # remove to use python's `re`
+        # re2: linear-time matching (`pip install google-re2`); unsupported patterns use `re`
+        # regex: `pip install regex`; searches taking longer than `timeout` seconds do not match
+        'engine': 're2',
+        'timeout': 1,  # only for 'regex'
+    },
+    'profile': {  # remove to disable profiling
+        'patterns': True,  # count calls/hits/negation vetoes/time/characters scanned for each pattern
+        'path': 'PATH_TO_FILE',  # optional tsv with a row for each pattern; top patterns are always logged
+    },
+    'cache': {
+        # remember which patterns do not match a sentence for this many distinct sentences,
+        #  so repeated text (copy-forward, boilerplate) is not searched again
+        'sentences': 100000,
+        # sqlite file storing each algorithm's results for each document text; on re-runs,
+        #  only new/changed documents and changed algorithms are evaluated
+        'results': 'PATH_TO_FILE',
+    },
+    'checkpoint': {
+        # journal of progress: if a run is interrupted, re-running the same config resumes
+        #  where it left off, appending to the same output files (only file output supported)
+        'path': 'PATH_TO_FILE',
+        'interval': 1000,  # number of documents between checkpoints
+    },
+    'queue': {
+        # share the corpus among any number of runs (on any machine that can reach this file):
+        #  each run claims chunks of documents until none remain, and writes its own output
+        #  (named for the run); combine the output with: python -m apex merge --queue PATH_TO_FILE OUTPUT
+        'path': 'PATH_TO_FILE',
+        'chunksize': 100,  # number of documents claimed at once
+        'lease': 600,  # seconds before the chunk of a run which stopped responding is reclaimed
     }
 }
 
@@ -0,0 +1,14 @@
+"""
+`apex.run` and `apex.ResultRecord` (see `apex.api`) are only imported when first used,
+    so that importing any other module (e.g., the command line or worker processes)
+    does not also load the runner.
+"""
+
+__all__ = ['run', 'ResultRecord']
+
+
+def __getattr__(name):
+    if name in __all__:
+        from apex import api
+        return getattr(api, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
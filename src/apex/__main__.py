@@ -1,9 +1,29 @@
+"""
+Usage:
+    python -m apex config.py
+    python -m apex stream [--algorithms NAME [NAME ...]] < notes.jsonl > results.jsonl
+    python -m apex merge OUTPUT SHARD_OUTPUT [SHARD_OUTPUT ...]
+    python -m apex serve [--algorithms NAME [NAME ...]] [--port PORT | --unix PATH] [--workers N]
+"""
 import sys
 
-from apex.main import main
+
+def run(argv):
+    if not argv:
+        print(__doc__)
+    elif argv[0] == 'stream':
+        from apex.stream import main as stream
+        stream(argv[1:])
+    elif argv[0] == 'merge':
+        from apex.merge import main as merge
+        merge(argv[1:])
+    elif argv[0] == 'serve':
+        from apex.server import main as serve
+        serve(argv[1:])
+    else:
+        from apex.main import main
+        main(argv[0])
+
 
 if __name__ == '__main__':
-    try:
-        main(sys.argv[1])
-    except IndexError:
-        print('Usage: python -m apex config.py')
+    run(sys.argv[1:])
@@ -1,21 +1,116 @@
-from apex.algo.breastfeeding import confirm_breastfeeding
-from apex.algo.iud_brand import get_iud_brand
-from apex.algo.iud_difficult_insertion import confirm_difficult_insertion
-from apex.algo.iud_expulsion import confirm_iud_expulsion
-from apex.algo.iud_expulsion_rad import confirm_iud_expulsion_rad
-from apex.algo.iud_insertion import confirm_iud_insertion
-from apex.algo.iud_perforation import confirm_iud_perforation
-from apex.algo.iud_removal import confirm_iud_removal
-from apex.algo.parity import get_parity
-
-ALGORITHMS = {
-    'iud_insertion': confirm_iud_insertion,
-    'iud_perforation': confirm_iud_perforation,
-    'iud_brand': get_iud_brand,
-    'iud_difficult_insertion': confirm_difficult_insertion,
-    'iud_removal': confirm_iud_removal,
-    'iud_expulsion': confirm_iud_expulsion,
-    'iud_expulsion_rad': confirm_iud_expulsion_rad,
-    'parity': get_parity,
-    'breastfeeding': confirm_breastfeeding,
-}
+"""
+Registry of algorithms: each module (and the patterns it compiles) is only
+    imported once its algorithm is selected.
+
+External algorithms can be added by installing a package which declares an
+    entry point in the `apex.algorithms` group, e.g., in setup.py:
+
+    entry_points={'apex.algorithms': ['my_algorithm = my_package.my_module:confirm_my_algorithm']}
+
+These are discovered when the registry is first used and, like the built-in
+    algorithms, only imported if selected.
+"""
+import importlib
+import logging
+from collections.abc import Mapping
+
+ENTRY_POINT_GROUP = 'apex.algorithms'
+
+
+def iter_entry_points(group=ENTRY_POINT_GROUP):
+    """
+    Find entry points without importing them
+    :return: iterable of importlib.metadata.EntryPoint
+    """
+    from importlib.metadata import entry_points
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return eps.select(group=group)
+    return eps.get(group, [])  # python < 3.10
+
+
+class AlgorithmRegistry(Mapping):
+    """Lazy mapping of algorithm name -> confirm_* function"""
+
+    def __init__(self, targets, entry_point_group=None):
+        """
+        :param targets: dict of algorithm name -> 'module:function'
+        :param entry_point_group: if included, also register algorithms from these entry points
+        """
+        self._targets = dict(targets)
+        self._loaded = {}
+        self._entry_point_group = entry_point_group
+
+    def register(self, name, target):
+        """
+        :param name: algorithm name
+        :param target: 'module:function' or entry point
+        """
+        self._targets[name] = target
+        self._loaded.pop(name, None)
+
+    def _discover(self):
+        if self._entry_point_group is None:
+            return
+        group, self._entry_point_group = self._entry_point_group, None
+        for entry_point in iter_entry_points(group):
+            if entry_point.name in self._targets:
+                logging.warning(f'Algorithm {entry_point.name} replaced by plugin: {entry_point.value}')
+            self.register(entry_point.name, entry_point)
+
+    def _load(self, target):
+        if not isinstance(target, str):  # entry point
+            return target.load()
+        module_name, func_name = target.split(':')
+        return getattr(importlib.import_module(module_name), func_name)
+
+    def __getitem__(self, name):
+        self._discover()
+        if name not in self._loaded:
+            self._loaded[name] = self._load(self._targets[name])
+        return self._loaded[name]
+
+    def __iter__(self):
+        self._discover()
+        return iter(self._targets)
+
+    def __len__(self):
+        self._discover()
+        return len(self._targets)
+
+    def __contains__(self, name):
+        self._discover()
+        return name in self._targets
+
+    def is_loaded(self, name):
+        return name in self._loaded
+
+    def get_loaded(self):
+        """
+        :return: dict of algorithm name -> function for algorithms already imported
+        """
+        return dict(self._loaded)
+
+
+ALGORITHMS = AlgorithmRegistry({
+    'iud_insertion': 'apex.algo.iud_insertion:confirm_iud_insertion',
+    'iud_perforation': 'apex.algo.iud_perforation:confirm_iud_perforation',
+    'iud_brand': 'apex.algo.iud_brand:get_iud_brand',
+    'iud_difficult_insertion': 'apex.algo.iud_difficult_insertion:confirm_difficult_insertion',
+    'iud_removal': 'apex.algo.iud_removal:confirm_iud_removal',
+    'iud_expulsion': 'apex.algo.iud_expulsion:confirm_iud_expulsion',
+    'iud_expulsion_rad': 'apex.algo.iud_expulsion_rad:confirm_iud_expulsion_rad',
+    'parity': 'apex.algo.parity:get_parity',
+    'breastfeeding': 'apex.algo.breastfeeding:confirm_breastfeeding',
+}, entry_point_group=ENTRY_POINT_GROUP)
+
+
+def get_algorithms(names=None):
+    """
+    Import the selected algorithms (only these are loaded)
+    :param names: algorithm names; default: all
+    :return: dict of algorithm name -> confirm_* function
+    """
+    for name in set(names or ()) - set(ALGORITHMS):
+        logging.warning(f'Unrecognized algorithm (not built-in or installed plugin): {name}')
+    return {x: ALGORITHMS[x] for x in ALGORITHMS if not names or x in names}
@@ -166,6 +166,8 @@ WHOLE_MILK = Pattern(r'('
                      negates=[r'\bwean\b', 'breast', r'\btry\b', r'\bserve\b', r'\byou\b', 'patient',
                               r'Teaching/Guidance\W*:', r'Discussed\W*:', r'provided\W*:', r'meals\W*standard'])
 AGO = Pattern(r'\bago\b')
+# only sections with ANY_BREAST and sentences with BF_FEEDING_CPT produce results
+TRIGGERS = (ANY_BREAST, BF_FEEDING_CPT)
 
 
 class BreastfeedingStatus(Status):
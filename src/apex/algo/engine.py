@@ -0,0 +1,208 @@
+"""
+Regular expression engines used to compile Patterns (and their negations).
+
+* re: standard library (default)
+* re2: linear-time matching (`pip install google-re2`); patterns relying on
+    constructs which re2 does not support (e.g., lookarounds, backreferences)
+    and text which re2 would treat differently (non-ascii) use `re` instead
+* regex: `regex` package (`pip install regex`) with an optional timeout (in seconds)
+    on each search; a search which times out is treated as not matching
+
+re2 and regex are only imported when selected (see `get_engine`).
+
+Compiled objects provide the parts of `re.Pattern` used by Pattern:
+    `search(text, pos, endpos)`, `sub(repl, text)`, `pattern`, and `flags`.
+"""
+import logging
+import re
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # python < 3.11
+    import sre_parse
+    import sre_constants
+
+# re2 and re agree on this text: re2's \w, \b, \s, and case folding are ascii-only,
+#   and python's \s also includes \v and \x1c-\x1f
+UNSAFE_FOR_RE2 = re.compile(r'[^\t\n\r\x0c\x20-\x7e]')
+# python allows omitting the lower bound of a repeat; re2 reads it as literal text
+MISSING_LOWER_BOUND = re.compile(r'(?<!\\)\{,(\d+)\}')
+
+
+class Engine:
+    """Standard library `re`"""
+    name = 're'
+
+    def __init__(self, timeout=None):
+        """
+        :param timeout: ignored (only used by `regex`)
+        """
+        self.fallbacks = []  # patterns compiled with `re` instead
+
+    def compile(self, pattern, flags=0):
+        return re.compile(pattern, flags)
+
+    def config(self):
+        """
+        :return: kwargs for `get_engine` to build an identical engine
+        """
+        return {'engine': self.name}
+
+
+class Re2Engine(Engine):
+    name = 're2'
+
+    def __init__(self, timeout=None):
+        try:
+            import re2
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError('Need to install `google-re2`.')
+        super().__init__()  # no timeout: re2 runs in linear time
+        self.re2 = re2
+
+    def compile(self, pattern, flags=0):
+        translated = _translate_for_re2(pattern, flags)
+        if translated is not None:
+            options = self.re2.Options()
+            options.log_errors = False
+            try:
+                return Re2Regex(pattern, flags, self.re2.compile(translated, options))
+            except self.re2.error:
+                pass
+        logging.debug(f'Regex not supported by re2, using re: {pattern}')
+        self.fallbacks.append(pattern)
+        return re.compile(pattern, flags)
+
+
+class RegexEngine(Engine):
+    name = 'regex'
+
+    def __init__(self, timeout=None):
+        try:
+            import regex
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError('Need to install `regex`.')
+        super().__init__()
+        self.regex = regex
+        self.timeout = timeout
+
+    def compile(self, pattern, flags=0):
+        try:
+            return TimeoutRegex(pattern, flags, self.regex.compile(pattern, flags), self.timeout)
+        except self.regex.error:
+            logging.debug(f'Regex not supported by regex, using re: {pattern}')
+            self.fallbacks.append(pattern)
+            return re.compile(pattern, flags)
+
+    def config(self):
+        return {'engine': self.name, 'timeout': self.timeout}
+
+
+ENGINES = {
+    Engine.name: Engine,
+    Re2Engine.name: Re2Engine,
+    RegexEngine.name: RegexEngine,
+}
+
+
+def get_engine(engine='re', **options):
+    """
+    :param engine: re, re2, or regex
+    :param options: engine-specific (e.g., timeout for regex)
+    :return: Engine
+    """
+    try:
+        return ENGINES[engine](**options)
+    except KeyError:
+        raise ValueError(f'Unrecognized regular expression engine: {engine}')
+
+
+def _has_op(parsed, op, av=None):
+    """Look for an opcode (with the specified argument) anywhere in a parsed regex"""
+    for item_op, item_av in parsed:
+        if item_op is op and (av is None or item_av is av):
+            return True
+        stack = [item_av]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, sre_parse.SubPattern):
+                if _has_op(value, op, av):
+                    return True
+            elif isinstance(value, (tuple, list)):
+                stack.extend(value)
+    return False
+
+
+def _translate_for_re2(pattern, flags):
+    """
+    :return: equivalent pattern for re2 or None if flags/constructs differ
+    """
+    if flags & ~(re.IGNORECASE | re.DOTALL | re.MULTILINE | re.UNICODE):
+        return None
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return None
+    # re's `$` also matches before a trailing newline
+    if not flags & re.MULTILINE and _has_op(parsed, sre_constants.AT, sre_constants.AT_END):
+        return None
+    inline = ''.join(flag for value, flag in ((re.IGNORECASE, 'i'), (re.DOTALL, 's'), (re.MULTILINE, 'm'))
+                     if flags & value)
+    pattern = MISSING_LOWER_BOUND.sub(r'{0,\1}', pattern)
+    return f'(?{inline}){pattern}' if inline else pattern
+
+
+def _is_safe_for_re2(text, pos, endpos):
+    # include the characters on either side: they determine \b at the edges
+    return not UNSAFE_FOR_RE2.search(text, max(pos - 1, 0), endpos + 1)
+
+
+class Re2Regex:
+    """re2 for text on which it matches the same as re; otherwise re"""
+
+    def __init__(self, pattern, flags, compiled):
+        self.pattern = pattern
+        self.flags = flags
+        self._re2 = compiled
+        self._re = None  # only compiled if needed
+
+    def _get_re(self):
+        if self._re is None:
+            self._re = re.compile(self.pattern, self.flags)
+        return self._re
+
+    def search(self, text, pos=0, endpos=None):
+        if endpos is None:
+            endpos = len(text)
+        if _is_safe_for_re2(text, pos, endpos):
+            return self._re2.search(text, pos, endpos)
+        return self._get_re().search(text, pos, endpos)
+
+    def sub(self, repl, text):
+        if isinstance(repl, str) and '\\' not in repl and _is_safe_for_re2(text, 0, len(text)):
+            return self._re2.sub(repl, text)
+        return self._get_re().sub(repl, text)
+
+
+class TimeoutRegex:
+    """`regex` compiled pattern which gives up after `timeout` seconds"""
+
+    def __init__(self, pattern, flags, compiled, timeout=None):
+        self.pattern = pattern
+        self.flags = flags
+        self._regex = compiled
+        self.timeout = timeout
+
+    def search(self, text, pos=0, endpos=None):
+        try:
+            return self._regex.search(text, pos, endpos, timeout=self.timeout)
+        except TimeoutError:
+            logging.warning(f'Regex timed out after {self.timeout}s: {self.pattern}')
+            return None
+
+    def sub(self, repl, text):
+        try:
+            return self._regex.sub(repl, text, timeout=self.timeout)
+        except TimeoutError:
+            logging.warning(f'Regex timed out after {self.timeout}s: {self.pattern}')
+            return text
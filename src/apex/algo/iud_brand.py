@@ -23,6 +23,8 @@ SCHEDULED = Pattern(r'schedul\w+', negates=['today'])
 USING = Pattern(r'(ha[sd]|us(es?|ing)|insert(ed|ion)|iud type|contracepti(on|ve)|in (situ|place)|(re)?placed)',
                 negates=['(expel|remove)'])
 EXCLUDE = Pattern(r'(counsel|consent form|friends?|booklet)')
+# otherwise, only SKIP is returned (which is not yielded)
+TRIGGERS = (EXCLUDE,) + IUD
 
 
 class BrandStatus(Status):
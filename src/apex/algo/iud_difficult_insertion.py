@@ -77,6 +77,8 @@ PARACERV = Pattern(r'(\blido\b|hurricane|\w+caine\b|paracervical block)',
                    negates=[negation])
 MISOPROSTOL = Pattern(r'(cytotec|misoprost[aoi]l|\bmiso\b)',
                       negates=[negation, 'lack of', 'not done'])
+# otherwise, only SKIP is returned (which is not yielded)
+TRIGGERS = (NOT_IUD_INSERTION, IUD)
 
 
 class DiffInsStatus(Status):
@@ -105,13 +105,20 @@ class ExpulsionStatus(Status):
     SKIP = 99
 
 
+TRIGGERS = (IUD,)
+
+
+def spare(document: Document, expected=None):
+    yield Result(ExpulsionStatus.SKIP, ExpulsionStatus.SKIP.value, expected)
+
+
 def confirm_iud_expulsion(document: Document, expected=None):
     for status, history, text in determine_iud_expulsion(document):
         yield Result(status, status.value, expected, text, extras=ExpulsionStatus.HISTORY if history else None)
 
 
 def determine_iud_expulsion(document: Document):
-    if document.has_patterns(IUD):
+    if document.has_patterns(*TRIGGERS):
         for section in document.select_sentences_with_patterns(IUD):
             history = bool(section.has_patterns(PREVIOUS))
             if section.has_patterns(INCORRECT, PLACEMENT, has_all=True) or \
@@ -33,6 +33,7 @@ DATE = Pattern(r'(\d{1,2}/\d{1,2}|january|february|march|'
                r'april|may|june|july|august|sept(ember)?|october|november|december|20\d{2})',
                negates=[r'\b(exp|expires?)'])
 NEGATED = Pattern(r'not\W*inserted')
+TRIGGERS = (IUD,)
 
 
 def classify_result(res: InsertionStatus):
@@ -51,6 +52,10 @@ def classify_result(res: InsertionStatus):
     return 0
 
 
+def spare(document: Document, expected=None):
+    yield Result(InsertionStatus.NO_MENTION, classify_result(InsertionStatus.NO_MENTION), expected)
+
+
 def confirm_iud_insertion(document: Document, expected=None):
     value, text = determine_iud_insertion(document)
     res = classify_result(value)
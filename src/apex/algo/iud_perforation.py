@@ -47,6 +47,8 @@ LAPAROSCOPIC_REMOVAL = Pattern(r'('
 # iud visible [in cervix] == partial
 #  [in vagina] == complete
 ALL = (COMPLETE, PERFORATION, EMBEDDED, MIGRATED, LAPAROSCOPIC_REMOVAL)
+# otherwise, only SKIP is returned (which is not yielded)
+TRIGGERS = ALL
 
 
 class PerforationStatus(Status):
@@ -69,7 +71,7 @@ def confirm_iud_perforation(document: Document, expected=None):
 
 
 def determine_iud_perforation(document: Document):
-    if document.has_patterns(*ALL, ignore_negation=True):
+    if document.has_patterns(*TRIGGERS, ignore_negation=True):
         # see if any sentences that contain "IUD" also contain perf/embedded
         for section in document.select_sentences_with_patterns(IUD):
             date = section.get_pattern(DATE_PAT)
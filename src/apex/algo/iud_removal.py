@@ -29,6 +29,8 @@ TOOL = Pattern(r'((ring )?forceps?|hook|fashion|(alligator )? clamp|'
 PLAN = Pattern(r'\brem intrauterine device\b',
                negates=[])
 ALL = (REMOVE, DEF_REMOVE, PROB_REMOVE, DEF_REPLACE, TOOL, PLAN)
+# otherwise, only SKIP is returned (which is not yielded)
+TRIGGERS = ALL
 
 
 class RemoveStatus(Status):
@@ -48,7 +50,7 @@ def confirm_iud_removal(document: Document, expected=None):
 
 
 def determine_iud_removal(document: Document):
-    if document.has_patterns(*ALL, ignore_negation=True):
+    if document.has_patterns(*TRIGGERS, ignore_negation=True):
         section_text = []
         for section in document.select_sentences_with_patterns(IUD):
             if section.has_pattern(REMOVE_BY):
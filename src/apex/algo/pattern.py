@@ -1,12 +1,100 @@
+import hashlib
+import importlib
+import itertools
+import logging
+import pkgutil
 import re
+import sys
+import weakref
+from array import array
+from collections import OrderedDict
 from copy import copy
 
+from apex.algo.engine import Engine, get_engine
+
+# compiled negations shared by all Patterns: (pattern, flags) -> compiled
+_NEGATIONS = {}
+# every Pattern, so that all can be recompiled when the engine changes
+_PATTERNS = weakref.WeakSet()
+_ENGINE = Engine()
+# incremented whenever patterns are recompiled (invalidates cached results)
+_PATTERN_VERSION = 0
+# optional SentenceCache shared by all documents
+_SENTENCE_CACHE = None
+# Pattern -> stable name (see `get_pattern_name`)
+_PATTERN_NAMES = weakref.WeakKeyDictionary()
+
+
+def compile_negation(negate, flags):
+    """Intern negation regexes: most Patterns share the same few"""
+    key = (negate, flags)
+    if key not in _NEGATIONS:
+        _NEGATIONS[key] = _ENGINE.compile(negate, flags)
+    return _NEGATIONS[key]
+
+
+def get_regex_engine():
+    return _ENGINE
+
+
+def set_regex_engine(engine='re', **options):
+    """
+    Compile all Patterns (existing and future) with a different engine
+    :param engine: see `apex.algo.engine.get_engine`
+    :param options:
+    """
+    global _ENGINE, _PATTERN_VERSION
+    _ENGINE = get_engine(engine, **options)
+    _PATTERN_VERSION += 1
+    _NEGATIONS.clear()
+    for pat in list(_PATTERNS):
+        pat.compile()
+    if _ENGINE.fallbacks:
+        logging.info(f'Using re for {len(_ENGINE.fallbacks)} patterns not supported by {_ENGINE.name}')
+
+
+def get_pattern_name(pat):
+    """
+    Name a Pattern by where it is defined, which (unlike `Pattern.id`) is the same in
+        every process and run
+    :return: 'module.VARIABLE' (e.g., 'iud_expulsion.PARTIAL_EXP'), or 'module.<digest of pattern>'
+        if not assigned to a variable of its module
+    """
+    name = _PATTERN_NAMES.get(pat)
+    if name is None:
+        module_name = pat.module or ''
+        short_name = module_name.rsplit('.', 1)[-1]
+        module = sys.modules.get(module_name)
+        for var, value in (vars(module).items() if module else ()):
+            if isinstance(value, Pattern) and value.module == module_name and value not in _PATTERN_NAMES:
+                _PATTERN_NAMES[value] = f'{short_name}.{var}'
+        if pat not in _PATTERN_NAMES:
+            digest = hashlib.blake2b(f'{pat.flags}:{pat.text}'.encode('utf8'), digest_size=4).hexdigest()
+            _PATTERN_NAMES[pat] = f'{short_name}.<{digest}>'
+        name = _PATTERN_NAMES[pat]
+    return name
+
+
+def get_pattern_names():
+    """
+    Name each Pattern defined in the `apex.algo` modules (or in a loaded plugin's module)
+        by where it is defined (see `get_pattern_name`)
+    :return: dict of Pattern -> 'module.VARIABLE' (e.g., 'iud_expulsion.PARTIAL_EXP')
+    """
+    import apex.algo
+    for module_info in pkgutil.iter_modules(apex.algo.__path__):
+        importlib.import_module(f'{apex.algo.__name__}.{module_info.name}')
+    module_names = {name for name in sys.modules if name.startswith(f'{apex.algo.__name__}.')}
+    module_names |= {func.__module__ for func in apex.algo.ALGORITHMS.get_loaded().values()}
+    return {pat: get_pattern_name(pat) for pat in list(_PATTERNS) if pat.module in module_names}
+
 
 class Match:
 
-    def __init__(self, match, groups=None):
+    def __init__(self, match, groups=None, pattern=None):
         self.match = match
         self._groups = groups
+        self.pattern = pattern
 
     def group(self, *index):
         if not self._groups or not index or len(index) == 1 and index[0] == 0:
@@ -32,6 +120,7 @@ class Match:
 
 
 class Pattern:
+    _ids = itertools.count()
 
     def __init__(self, pattern, negates=None, space_replace=r'\W*',
                  capture_length=None,
@@ -49,27 +138,59 @@ class Pattern:
         """
         if space_replace:
             pattern = space_replace.join(pattern.split(' '))
-        self.pattern = re.compile(pattern, flags)
-        self.negates = []
-        for negate in negates or []:
-            if space_replace:
-                negate = space_replace.join(negate.split(' '))
-            self.negates.append(re.compile(negate, flags))
+            negates = [space_replace.join(negate.split(' ')) for negate in negates or []]
+        self.text = pattern
+        self.flags = flags
+        self.negate_texts = negates or []
         self.capture_length = capture_length
-        self.text = self.pattern.pattern
+        self.id = next(self._ids)  # used to record matches compactly
+        self.module = sys._getframe(1).f_globals.get('__name__')  # where defined, for naming
+        self.compile()
+        _PATTERNS.add(self)
+
+    def compile(self):
+        """Compile (or recompile) with the current regex engine"""
+        self.pattern = _ENGINE.compile(self.text, self.flags)
+        self.negates = []
+        for negate in self.negate_texts:
+            negate = compile_negation(negate, self.flags)
+            if negate not in self.negates:
+                self.negates.append(negate)
 
     def __str__(self):
         return self.text
 
-    def matches(self, text, ignore_negation=False):
-        m = self.pattern.search(text)
+    def matches(self, text, ignore_negation=False, negation_cache=None, pos=0, endpos=None):
+        """
+
+        :param text:
+        :param ignore_negation:
+        :param negation_cache: dict shared by patterns (e.g., for a document)
+            to remember whether each negation occurs in `text`
+        :param pos: only search text[pos:endpos] (without copying it)
+        :param endpos:
+        :return: Match or False
+        """
+        if endpos is None:
+            endpos = len(text)
+        m = self.pattern.search(text, pos, endpos)
         if m:
-            if not ignore_negation:
-                for negate in self.negates:
-                    if negate.search(text):
-                        return False
+            if not ignore_negation and self.negates and self._is_negated(text, negation_cache, pos, endpos):
+                return False
+            return Match(m, groups=self._compress_groups(m), pattern=self)
+        return False
 
-            return Match(m, groups=self._compress_groups(m))
+    def _is_negated(self, text, negation_cache=None, pos=0, endpos=None):
+        for negate in self.negates:
+            if negation_cache is None:
+                negated = negate.search(text, pos, endpos)
+            else:
+                key = (negate, pos, endpos, text)
+                negated = negation_cache.get(key)
+                if negated is None:
+                    negated = negation_cache[key] = bool(negate.search(text, pos, endpos))
+            if negated:
+                return True
         return False
 
     def _compress_groups(self, m):
@@ -94,6 +215,43 @@ class Pattern:
         return self.pattern.sub(repl, text)
 
 
+def iter_lines(text, start=0, end=None):
+    """
+    Same lines as `[x for x in text[start:end].split('\n') if x.strip()]`
+    :return: iterator of (start, end) offsets of each line
+    """
+    if end is None:
+        end = len(text)
+    while start <= end:
+        newline = text.find('\n', start, end)
+        if newline == -1:
+            newline = end
+        if NON_BLANK.search(text, start, newline):
+            yield start, newline
+        start = newline + 1
+
+
+NON_BLANK = re.compile(r'\S')
+
+
+# how much of each match to keep for the log
+RECORD_OFF = 'off'  # nothing
+RECORD_COMPACT = 'compact'  # (pattern id, start, end); logged as names of matched patterns
+RECORD_FULL = 'full'  # Match objects
+
+
+class LoggedMatch:
+    """Stands in for a Match which is only known as logged (see `MatchCask.add_labels`)"""
+
+    __slots__ = ['label']
+
+    def __init__(self, label):
+        self.label = label
+
+    def group(self, *index):
+        return self.label
+
+
 class MatchCask:
 
     def __init__(self):
@@ -105,6 +263,29 @@ class MatchCask:
     def add_all(self, matches):
         self.matches += matches
 
+    def add_cask(self, other):
+        self.add_all(other.matches)
+
+    def mark(self):
+        """
+        :return: position after the matches so far (see `get_labels`)
+        """
+        return len(self.matches)
+
+    def get_labels(self, start=0):
+        """
+        :param start: from `mark`, to only include later matches
+        :return: list of each match as logged (e.g., for the result cache)
+        """
+        return [m.group() for m in self.matches[start:]]
+
+    def add_labels(self, labels):
+        """
+        Add matches as logged, e.g., when replaying cached results
+        :param labels: from `get_labels`
+        """
+        self.add_all([LoggedMatch(label) for label in labels])
+
     def copy(self):
         mc = MatchCask()
         mc.matches = copy(self.matches)
@@ -117,12 +298,313 @@ class MatchCask:
         return str(set(m.group() for m in self.matches))
 
 
+class CompactMatchCask(MatchCask):
+    """
+    Keep only (pattern id, start, end) of each match in a flat array
+        rather than the Match (and the text it references)
+
+    Logged as the names of the matched patterns (see `get_pattern_name`): ids depend
+        on which modules have been imported (and in what order) in each process
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.spans = array('l')
+        self.patterns = {}  # pattern id -> Pattern
+        self.labels = set()  # names of patterns from `add_labels`
+
+    def add(self, m):
+        pattern_id = m.pattern.id if m.pattern is not None else -1
+        self.spans.extend((pattern_id, m.match.start(), m.match.end()))
+        self.patterns[pattern_id] = m.pattern
+
+    def add_all(self, matches):
+        for m in matches:
+            self.add(m)
+
+    def add_cask(self, other):
+        if isinstance(other, CompactMatchCask):
+            self.spans.extend(other.spans)
+            self.patterns.update(other.patterns)
+            self.labels |= other.labels
+        else:
+            self.add_all(other.matches)
+
+    def copy(self):
+        mc = CompactMatchCask()
+        mc.add_cask(self)
+        return mc
+
+    def iter_spans(self):
+        """
+        :return: iterator of (pattern id, start, end); see `patterns` for each id's Pattern
+        """
+        return zip(*[iter(self.spans)] * 3)
+
+    def mark(self):
+        return len(self.spans) // 3
+
+    def get_labels(self, start=0):
+        """
+        :return: sorted names of patterns matched from `start` (see `mark`)
+        """
+        names = set()
+        for pattern_id in self.spans[3 * start::3]:
+            pat = self.patterns[pattern_id]
+            names.add('?' if pat is None else get_pattern_name(pat))
+        return sorted(names)
+
+    def add_labels(self, labels):
+        self.labels.update(labels)
+
+    def get_names(self):
+        """
+        :return: sorted names of matched patterns
+        """
+        return sorted({'?' if pat is None else get_pattern_name(pat) for pat in self.patterns.values()}
+                      | self.labels)
+
+    def __repr__(self):
+        # bounded by the number of patterns rather than the number of matches
+        return '{' + ', '.join(self.get_names()) + '}'
+
+    def __str__(self):
+        return repr(self)
+
+
+class NullMatchCask(MatchCask):
+    """Discard matches"""
+
+    def add(self, m):
+        pass
+
+    def add_all(self, matches):
+        pass
+
+    def add_cask(self, other):
+        pass
+
+    def mark(self):
+        return 0
+
+    def get_labels(self, start=0):
+        return []
+
+    def add_labels(self, labels):
+        pass
+
+    def copy(self):
+        return NullMatchCask()
+
+    def __repr__(self):
+        return ''
+
+    def __str__(self):
+        return ''
+
+
+_MATCH_CASKS = {
+    RECORD_OFF: NullMatchCask,
+    RECORD_COMPACT: CompactMatchCask,
+    RECORD_FULL: MatchCask,
+}
+
+
+def new_match_cask(recording=RECORD_FULL):
+    """
+    :param recording: RECORD_OFF, RECORD_COMPACT, or RECORD_FULL
+    :return: empty MatchCask for this level of recording
+    """
+    try:
+        return _MATCH_CASKS[recording or RECORD_FULL]()
+    except KeyError:
+        raise ValueError(f'Unrecognized recording level for matches: {recording}')
+
+
+class SentenceCache:
+    """
+    Bounded (least recently used) record across documents of which patterns
+        have been evaluated on, and which matched, a sentence.
+
+    Repeated sentences (e.g., copy-forward text or boilerplate) can then answer
+        `has_pattern` without running a regex when the pattern is known not to match
+        (a known match is searched again to get the Match).
+
+    Keyed by a digest of the sentence text, whether the sentence begins its buffer
+        (which changes `^` and lookbehinds), and the pattern version.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # key -> [evaluated bits, hit bits]
+        self.sentences = 0  # sentences looked up
+        self.repeated = 0  # ...which had been seen before
+        self.queries = 0  # (pattern, sentence) evaluations
+        self.answered = 0  # ...answered without a regex
+        self.evictions = 0
+
+    def get_entry(self, sentence):
+        """
+        :param sentence: Sentence
+        :return: [evaluated bits, hit bits], shared with all sentences with the same text
+        """
+        key = (_PATTERN_VERSION, sentence.start == 0,
+               hashlib.blake2b(sentence.text.encode('utf8'), digest_size=16).digest())
+        self.sentences += 1
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [0, 0]
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.entries.move_to_end(key)
+            self.repeated += 1
+        return entry
+
+    def search(self, entry, pat, sentence, ignore_negation=False):
+        """
+        Same as `sentence.search(pat, ignore_negation)`
+        :param entry: from `get_entry(sentence)`
+        """
+        bit = 1 << (2 * pat.id + ignore_negation)
+        self.queries += 1
+        if entry[0] & bit and not entry[1] & bit:
+            self.answered += 1
+            return False
+        m = sentence.search(pat, ignore_negation=ignore_negation)
+        entry[0] |= bit
+        if m:
+            entry[1] |= bit
+        return m
+
+    def get_stats(self):
+        return {
+            'sentences': self.sentences, 'repeated': self.repeated,
+            'queries': self.queries, 'answered': self.answered, 'evictions': self.evictions,
+        }
+
+    def update(self, stats):
+        """Add counts (e.g., from another process)"""
+        for name, value in stats.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def clear_stats(self):
+        self.update({name: -value for name, value in self.get_stats().items()})
+
+    def __str__(self):
+        return (f'{self.answered}/{self.queries} pattern evaluations answered from cache'
+                f' ({self.answered / self.queries if self.queries else 0:.1%});'
+                f' {self.repeated}/{self.sentences} sentences repeated'
+                f' ({self.repeated / self.sentences if self.sentences else 0:.1%});'
+                f' {self.evictions} evictions')
+
+
+def set_sentence_cache(maxsize=None):
+    """
+    :param maxsize: number of distinct sentences to remember; None/0 to disable
+    :return: SentenceCache or None
+    """
+    global _SENTENCE_CACHE
+    _SENTENCE_CACHE = SentenceCache(maxsize) if maxsize else None
+    return _SENTENCE_CACHE
+
+
+def get_sentence_cache():
+    return _SENTENCE_CACHE
+
+
+class HitIndex:
+    """
+    Lazily filled index of which sentences match which patterns so that each
+        (pattern, sentence) pair is evaluated at most once per document.
+
+    For each (pattern, ignore_negation), two bitsets (one bit per sentence) record
+        which sentences have been evaluated and which of those matched.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.all = (1 << size) - 1
+        self.evaluated = {}
+        self.hits = {}
+        self.found = {}  # (pattern, ignore_negation, sentence index) -> Match
+        self.cache = _SENTENCE_CACHE
+        self.entries = [None] * size if self.cache else None  # cache entry for each sentence
+
+    def _lookup(self, key, bit):
+        """
+        :return: None if not yet evaluated, else Match or False
+        """
+        if self.evaluated.get(key, 0) & bit:
+            if self.hits[key] & bit:
+                return self.found[key + (bit.bit_length() - 1,)]
+            return False
+        return None
+
+    def matches(self, pat, sentence, ignore_negation=False):
+        """
+        Same as `sentence.search(pat, ignore_negation)`
+        """
+        key = (pat, ignore_negation)
+        idx = sentence.idx
+        bit = 1 << idx
+        m = self._lookup(key, bit)
+        if m is not None:
+            return m
+        # negation can only remove matches
+        m = self._lookup((pat, not ignore_negation), bit)
+        if m is None or (m and not ignore_negation) or (not m and ignore_negation):
+            m = self._search(pat, sentence, ignore_negation)
+        self.evaluated[key] = self.evaluated.get(key, 0) | bit
+        if m:
+            self.hits[key] = self.hits.get(key, 0) | bit
+            self.found[key + (idx,)] = m
+        else:
+            self.hits.setdefault(key, 0)
+        return m
+
+    def _search(self, pat, sentence, ignore_negation=False):
+        if self.cache is None:
+            return sentence.search(pat, ignore_negation=ignore_negation)
+        entry = self.entries[sentence.idx]
+        if entry is None:
+            entry = self.entries[sentence.idx] = self.cache.get_entry(sentence)
+        return self.cache.search(entry, pat, sentence, ignore_negation=ignore_negation)
+
+    def first_hit(self, pat, ignore_negation=False):
+        """
+        :return: index of the first matching sentence; None if none match;
+            False if this cannot be answered without evaluating more sentences
+        """
+        key = (pat, ignore_negation)
+        evaluated = self.evaluated.get(key, 0)
+        hits = self.hits.get(key, 0)
+        if hits and (evaluated & ((hits & -hits) - 1)) == (hits & -hits) - 1:
+            # all sentences before the first hit have been evaluated
+            return (hits & -hits).bit_length() - 1
+        if evaluated == self.all and not hits:
+            return None
+        return False
+
+
 class Sentences:
 
-    def __init__(self, text, matches):
-        self.sentences = [Sentence(x, matches) for x in text.split('\n') if x.strip()]
+    def __init__(self, text, matches, negation_cache=None):
+        spans = list(iter_lines(text))
+        self.index = HitIndex(len(spans))
+        self.sentences = [Sentence(text, matches, start, end, index=self.index, idx=i,
+                                   negation_cache=negation_cache)
+                          for i, (start, end) in enumerate(spans)]
 
     def has_pattern(self, pat, ignore_negation=False):
+        i = self.index.first_hit(pat, ignore_negation=ignore_negation)
+        if i is None:
+            return False
+        elif i is not False:
+            sentence = self.sentences[i]
+            sentence.has_pattern(pat, ignore_negation=ignore_negation)  # record match
+            return sentence.text
         for sentence in self.sentences:
             if sentence.has_pattern(pat, ignore_negation=ignore_negation):
                 return sentence.text
@@ -154,13 +636,54 @@ class Sentences:
 
 
 class Sentence:
+    """
+    A line of text, stored as offsets into a (shared) text buffer.
 
-    def __init__(self, text, mc: MatchCask = None):
-        self.text = text
+    Patterns are searched with `pos`/`endpos` rather than on a copy of the line:
+        sentences are preceded by a newline (or a section header), so lookbehinds
+        on words and word boundaries behave as they would on the copy.
+    """
+
+    __slots__ = ['buffer', 'start', 'end', 'matches', 'index', 'idx', 'negation_cache']
+
+    def __init__(self, buffer, mc: MatchCask = None, start=0, end=None, index=None, idx=None,
+                 negation_cache=None):
+        """
+
+        :param buffer: text containing this sentence
+        :param mc:
+        :param start: offset of sentence in buffer
+        :param end:
+        :param index: HitIndex, if part of a Document's Sentences
+        :param idx: number of the sentence in the index
+        :param negation_cache: see Pattern.matches
+        """
+        self.buffer = buffer
+        self.start = start
+        self.end = len(buffer) if end is None else end
         self.matches = mc or MatchCask()
+        self.index = index
+        self.idx = idx
+        self.negation_cache = negation_cache
+
+    @property
+    def text(self):
+        if self.start == 0 and self.end == len(self.buffer):
+            return self.buffer
+        return self.buffer[self.start:self.end]
+
+    def search(self, pat, ignore_negation=False):
+        return pat.matches(self.buffer, ignore_negation=ignore_negation,
+                           negation_cache=self.negation_cache,
+                           pos=self.start, endpos=self.end)
+
+    def _matches(self, pat, ignore_negation=False):
+        if self.index is None:
+            return self.search(pat, ignore_negation=ignore_negation)
+        return self.index.matches(pat, self, ignore_negation=ignore_negation)
 
     def has_pattern(self, pat, ignore_negation=False):
-        m = pat.matches(self.text, ignore_negation=ignore_negation)
+        m = self._matches(pat, ignore_negation=ignore_negation)
         if m:
             self.matches.add(m)
         return bool(m)
@@ -174,7 +697,7 @@ class Sentence:
         return has_all
 
     def get_pattern(self, pat, index=0):
-        m = pat.matches(self.text)
+        m = self._matches(pat)
         if m:
             self.matches.add(m)
             return m.group(index)
@@ -183,29 +706,63 @@ class Sentence:
 
 class Section:
 
-    def __init__(self, sentences, mc: MatchCask = None, add_matches=False):
+    def __init__(self, sentences, mc: MatchCask = None, add_matches=False, negation_cache=None):
         """
 
         :param sentences:
         :param mc:
         :param add_matches: use if you are copying data rather than
             passing around the same match object (default)
+        :param negation_cache: see Pattern.matches
         """
         self.sentences = sentences
-        self.text = '\n'.join(sent.text for sent in sentences)
+        self.negation_cache = negation_cache
+        self.span = self._get_span(sentences)
+        self._text = None
         self.matches = mc or MatchCask()
         if add_matches:
             for sent in self.sentences:
-                self.matches.add_all(sent.matches.matches)
+                self.matches.add_cask(sent.matches)
+
+    @staticmethod
+    def _get_span(sentences):
+        """
+        If sentences are adjacent lines in the same buffer, the section text
+            is just a slice of that buffer
+        :return: (buffer, start, end) or None
+        """
+        if not sentences:
+            return None
+        for prev, sent in zip(sentences, sentences[1:]):
+            if sent.buffer is not prev.buffer or sent.start != prev.end + 1:
+                return None
+        return sentences[0].buffer, sentences[0].start, sentences[-1].end
+
+    @property
+    def text(self):
+        if self._text is None:
+            if self.span:
+                buffer, start, end = self.span
+                self._text = buffer[start:end]
+            else:
+                self._text = '\n'.join(sent.text for sent in self.sentences)
+        return self._text
+
+    def _matches(self, pat, ignore_negation=False):
+        if self.span:
+            buffer, start, end = self.span
+            return pat.matches(buffer, ignore_negation=ignore_negation, negation_cache=self.negation_cache,
+                               pos=start, endpos=end)
+        return pat.matches(self.text, ignore_negation=ignore_negation, negation_cache=self.negation_cache)
 
     def has_pattern(self, pat, ignore_negation=False):
-        m = pat.matches(self.text, ignore_negation=ignore_negation)
+        m = self._matches(pat, ignore_negation=ignore_negation)
         if m:
             self.matches.add(m)
         return bool(m)
 
     def get_pattern(self, pat, index=0):
-        m = pat.matches(self.text)
+        m = self._matches(pat)
         if m:
             self.matches.add(m)
             return m.group(index)
@@ -237,10 +794,13 @@ class Section:
         return has_all
 
     def __bool__(self):
-        return len(self.sentences) > 0 and bool(self.text.strip())
+        # sentences are never blank
+        return len(self.sentences) > 0
 
     def __add__(self, other):
-        return Section(self.sentences + other.sentences, self.matches.copy().add_all(other.matches.matches))
+        mc = self.matches.copy()
+        mc.add_cask(other.matches)
+        return Section(self.sentences + other.sentences, mc, negation_cache=self.negation_cache)
 
     def __str__(self):
         return self.text
@@ -251,26 +811,45 @@ class Section:
 
 class Document:
     HISTORY_REMOVAL = re.compile(r'HISTORY:.*?(?=[A-Z]+:)')
+    BREASTFEEDING_QUESTION = re.compile(r'(Breastfeeding)\?\n((?:yes|no)\w*)', flags=re.I)
+    LABEL_NEWLINE = re.compile(r': *\n', flags=re.I)
 
-    def __init__(self, name, file=None, text=None, encoding='utf8'):
+    def __init__(self, name, file=None, text=None, encoding='utf8', recording=RECORD_FULL):
         """
+        Only the raw text is kept until cleaned text or sentences are requested
+            (e.g., by an algorithm which passes a document-level check).
 
         :param name:
         :param file:
         :param text:
         :param encoding:
+        :param recording: how much of each match to keep (see `new_match_cask`)
         """
         self.name = name
         self.text = text
-        self.matches = MatchCask()
+        self.recording = recording
+        self.matches = new_match_cask(recording)
+        self.negation_cache = {}  # shared by all sentences/sections
         if file:
             with open(file, encoding=encoding) as fh:
                 self.text = fh.read()
         if not self.text:
             raise ValueError(f'Missing text for {name}, file: {file}')
-        # remove history section
-        self.new_text = self._clean_text(self.HISTORY_REMOVAL.sub('\n', self.text))
-        self.sentences = Sentences(self.new_text, self.matches)
+        self._new_text = None
+        self._sentences = None
+
+    @property
+    def new_text(self):
+        if self._new_text is None:
+            # remove history section
+            self._new_text = self._clean_text(self.HISTORY_REMOVAL.sub('\n', self.text))
+        return self._new_text
+
+    @property
+    def sentences(self):
+        if self._sentences is None:
+            self._sentences = Sentences(self.new_text, self.matches, self.negation_cache)
+        return self._sentences
 
     def _clean_text(self, text):
         """
@@ -280,9 +859,9 @@ class Document:
         :return:
         """
         # spacy turns 'breastfeeding? yes' into two separate lines; undo that
-        text = re.sub(r'(Breastfeeding)\?\n((?:yes|no)\w*)', r'\1: \2', text, flags=re.I)
+        text = self.BREASTFEEDING_QUESTION.sub(r'\1: \2', text)
         #
-        text = re.sub(r': *\n', r': ', text, flags=re.I)
+        text = self.LABEL_NEWLINE.sub(r': ', text)
         return text
 
     def remove_patterns(self, *pats, ignore_negation=False):
@@ -290,7 +869,7 @@ class Document:
         for pat in pats:
             text = pat.sub('', text)
         if text:
-            return Document(self.name, text=text)
+            return Document(self.name, text=text, recording=self.recording)
         else:
             return None
 
@@ -305,13 +884,13 @@ class Document:
         if by_sentence:
             return self.sentences.has_pattern(pat, ignore_negation=ignore_negation)
         else:
-            m = pat.matches(self.text, ignore_negation=ignore_negation)
+            m = pat.matches(self.text, ignore_negation=ignore_negation, negation_cache=self.negation_cache)
             if m:
                 self.matches.add(m)
             return bool(m)
 
     def get_pattern(self, pat, index=0):
-        m = pat.matches(self.text)
+        m = pat.matches(self.text, negation_cache=self.negation_cache)
         if m:
             self.matches.add(m)
             if not isinstance(index, (list, tuple)):
@@ -359,7 +938,8 @@ class Document:
                     if i - j >= 0:
                         sents.add(i - j)
             if sents:
-                yield Section([self.sentences[i] for i in sorted(list(sents))], self.matches)
+                yield Section([self.sentences[i] for i in sorted(list(sents))], self.matches,
+                              negation_cache=self.negation_cache)
 
     def select_all_sentences_with_patterns(self, *pats, negation=None, has_all=False, get_range=False,
                                            neighboring_sentences=0):
@@ -379,36 +959,50 @@ class Document:
         if not sents:
             return None
         elif len(sents) == 1:
-            return Section([self.sentences[sents[0]]], self.matches)
+            return Section([self.sentences[sents[0]]], self.matches, negation_cache=self.negation_cache)
         elif get_range:
-            return Section(self.sentences[sents[0]:sents[-1] + 1], self.matches)
+            return Section(self.sentences[sents[0]:sents[-1] + 1], self.matches,
+                           negation_cache=self.negation_cache)
         else:
-            return Section([self.sentences[i] for i in sents], self.matches)
+            return Section([self.sentences[i] for i in sents], self.matches, negation_cache=self.negation_cache)
 
     def split(self, rx, group=1):
         prev_start = 0
         prev_name = None
-        sections = Sections()
+        sections = Sections(self.negation_cache, recording=self.recording)
         for m in re.finditer(rx, self.text):
             if prev_name:
-                sections.add(prev_name, self.text[prev_start: m.start()])
+                sections.add(prev_name, self.text, prev_start, m.start())
             prev_name = m.group(group)
             prev_start = m.end()
         if prev_name:
-            sections.add(prev_name, self.text[prev_start:])
+            sections.add(prev_name, self.text, prev_start)
         return sections
 
 
 class Sections:
 
-    def __init__(self):
+    def __init__(self, negation_cache=None, recording=RECORD_FULL):
         self.sections = {}
+        self.negation_cache = negation_cache
+        self.recording = recording
 
-    def add(self, name, text):
-        self.sections[name.upper()] = Section([Sentence(x) for x in text.split('\n') if x.strip()])
+    def add(self, name, text, start=0, end=None):
+        """
+        :param name:
+        :param text: buffer containing the section
+        :param start: offset of the section in text
+        :param end:
+        """
+        self.sections[name.upper()] = Section(
+            [Sentence(text, new_match_cask(self.recording), start=s, end=e, negation_cache=self.negation_cache)
+             for s, e in iter_lines(text, start, end)],
+            new_match_cask(self.recording),
+            negation_cache=self.negation_cache
+        )
 
     def get_sections(self, *names) -> Section:
-        sect = Section([])
+        sect = Section([], new_match_cask(self.recording), negation_cache=self.negation_cache)
         for name in names:
             name = name.upper()
             if name in self.sections:
@@ -418,4 +1012,4 @@ class Sections:
     def get_section(self, name):
         if name.upper() in self.sections:
             return self.sections[name.upper()]
-        return Section([])
+        return Section([], new_match_cask(self.recording), negation_cache=self.negation_cache)
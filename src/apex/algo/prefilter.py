@@ -0,0 +1,158 @@
+"""
+Reject documents which cannot trigger an algorithm using a single scan.
+
+An algorithm module can define:
+    * TRIGGERS: tuple of Patterns, at least one of which must match somewhere
+        in a document for the algorithm to do anything more than its default
+    * spare(document, expected=None): yields the Results the algorithm returns
+        when none of TRIGGERS match (default: no Results)
+
+For each trigger, a set of literals is extracted from the regular expression
+such that every match of the trigger must contain one of them. All literals
+are then combined into one scan over the document text.
+"""
+import inspect
+import re
+from collections import Counter, defaultdict
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # python < 3.11
+    import sre_parse
+    import sre_constants
+
+# literals shorter than this are not worth searching for
+MIN_LITERAL_LENGTH = 2
+
+
+def _no_results(document, expected=None):
+    yield from ()
+
+
+def _is_word(code):
+    char = chr(code)
+    return char.isalnum() or char == '_'
+
+
+def _best(candidates):
+    """Prefer the set with the longest shortest literal, then the smallest set"""
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: (min(len(x) for x in c), -len(c)))
+
+
+def _required_literals(parsed):
+    """
+    Find a set of literals, one of which must occur in any match
+    :param parsed: parsed regular expression (or subpattern)
+    :return: set of lowercase str or None if no requirement could be found
+    """
+    candidates = []
+    run = []
+    for op, av in parsed:
+        if op is sre_constants.LITERAL and _is_word(av):
+            run.append(chr(av))
+            continue
+        if run:
+            candidates.append({''.join(run).lower()})
+            run = []
+        if op is sre_constants.SUBPATTERN:
+            required = _required_literals(av[-1])
+        elif op is sre_constants.BRANCH:
+            branches = [_required_literals(branch) for branch in av[1]]
+            required = None if None in branches else set().union(*branches)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            required = _required_literals(av[2])
+        else:  # character classes, anchors, lookarounds, etc.
+            required = None
+        if required:
+            candidates.append(required)
+    if run:
+        candidates.append({''.join(run).lower()})
+    return _best(candidates)
+
+
+def get_trigger_literals(*patterns):
+    """
+    :param patterns: apex.algo.pattern.Pattern
+    :return: set of literals, one of which must occur for any pattern to match;
+        None if any pattern cannot be reduced to literals
+    """
+    literals = set()
+    for pat in patterns:
+        required = _required_literals(sre_parse.parse(pat.text, pat.flags))
+        if not required or min(len(x) for x in required) < MIN_LITERAL_LENGTH:
+            return None
+        literals |= required
+    return literals
+
+
+class Prefilter:
+
+    def __init__(self, algos):
+        """
+        :param algos: dict of algorithm name -> confirm_* function
+        """
+        self.spares = {}  # name -> spare function for algorithms with triggers
+        self.spared = Counter()  # name -> number of documents spared
+        owners = defaultdict(set)  # literal -> algorithm names
+        for name, alg_func in algos.items():
+            module = inspect.getmodule(alg_func)
+            triggers = getattr(module, 'TRIGGERS', None)
+            if not triggers:
+                continue
+            literals = get_trigger_literals(*triggers)
+            if not literals:
+                continue
+            self.spares[name] = getattr(module, 'spare', _no_results)
+            for literal in literals:
+                owners[literal].add(name)
+        # a match also implies any literal which is a prefix of it
+        self.owners = {}
+        for literal in owners:
+            self.owners[literal] = set().union(*(names for other, names in owners.items()
+                                                 if literal.startswith(other)))
+        self.scanner = None
+        if self.owners:
+            # longest first: the literal found at a position carries all its prefixes
+            alternatives = sorted(self.owners, key=lambda x: (-len(x), x))
+            self.scanner = re.compile(
+                r'(?=({}))'.format('|'.join(re.escape(x) for x in alternatives)),
+                re.IGNORECASE
+            )
+
+    def get_triggered(self, text):
+        """
+        :param text: raw document text
+        :return: set of algorithm names with at least one trigger literal in the text
+        """
+        triggered = set()
+        if not self.scanner:
+            return triggered
+        for m in self.scanner.finditer(text):
+            try:
+                triggered |= self.owners[m.group(1).lower()]
+            except KeyError:  # case folding differs from lower(): assume everything
+                return set(self.spares)
+            if len(triggered) == len(self.spares):
+                break
+        return triggered
+
+    def get_spared(self, document):
+        """
+        :param document:
+        :return: dict of algorithm name -> spare function for algorithms that
+            cannot trigger on this document
+        """
+        if not self.spares:
+            return {}
+        triggered = self.get_triggered(document.text)
+        spared = {name: func for name, func in self.spares.items() if name not in triggered}
+        self.spared.update(spared.keys())
+        return spared
+
+    def __repr__(self):
+        return repr(dict(self.spared))
+
+    def __str__(self):
+        return str(dict(self.spared))
@@ -0,0 +1,158 @@
+"""
+Optional counters for each Pattern: calls, hits, negation vetoes, time, and characters scanned.
+
+Profiling replaces `Pattern.matches`, `Pattern.sub`, and `Pattern._is_negated` with
+    instrumented versions only while enabled, so there is no cost otherwise.
+"""
+import time
+
+from apex.algo.pattern import Pattern, get_pattern_names
+
+FIELDS = ('calls', 'hits', 'vetoes', 'seconds', 'max_seconds', 'chars')
+CALLS, HITS, VETOES, SECONDS, MAX_SECONDS, CHARS = range(len(FIELDS))
+
+_ORIGINAL = {}
+_PROFILER = None
+
+
+class PatternProfiler:
+
+    def __init__(self):
+        self.stats = {}  # Pattern -> list of FIELDS
+        self.merged = {}  # name -> list of FIELDS (e.g., from other processes)
+        self._names = None
+
+    def _get(self, pat):
+        try:
+            return self.stats[pat]
+        except KeyError:
+            stats = self.stats[pat] = [0, 0, 0, 0.0, 0.0, 0]
+            return stats
+
+    def record(self, pat, seconds, chars, hit):
+        stats = self._get(pat)
+        stats[CALLS] += 1
+        stats[SECONDS] += seconds
+        if seconds > stats[MAX_SECONDS]:
+            stats[MAX_SECONDS] = seconds
+        stats[CHARS] += chars
+        if hit:
+            stats[HITS] += 1
+
+    def record_veto(self, pat):
+        self._get(pat)[VETOES] += 1
+
+    def _name(self, pat):
+        if self._names is None or pat not in self._names:
+            self._names = get_pattern_names()
+        return self._names.get(pat) or f'{pat.module}.<{pat.id}>'
+
+    def get_stats(self):
+        """
+        :return: dict of pattern name -> list of FIELDS
+        """
+        stats = {name: list(values) for name, values in self.merged.items()}
+        for pat, values in self.stats.items():
+            _merge_values(stats, self._name(pat), values)
+        return stats
+
+    def pop_stats(self):
+        """Get stats and reset (e.g., to send to another process)"""
+        stats = self.get_stats()
+        self.stats.clear()
+        self.merged.clear()
+        return stats
+
+    def update(self, stats):
+        """
+        :param stats: dict of pattern name -> list of FIELDS (see `get_stats`)
+        """
+        for name, values in stats.items():
+            _merge_values(self.merged, name, values)
+
+    def get_table(self, top=None):
+        """
+        :param top: only include the patterns taking the most time
+        :return: list of rows (name, *FIELDS) sorted by total time
+        """
+        rows = sorted(((name, *values) for name, values in self.get_stats().items()),
+                      key=lambda x: (-x[SECONDS + 1], x[0]))
+        return rows[:top] if top else rows
+
+    def write(self, path, top=None):
+        with open(path, 'w') as out:
+            out.write('\t'.join(('pattern',) + FIELDS) + '\n')
+            for row in self.get_table(top):
+                out.write('\t'.join(str(x) for x in row) + '\n')
+
+    def __str__(self):
+        lines = ['{:<45}{:>10}{:>10}{:>10}{:>12}{:>12}{:>14}'.format('pattern', *FIELDS)]
+        for name, calls, hits, vetoes, seconds, max_seconds, chars in self.get_table(top=25):
+            lines.append(f'{name:<45}{calls:>10}{hits:>10}{vetoes:>10}{seconds:>12.4f}{max_seconds:>12.4f}{chars:>14}')
+        return '\n'.join(lines)
+
+
+def _merge_values(stats, name, values):
+    if name not in stats:
+        stats[name] = list(values)
+        return
+    current = stats[name]
+    for i, value in enumerate(values):
+        if i == MAX_SECONDS:
+            current[i] = max(current[i], value)
+        else:
+            current[i] += value
+
+
+def enable_profiling():
+    """
+    Instrument all Patterns (idempotent)
+    :return: PatternProfiler collecting the counts
+    """
+    global _PROFILER
+    if _PROFILER is not None:
+        return _PROFILER
+    profiler = _PROFILER = PatternProfiler()
+    matches = _ORIGINAL['matches'] = Pattern.matches
+    sub = _ORIGINAL['sub'] = Pattern.sub
+    is_negated = _ORIGINAL['_is_negated'] = Pattern._is_negated
+    perf_counter = time.perf_counter
+
+    def profiled_matches(self, text, ignore_negation=False, negation_cache=None, pos=0, endpos=None):
+        start = perf_counter()
+        m = matches(self, text, ignore_negation, negation_cache, pos, endpos)
+        profiler.record(self, perf_counter() - start, (len(text) if endpos is None else endpos) - pos, m)
+        return m
+
+    def profiled_sub(self, repl, text):
+        start = perf_counter()
+        res = sub(self, repl, text)
+        profiler.record(self, perf_counter() - start, len(text), res != text)
+        return res
+
+    def profiled_is_negated(self, text, negation_cache=None, pos=0, endpos=None):
+        negated = is_negated(self, text, negation_cache, pos, endpos)
+        if negated:
+            profiler.record_veto(self)
+        return negated
+
+    Pattern.matches = profiled_matches
+    Pattern.sub = profiled_sub
+    Pattern._is_negated = profiled_is_negated
+    return profiler
+
+
+def disable_profiling():
+    """Restore uninstrumented Patterns"""
+    global _PROFILER
+    for name, func in _ORIGINAL.items():
+        setattr(Pattern, name, func)
+    _ORIGINAL.clear()
+    _PROFILER = None
+
+
+def get_profiler():
+    """
+    :return: PatternProfiler if profiling is enabled, else None
+    """
+    return _PROFILER
@@ -0,0 +1,90 @@
+"""
+Track startup cost: time to import `apex.main` (and, optionally, to load algorithms)
+    in fresh interpreters, along with the slowest imports.
+
+Usage: python -m apex.anlz.import_timing [--runs 5] [--algorithms NAME [NAME ...]] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+IMPORT_CODE = 'import apex.main'
+LOAD_CODE = 'import apex.main; apex.main.get_algorithms({names!r})'
+
+
+def _get_env():
+    env = dict(os.environ)
+    src = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env['PYTHONPATH'] = os.pathsep.join(x for x in (src, env.get('PYTHONPATH')) if x)
+    return env
+
+
+def parse_importtime(stderr):
+    """
+    :param stderr: output of `python -X importtime`
+    :return: dict of module -> (self microseconds, cumulative microseconds)
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        times[module.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def time_import(code=IMPORT_CODE):
+    """
+    Run `code` in a new interpreter
+    :return: dict of module -> (self microseconds, cumulative microseconds)
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, env=_get_env(), check=True)
+    return parse_importtime(proc.stderr)
+
+
+def run_benchmark(runs=5, algorithms=None):
+    """
+    :param runs: number of fresh interpreters
+    :param algorithms: if included, also load these algorithms (empty list: all)
+    :return: (median seconds to import apex.main, median seconds to also load algorithms or None,
+        dict of module -> median cumulative microseconds)
+    """
+    import_times = []
+    load_times = []
+    modules = {}
+    for _ in range(runs):
+        times = time_import()
+        import_times.append(times['apex.main'][1] / 1e6)
+        for module, (_, cumulative) in times.items():
+            modules.setdefault(module, []).append(cumulative)
+        if algorithms is not None:
+            times = time_import(LOAD_CODE.format(names=list(algorithms)))
+            load_times.append(sum(x[0] for x in times.values()) / 1e6)
+    return (
+        statistics.median(import_times),
+        statistics.median(load_times) if load_times else None,
+        {module: statistics.median(values) for module, values in modules.items()},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Number of fresh interpreters to time')
+    parser.add_argument('--algorithms', nargs='*', default=None,
+                        help='Also time loading these algorithms (no names: all)')
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to show')
+    args = parser.parse_args()
+    import_seconds, load_seconds, modules = run_benchmark(args.runs, args.algorithms)
+    print(f'import apex.main: {import_seconds:.3f}s (median of {args.runs})')
+    if load_seconds is not None:
+        print(f'import apex.main and load algorithms: {load_seconds:.3f}s')
+    print(f'{"module":<50}{"cumulative [ms]":>16}')
+    for module, cumulative in sorted(modules.items(), key=lambda x: -x[1])[:args.top]:
+        print(f'{module:<50}{cumulative / 1000:>16.1f}')
+
+
+if __name__ == '__main__':
+    main()
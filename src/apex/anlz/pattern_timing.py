@@ -0,0 +1,181 @@
+"""
+Time every Pattern (and negation) in the `apex.algo` modules on adversarial inputs
+    of increasing length to find those which backtrack catastrophically.
+
+Usage: python -m apex.anlz.pattern_timing [--corpus DIR] [--lengths 100 1000 10000] [--out timing.tsv]
+
+For each pattern and input length, reports the worst time (best of `repeat` runs of
+    a search) across inputs and the growth: how much more time each extra character
+    costs at the longest length than at the shortest (~1 if linear).
+"""
+import argparse
+import csv
+import itertools
+import os
+import re
+import sys
+import time
+
+from apex.algo.pattern import get_pattern_names, compile_negation
+
+PUNCTUATION = '.,;:-/()*# '
+FILLER_TOKENS = ['the', 'iud', 'was', 'not', 'in', 'place', 'pt', 'states']
+WORD = re.compile(r'[a-z]{2,}', re.I)
+
+
+def get_targets():
+    """
+    :return: list of (name, text of regex, compiled regex), including negations
+        (numbered as in `Pattern.negate_texts`)
+    """
+    targets = []
+    for pat, name in sorted(get_pattern_names().items(), key=lambda x: x[1]):
+        targets.append((name, pat.text, pat.pattern))
+        for i, negate in enumerate(pat.negate_texts):
+            targets.append((f'{name}[negate{i}]', negate, compile_negation(negate, pat.flags)))
+    return targets
+
+
+def _repeat_to_length(parts, length, sep=''):
+    text = sep.join(itertools.islice(itertools.cycle(parts), length // 2 + 1))
+    while len(text) < length:
+        text += sep + text
+    return text[:length]
+
+
+def get_adversarial_inputs(pattern_text, length):
+    """
+    :param pattern_text: regular expression (used to build near misses)
+    :param length: number of characters in each input
+    :return: iterator of (input kind, text)
+    """
+    yield 'punctuation', _repeat_to_length(PUNCTUATION, length)
+    yield 'whitespace', _repeat_to_length([' ', '\t', ' \n'], length)
+    yield 'repeated_token', _repeat_to_length(FILLER_TOKENS, length, sep=' ')
+    yield 'token_punctuation', _repeat_to_length(FILLER_TOKENS, length, sep=' -- ')
+    words = WORD.findall(pattern_text)
+    if words:
+        # the pattern's own words, separated by punctuation and missing the last word
+        near_miss = words[:-1] or words
+        yield 'near_miss', _repeat_to_length(near_miss, length, sep=' ... ')
+        yield 'near_miss_spaced', _repeat_to_length(near_miss, length, sep=' , ' * 5)
+
+
+def get_corpus_inputs(texts, length):
+    """
+    :param texts: real sentences/documents
+    :param length: number of characters in each input
+    :return: iterator of (input kind, text)
+    """
+    if texts:
+        yield 'corpus', _repeat_to_length(texts, length, sep='\n')
+
+
+def read_corpus(path, encoding='utf8'):
+    """
+    :param path: text file or directory of text files
+    :return: list of non-blank lines
+    """
+    if os.path.isdir(path):
+        paths = [os.path.join(path, fn) for fn in sorted(os.listdir(path))]
+    else:
+        paths = [path]
+    texts = []
+    for fp in paths:
+        with open(fp, encoding=encoding) as fh:
+            texts += [line.strip() for line in fh if line.strip()]
+    return texts
+
+
+def time_search(rx, text, repeat=3):
+    """
+    :return: best time (in seconds) of `repeat` searches
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rx.search(text)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run_timing(targets, lengths=(100, 1000, 10000), corpus=None, repeat=3):
+    """
+    :param targets: list of (name, text of regex, compiled regex), see `get_targets`
+    :param lengths: input lengths to try
+    :param corpus: list of real sentences to include as an input
+    :param repeat: number of times each search is run
+    :return: iterator of (name, length, input kind, seconds)
+    """
+    for name, pattern_text, rx in targets:
+        for length in lengths:
+            for kind, text in itertools.chain(get_adversarial_inputs(pattern_text, length),
+                                              get_corpus_inputs(corpus, length)):
+                yield name, length, kind, time_search(rx, text, repeat=repeat)
+
+
+def summarize(timings):
+    """
+    :param timings: iterator of (name, length, input kind, seconds)
+    :return: list of (name, length, worst input kind, worst seconds, growth),
+        sorted from worst (at the longest length)
+    """
+    worst = {}
+    for name, length, kind, seconds in timings:
+        if (name, length) not in worst or seconds > worst[(name, length)][1]:
+            worst[(name, length)] = (kind, seconds)
+    lengths = sorted({length for _, length in worst})
+    rows = []
+    for (name, length), (kind, seconds) in worst.items():
+        shortest = worst.get((name, lengths[0]))
+        growth = None
+        if length != lengths[0] and shortest[1] > 0:
+            growth = (seconds / length) / (shortest[1] / lengths[0])
+        rows.append((name, length, kind, seconds, growth))
+    longest = {name: seconds for name, length, _, seconds, _ in rows if length == lengths[-1]}
+    rows.sort(key=lambda x: (-longest[x[0]], x[0], x[1]))
+    return rows
+
+
+def write_report(rows, out=sys.stdout, top=None):
+    """
+    :param rows: see `summarize`
+    :param out: file handle
+    :param top: only include this many of the worst patterns
+    """
+    writer = csv.writer(out, delimiter='\t', lineterminator='\n')
+    writer.writerow(['pattern', 'length', 'worst_input', 'seconds', 'growth'])
+    names = []
+    for name, length, kind, seconds, growth in rows:
+        if name not in names:
+            if top and len(names) >= top:
+                break
+            names.append(name)
+        writer.writerow([name, length, kind, f'{seconds:.6f}', '' if growth is None else f'{growth:.1f}'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', nargs='+', type=int, default=[100, 1000, 10000],
+                        help='Number of characters in each input')
+    parser.add_argument('--corpus', default=None,
+                        help='Text file or directory of text files with real sentences')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each search (best is kept)')
+    parser.add_argument('--pattern', default=None, help='Only time patterns whose name contains this')
+    parser.add_argument('--top', type=int, default=None, help='Only report the worst patterns')
+    parser.add_argument('--out', default=None, help='Output tsv file (default: stdout)')
+    args = parser.parse_args()
+    targets = [target for target in get_targets() if not args.pattern or args.pattern in target[0]]
+    corpus = read_corpus(args.corpus) if args.corpus else None
+    rows = summarize(run_timing(targets, args.lengths, corpus, args.repeat))
+    if args.out:
+        with open(args.out, 'w', newline='') as out:
+            write_report(rows, out, top=args.top)
+    else:
+        write_report(rows, top=args.top)
+
+
+if __name__ == '__main__':
+    main()
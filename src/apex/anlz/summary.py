@@ -1,24 +1,159 @@
+"""
+Sample the snippets of each algorithm and category from the text log into a docx file for review.
+
+Each sample is drawn uniformly from the distinct snippets in a streaming pass with bounded memory:
+    a snippet is kept if its (seeded) hash is among the `sample` smallest for its algorithm
+    and category. For a log with deduplicated snippets, only the keys are sampled, and a second
+    pass over its side file reads the sampled snippets. Samples of separate logs (e.g., shards)
+    combine into the sample of all of them.
+
+Usage: python -m apex.anlz.summary LOG_DIRECTORY [--sample 25] [--seed N] [--all] [--workers N]
+"""
+import argparse
 import glob
+import hashlib
+import heapq
+import multiprocessing
 import os
 import random
-import sys
-from collections import defaultdict
 
+try:
+    from docx import Document
+
+    from apex.io.docx import add_table_of_contents
+
+    DOCX_LOADED = True
+except ModuleNotFoundError:
+    DOCX_LOADED = False
+
+from apex.io.out import iter_log_rows, is_deduplicated_log, read_snippets, get_snippet_key
+
+
+class SnippetSample:
+    """
+    Uniform sample of up to k distinct snippets: those with the smallest (seeded) hash of
+        their key, so that samples of logs with and without deduplicated snippets agree
+    """
+
+    def __init__(self, k, seed=0):
+        self.k = k
+        self.key = str(seed).encode('utf8')
+        self.heap = []  # (-hash, snippet key, snippet): the largest kept hash is on top
+        self.hashes = set()
+
+    def add(self, text, key=None):
+        """
+        :param text: snippet; may be None (see `resolve`) if its key is included
+        :param key: snippet key (default: computed from text)
+        """
+        key = key or get_snippet_key(text)
+        value = int.from_bytes(hashlib.blake2b(key.encode('utf8'), digest_size=8, key=self.key).digest(), 'big')
+        self._add(value, key, text)
+
+    def _add(self, value, key, text):
+        if len(self.heap) >= self.k and value >= -self.heap[0][0] or value in self.hashes:
+            return
+        self.hashes.add(value)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (-value, key, text))
+        else:
+            removed, *_ = heapq.heapreplace(self.heap, (-value, key, text))
+            self.hashes.discard(-removed)
+
+    def update(self, other):
+        for value, key, text in other.heap:
+            self._add(-value, key, text)
 
-from docx import Document
+    def get_missing(self):
+        """
+        :return: keys of sampled snippets added without their text
+        """
+        return {key for _, key, text in self.heap if text is None}
 
-from apex.io.docx import add_table_of_contents
+    def resolve(self, snippets):
+        """
+        :param snippets: dict of key -> snippet (see `read_snippets`)
+        """
+        self.heap = [(value, key, snippets[key] if text is None else text) for value, key, text in self.heap]
+        heapq.heapify(self.heap)
 
+    def get_sample(self):
+        return [text for _, _, text in sorted(self.heap, reverse=True)]
 
-def snippet_samples(fp, sample=25, encoding='utf8', pattern='text_*.out'):
-    res = defaultdict(lambda: defaultdict(set))
-    fn = sorted(glob.glob(os.path.join(fp, pattern)))[-1]
-    with open(fn, encoding=encoding) as fh:
-        for i, line in enumerate(fh):
-            if i == 0:
-                continue
-            noteid, algo, cat, cat_num, terms, text = line.split('\t')
-            res[algo][cat].add(text)
+    def __len__(self):
+        return len(self.heap)
+
+
+def sample_log(path, sample=25, seed=0, encoding='utf8'):
+    """
+    For a log with deduplicated snippets, sample their keys and then read only the
+        sampled snippets from the side file
+    :param path: text log (tsv or dedup; see `iter_log_rows`)
+    :return: dict of algorithm -> category -> SnippetSample
+    """
+    deduplicated = is_deduplicated_log(path, encoding)
+    samples = {}
+    for noteid, algo, cat, cat_num, terms, text in iter_log_rows(path, encoding=encoding, resolve=False):
+        if cat not in samples.setdefault(algo, {}):
+            samples[algo][cat] = SnippetSample(sample, seed)
+        if deduplicated:
+            samples[algo][cat].add(None, key=text)
+        else:
+            samples[algo][cat].add(text)
+    if deduplicated:
+        cat_samples = [cat_sample for cats in samples.values() for cat_sample in cats.values()]
+        snippets = read_snippets(path, set().union(*(s.get_missing() for s in cat_samples)), encoding)
+        for cat_sample in cat_samples:
+            cat_sample.resolve(snippets)
+    return samples
+
+
+def _sample_log(args):
+    return sample_log(*args)
+
+
+def sample_logs(paths, sample=25, seed=0, encoding='utf8', workers=None):
+    """
+    :param paths: text logs (e.g., of each shard)
+    :param workers: if included, number of processes sampling logs at once
+    :return: dict of algorithm -> category -> SnippetSample across all logs
+    """
+    tasks = [(path, sample, seed, encoding) for path in paths]
+    if workers and len(paths) > 1:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_sample_log, tasks)
+    else:
+        results = map(_sample_log, tasks)
+    samples = {}
+    for result in results:
+        for algo, cats in result.items():
+            for cat, cat_sample in cats.items():
+                if cat not in samples.setdefault(algo, {}):
+                    samples[algo][cat] = cat_sample
+                else:
+                    samples[algo][cat].update(cat_sample)
+    return samples
+
+
+def snippet_samples(fp, sample=25, encoding='utf8', pattern='text_*.out', seed=None, all_files=False,
+                    workers=None):
+    """
+    :param fp: directory of text logs
+    :param sample: number of snippets for each algorithm and category
+    :param pattern: text logs to consider (default: only the latest is used)
+    :param seed: if included, the same logs give the same samples
+    :param all_files: if True, sample across all logs matching `pattern` (e.g., shards)
+    :param workers: if included, number of processes sampling logs at once
+    """
+    if not DOCX_LOADED:
+        raise ModuleNotFoundError('Need to install `python-docx`.')
+    files = sorted(glob.glob(os.path.join(fp, pattern)))
+    if not files:
+        raise ValueError(f'No text logs matching {pattern} in {fp}')
+    fn = files[-1]
+    if seed is None:
+        seed = random.getrandbits(63)
+    res = sample_logs(files if all_files else [fn], sample, seed, encoding, workers)
 
     doc = Document()
     add_table_of_contents(doc)
@@ -26,10 +161,25 @@ def snippet_samples(fp, sample=25, encoding='utf8', pattern='text_*.out'):
         doc.add_heading(algo, level=1)
         for cat, s in cats.items():
             doc.add_heading(cat, level=2)
-            for example in random.sample(s, min(sample, len(s))):
+            for example in s.get_sample():
                 doc.add_paragraph(example, style='List Number')
     doc.save(f'{fn}.docx')
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', help='Directory of text logs')
+    parser.add_argument('--sample', type=int, default=25, help='Snippets for each algorithm and category')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible samples')
+    parser.add_argument('--pattern', default='text_*.out', help='Text logs to consider')
+    parser.add_argument('--all', action='store_true', dest='all_files',
+                        help='Sample across all matching logs (e.g., shards) rather than the latest')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes sampling logs at once')
+    parser.add_argument('--encoding', default='utf8')
+    args = parser.parse_args(argv)
+    snippet_samples(args.directory, args.sample, args.encoding, args.pattern, args.seed, args.all_files,
+                    args.workers)
+
+
 if __name__ == '__main__':
-    snippet_samples(sys.argv[1])
+    main()
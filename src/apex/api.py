@@ -0,0 +1,60 @@
+"""
+Run algorithms over documents already in memory, without a config file or any
+    output files, e.g.:
+
+    import apex
+
+    for record in apex.run([('note1', text1), ('note2', text2)], algorithms=['iud_expulsion']):
+        print(record.name, record.algorithm, record.value, record.category)
+
+Only the algorithms, pattern, and runner modules are imported (not the corpus,
+    database, or config modules), and logging is left to the caller.
+"""
+from collections import defaultdict, namedtuple
+
+from apex.algo import get_algorithms
+from apex.algo.pattern import Document, RECORD_OFF
+from apex.algo.prefilter import Prefilter
+from apex.io.report import Reporter
+from apex.runner import process_serial, process_parallel, OUTPUT
+
+ResultRecord = namedtuple('ResultRecord', 'name algorithm value category date extras')
+
+
+def run(documents, algorithms=None, workers=None, batch_size=100, prefilter=False, expected=None,
+        results=None):
+    """
+    Lazily run algorithms over documents: documents are read as records are consumed
+        (with workers, at most 2 * workers * batch_size ahead)
+    :param documents: iterable of (name, text); documents without text are skipped
+    :param algorithms: algorithm names (default: all) or dict of algorithm name -> confirm_* function
+    :param workers: if included, number of processes
+    :param batch_size: number of documents sent to a worker at once
+    :param prefilter: if True, spare algorithms which cannot trigger
+    :param expected: dict of document name -> expected value (for the Reporters)
+    :param results: dict of algorithm name -> Reporter; if included, updated in place
+    :return: iterator of ResultRecord, in document order
+    """
+    if isinstance(algorithms, str):
+        algorithms = [algorithms]
+    algos = algorithms if isinstance(algorithms, dict) else get_algorithms(algorithms)
+    if not algos:
+        raise ValueError('No algorithms specified!')
+    if results is None:
+        results = {}
+    for name in algos:
+        results.setdefault(name, Reporter())
+    truth = defaultdict(lambda: None, expected or {})
+    prefilter = Prefilter(algos) if prefilter else None
+    records = ((name, None, text) for name, text in documents if text)
+    if workers:
+        events = process_parallel(records, algos, results, truth, prefilter, workers=workers,
+                                  chunksize=batch_size, with_log=False, recording=RECORD_OFF)
+    else:
+        events = process_serial(
+            (Document(name, file=path, text=text, recording=RECORD_OFF) for name, path, text in records),
+            algos, results, truth, prefilter
+        )
+    for kind, line in events:
+        if kind == OUTPUT:
+            yield ResultRecord(*line)
@@ -0,0 +1,165 @@
+"""
+On-disk cache of each algorithm's results for a document, so that re-runs only
+    evaluate new/changed documents and changed algorithms.
+
+Entries are keyed by a hash of the document text, the algorithm name, and a
+    fingerprint of the algorithm (source code of its module and the apex.algo modules
+    it uses, its patterns, the regex engine, and how matches are recorded). The events
+    an algorithm produced (output rows, log rows, skips, and the matches it added to
+    the document) and the value used for the Reporter are replayed on a cache hit.
+
+Events are stored as json (only str, int, and None).
+"""
+import hashlib
+import inspect
+import json
+import logging
+import sqlite3
+import sys
+from collections import Counter
+
+from apex.algo.pattern import Pattern, RECORD_FULL, get_regex_engine
+
+CACHE_FORMAT = 2  # changes to how events are stored invalidate existing entries
+
+
+def get_text_hash(text):
+    return hashlib.blake2b(text.encode('utf8'), digest_size=16).digest()
+
+
+def get_fingerprint(alg_func, recording=RECORD_FULL):
+    """
+    :param alg_func: confirm_* function
+    :param recording: how much of each match is kept (see `new_match_cask`)
+    :return: str which changes when the algorithm (or the patterns it uses) change
+    """
+    module = inspect.getmodule(alg_func)
+    package = module.__name__.split('.')[0]
+    modules = {module.__name__}
+    patterns = set()
+    for value in vars(module).values():
+        if isinstance(value, Pattern):
+            patterns.add((value.text, tuple(value.negate_texts), value.flags))
+        else:
+            defined_in = getattr(value, '__module__', None) or getattr(value, '__name__', None)
+            if defined_in and defined_in.split('.')[0] == package and defined_in in sys.modules:
+                modules.add(defined_in)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{CACHE_FORMAT}:{recording}'.encode('utf8'))
+    h.update(repr(sorted(get_regex_engine().config().items())).encode('utf8'))
+    for module_name in sorted(modules):
+        try:
+            h.update(inspect.getsource(sys.modules[module_name]).encode('utf8'))
+        except (OSError, TypeError):  # no source available
+            h.update(module_name.encode('utf8'))
+    for pattern in sorted(patterns, key=repr):
+        h.update(repr(pattern).encode('utf8'))
+    return h.hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, path, algos, recording=RECORD_FULL, batch_size=1000):
+        """
+        :param path: sqlite database file (created if missing)
+        :param algos: dict of algorithm name -> confirm_* function
+        :param recording: how much of each match is kept (see `new_match_cask`)
+        :param batch_size: number of new entries written at once
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.fingerprints = {name: get_fingerprint(func, recording) for name, func in algos.items()}
+        self.pending = {}  # (text_hash, algorithm) -> new entry not yet written
+        self.hits = Counter()
+        self.misses = Counter()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')  # workers read while results are written
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' text_hash BLOB, algorithm TEXT, fingerprint TEXT, events TEXT, result INTEGER,'
+            ' PRIMARY KEY (text_hash, algorithm))'
+        )
+        self.conn.commit()
+
+    def get(self, text_hash, name):
+        """
+        :param text_hash: from `get_text_hash`
+        :param name: algorithm name
+        :return: (events, result) or None if not cached;
+            events are (kind, line without document name); result is for the Reporter (or None)
+        """
+        entry = self.pending.get((text_hash, name))
+        if entry is not None:
+            row = entry[3:]
+        else:
+            row = self.conn.execute(
+                'SELECT events, result FROM results WHERE text_hash=? AND algorithm=? AND fingerprint=?',
+                (text_hash, name, self.fingerprints[name])
+            ).fetchone()
+        if row is None:
+            self.misses[name] += 1
+            return None
+        self.hits[name] += 1
+        return json.loads(row[0]), row[1]
+
+    def put(self, text_hash, name, events, result=None):
+        self.pending[(text_hash, name)] = (text_hash, name, self.fingerprints[name], json.dumps(events), result)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_pending(self, entries):
+        """
+        :param entries: new entries from another process (see `pop_pending`)
+        """
+        for entry in entries:
+            self.pending[entry[:2]] = entry
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def pop_pending(self):
+        entries = list(self.pending.values())
+        self.pending = {}
+        return entries
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)', self.pending.values())
+            self.conn.commit()
+            self.pending = {}
+
+    def get_stats(self):
+        return {'hits': dict(self.hits), 'misses': dict(self.misses)}
+
+    def update(self, stats):
+        """Add counts (e.g., from another process)"""
+        self.hits.update(stats['hits'])
+        self.misses.update(stats['misses'])
+
+    def clear_stats(self):
+        self.hits.clear()
+        self.misses.clear()
+
+    def close(self, flush=True):
+        if flush:
+            self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __str__(self):
+        return ', '.join(f'{name}: {self.hits[name]}/{self.hits[name] + self.misses[name]} cached'
+                         for name in self.fingerprints)
+
+
+def get_result_cache(path=None, algos=None, recording=RECORD_FULL):
+    """
+    :return: ResultCache or None if no path
+    """
+    if not path:
+        return None
+    logging.info(f'Using result cache: {path}')
+    return ResultCache(path, algos, recording)
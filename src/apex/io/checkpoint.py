@@ -0,0 +1,141 @@
+"""
+Journal for resuming long corpus runs after an interruption.
+
+Every `interval` documents, the output files are flushed and the journal records:
+    * offset: number of source records (files, then database rows) read before the
+        first incomplete document
+    * index: position of the last completed document (for `start`/`end`)
+    * size of each output file
+    * state of each Reporter
+
+On restart with the same configuration, each output file is truncated to its recorded
+    size (dropping rows from documents completed after the checkpoint) and appended to,
+    and reading the corpus continues from the offset. Once a run completes, the journal
+    is marked complete so the next run starts over.
+
+NB: only file output is supported (not `sql`), and the corpus must not change between runs
+"""
+import collections
+import json
+import logging
+import os
+
+
+class Checkpoint:
+
+    def __init__(self, path, interval=1000):
+        """
+        :param path: journal file (json)
+        :param interval: number of completed documents between checkpoints
+        """
+        self.path = path
+        self.interval = interval
+        self.offset = 0
+        self.index = -1
+        self.files = {}  # key -> file wrapper
+        self.saved = {}  # from journal
+        self.pending = collections.deque()  # (offset, index) of documents read, not completed
+        self.completed = 0
+        self._read_journal()
+
+    def _read_journal(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as fh:
+            saved = json.load(fh)
+        if saved['complete']:
+            logging.info(f'Previous run completed: not resuming from {self.path}')
+            return
+        self.saved = saved
+        self.offset = saved['offset']
+        self.index = saved['index']
+        logging.warning(f'Resuming from checkpoint: {self.offset} records read')
+
+    @property
+    def resuming(self):
+        return bool(self.saved)
+
+    def resume_file(self, key, wrapper):
+        """
+        Track an output file; if resuming, continue the file recorded in the journal
+        :param key: name of the file in the journal
+        :param wrapper: FileWrapper or Skipper (not yet opened)
+        """
+        if not getattr(wrapper, 'fp', None):  # e.g., NullFileWrapper
+            return wrapper
+        self.files[key] = wrapper
+        if key not in self.saved.get('files', {}):
+            return wrapper
+        path, size = self.saved['files'][key]
+        with open(path, 'r+b') as fh:
+            fh.truncate(size)
+        wrapper.fp = path
+        wrapper.append = True
+        return wrapper
+
+    def resume_results(self, results):
+        """
+        :param results: dict of algorithm name -> Reporter; updated in place
+        """
+        if not self.resuming:
+            return
+        if set(self.saved['results']) != set(results):
+            raise ValueError(f'Algorithms differ from checkpoint: {sorted(self.saved["results"])}')
+        for name, state in self.saved['results'].items():
+            vars(results[name]).update(state)
+
+    def read(self, offset, index):
+        """
+        Record a document read from the corpus
+        :param offset: position of the record in the corpus
+        :param index: position of the document after skips (see `start`/`end`)
+        """
+        self.pending.append((offset, index))
+
+    def done(self, count=1):
+        """
+        Mark the oldest documents read as complete
+        :param count: number of documents
+        :return: True if a checkpoint is due
+        """
+        for _ in range(count):
+            offset, self.index = self.pending.popleft()
+            self.offset = offset + 1
+        self.completed += count
+        if self.completed >= self.interval:
+            self.completed = 0
+            return True
+        return False
+
+    def save(self, results, complete=False):
+        """
+        Flush output files and write the journal
+        :param results: dict of algorithm name -> Reporter
+        :param complete: if True, the run has finished
+        """
+        files = {}
+        for key, wrapper in self.files.items():
+            if wrapper.fh:
+                wrapper.fh.flush()
+                os.fsync(wrapper.fh.fileno())
+                files[key] = (wrapper.fp, os.path.getsize(wrapper.fp))
+        data = {
+            'offset': self.offset,
+            'index': self.index,
+            'complete': complete,
+            'files': files,
+            'results': {name: vars(reporter) for name, reporter in results.items()},
+        }
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as out:
+            json.dump(data, out)
+        os.replace(tmp, self.path)  # never leave a partial journal
+
+
+def get_checkpoint(path=None, interval=1000):
+    """
+    :return: Checkpoint or None if no path
+    """
+    if not path:
+        return None
+    return Checkpoint(path, interval)
@@ -1,13 +1,19 @@
+import collections
 import itertools
 import os
 
+import sqlalchemy as sqla
 
-from apex.algo.pattern import Document
+from apex.algo.pattern import Document, RECORD_FULL
 from apex.io import sqlai
+from apex.io.shard import in_shard
 
 
-def get_next_from_directory(directory, directories, version=None, filenames=None,
-                            encoding='utf8'):
+def iter_directory_entries(directory, directories, version=None, filenames=None):
+    """
+    Find documents in directories without reading them
+    :return: iterator of (doc_name, path)
+    """
     if directory or directories:
         directories = directories or []
         if directory:
@@ -20,32 +26,44 @@ def get_next_from_directory(directory, directories, version=None, filenames=None
             if filenames:  # only look for specified files
                 for file in filenames:
                     fp = os.path.join(corpus_dir, file)
-                    try:
-                        with open(fp, encoding=encoding) as fh:
-                            text = fh.read()
-                    except FileNotFoundError:
-                        continue
-                    else:
-                        yield '.'.join(file.split('.')[:-1]), None, text
+                    if os.path.isfile(fp):
+                        yield '.'.join(file.split('.')[:-1]), fp
             else:
                 for entry in os.scandir(corpus_dir):
-                    doc_name = '.'.join(entry.name.split('.')[:-1])
-                    with open(entry.path, encoding=encoding) as fh:
-                        text = fh.read()
-                    if not text:
+                    if entry.stat().st_size == 0:  # no text
                         continue
-                    yield doc_name, None, text
+                    yield '.'.join(entry.name.split('.')[:-1]), entry.path
 
 
-def get_next_from_connections(*connections):
+def read_file(path, encoding='utf8'):
+    with open(path, encoding=encoding) as fh:
+        return fh.read()
+
+
+def get_next_from_directory(directory, directories, version=None, filenames=None,
+                            encoding='utf8'):
+    for doc_name, path in iter_directory_entries(directory, directories, version, filenames):
+        try:
+            text = read_file(path, encoding)
+        except FileNotFoundError:
+            continue
+        if not text and not filenames:
+            continue
+        yield doc_name, None, text
+
+
+def get_next_from_connections(*connections, shard=None):
     for connection in connections:
-        for doc_name, text in get_next_from_sql(**connection):
+        for doc_name, text in get_next_from_sql(**connection, shard=shard):
             yield doc_name, None, text
 
 
 def get_next_from_sql(name=None, connection_string=None, driver=None, server=None,
-                      database=None, name_col=None, text_col=None):
+                      database=None, name_col=None, text_col=None, shard=None, batch_size=1000):
     """
+    :param shard: dict with index and count: only retrieve text of documents in this
+        shard (others are yielded with text of None)
+    :param batch_size: number of rows whose text is retrieved at once (if shard)
     :param name_col:
     :param text_col:
     :param name: tablename (if connecting to database)
@@ -53,21 +71,144 @@ def get_next_from_sql(name=None, connection_string=None, driver=None, server=Non
     :param server: name of server (if connecting to database)
     :param database: name of database (if connecting to database)
     """
-    eng = None
+    eng = _get_engine(connection_string, driver, server, database)
+    if eng and shard:
+        yield from _get_shard_from_sql(eng, name, name_col, text_col, shard, batch_size)
+    elif eng:
+        for doc_name, text in eng.execute(f'select {name_col}, {text_col} from {name}'):
+            yield doc_name, text
+
+
+def get_connection_engine(connection_string=None, driver=None, server=None, database=None, **kwargs):
+    """
+    :param kwargs: rest of the connection (e.g., name, name_col, text_col)
+    :return: engine for a database connection of the corpus, or None if not configured
+    """
+    return _get_engine(connection_string, driver, server, database)
+
+
+def _get_engine(connection_string=None, driver=None, server=None, database=None):
     if driver and server and database:
-        eng = sqlai.get_engine(driver=driver, server=server, database=database)
+        return sqlai.get_engine(driver=driver, server=server, database=database)
     elif connection_string:
-        eng = sqlai.get_engine(connection_string=connection_string)
+        return sqlai.get_engine(connection_string=connection_string)
+    return None
+
+
+def get_names_from_sql(name=None, connection_string=None, driver=None, server=None,
+                       database=None, name_col=None, **kwargs):
+    """
+    Document names in database order, without retrieving the text
+    :return: iterator of doc_name
+    """
+    eng = _get_engine(connection_string, driver, server, database)
     if eng:
-        for doc_name, text in eng.execute(f'select {name_col}, {text_col} from {name}'):
-            yield doc_name, text
+        for doc_name, in eng.execute(f'select {name_col} from {name}'):
+            yield doc_name
+
+
+def get_texts_from_sql(doc_names, name=None, connection_string=None, driver=None, server=None,
+                       database=None, name_col=None, text_col=None, engine=None, **kwargs):
+    """
+    :param doc_names: names of documents to retrieve
+    :param engine: if included, reuse this engine (see `get_connection_engine`) rather than
+        creating one for this connection
+    :return: dict of doc_name -> list of texts (more than one if the name is repeated)
+    """
+    eng = engine or _get_engine(connection_string, driver, server, database)
+    return _get_texts(eng, doc_names, name, name_col, text_col)
+
+
+def _get_texts(eng, doc_names, name, name_col, text_col):
+    texts = collections.defaultdict(list)
+    if not doc_names:
+        return texts
+    query = sqla.text(
+        f'select {name_col}, {text_col} from {name} where {name_col} in :names'
+    ).bindparams(sqla.bindparam('names', expanding=True))
+    for doc_name, text in eng.execute(query, names=list(set(doc_names))):
+        texts[doc_name].append(text)
+    return texts
+
+
+def _get_shard_from_sql(eng, name, name_col, text_col, shard, batch_size=1000):
+    """
+    Read all names, but only the text of documents in the shard
+
+    NB: for duplicate names, the database is assumed to return rows in a consistent order
+    """
+    doc_names = [doc_name for doc_name, in eng.execute(f'select {name_col} from {name}')]
+    seen = collections.Counter()
+    for i in range(0, len(doc_names), batch_size):
+        batch = doc_names[i:i + batch_size]
+        selected = {doc_name for doc_name in batch if in_shard(doc_name, **shard)}
+        texts = _get_texts(eng, selected, name, name_col, text_col)
+        for doc_name in batch:
+            if doc_name in selected:
+                yield doc_name, texts[doc_name][seen[doc_name]]
+                seen[doc_name] += 1
+            else:
+                yield doc_name, None
+
+
+def get_next_record_from_corpus(directory=None, directories=None, version=None,
+                                connections=None, skipper=None, start=0, end=None,
+                                filenames=None, encoding='utf8', checkpoint=None,
+                                shard=None, shard_index=None):
+    """
+    Same selection as `get_next_from_corpus`, but without building the Document
+
+    Files are only read once selected.
+
+    :param checkpoint: if included, resume after the last completed document
+        and report the position of each record read
+    :param shard: dict with index and count: only include documents in this shard
+        (`start` and `end` still refer to the whole corpus)
+    :param shard_index: if included, report the position of each record read
+    :return: iterator yielding (doc_name, path, text)
+    """
+    offset, i = (checkpoint.offset, checkpoint.index) if checkpoint else (0, -1)
+    for position, (doc_name, path, text) in enumerate(itertools.chain(
+        ((doc_name, path, None) for doc_name, path in
+         iter_directory_entries(directory, directories, version, filenames)),
+        get_next_from_connections(*connections or list(), shard=shard)
+    )):
+        if position < offset:  # completed before the checkpoint
+            continue
+        if skipper and doc_name in skipper:
+            continue
+        i += 1
+        if i < start:
+            continue
+        elif end and i >= end:
+            break
+        if shard and not in_shard(doc_name, **shard):
+            continue
+        if path:
+            try:
+                text = read_file(path, encoding)
+            except FileNotFoundError:
+                continue
+            path = None
+        if not text and not path:  # one of these required
+            continue
+        if checkpoint:
+            checkpoint.read(position, i)
+        if shard_index:
+            shard_index.read(position)
+        yield doc_name, path, text
 
 
 def get_next_from_corpus(directory=None, directories=None, version=None,
                          connections=None, skipper=None, start=0, end=None,
-                         filenames=None, encoding='utf8'):
+                         filenames=None, encoding='utf8', recording=RECORD_FULL, checkpoint=None,
+                         shard=None, shard_index=None):
     """
 
+    :param checkpoint: see `get_next_record_from_corpus`
+    :param shard: see `get_next_record_from_corpus`
+    :param shard_index: see `get_next_record_from_corpus`
+    :param recording: how much of each match to keep (see `new_match_cask`)
     :param filenames:
     :param encoding:
     :param connections:
@@ -79,21 +220,11 @@ def get_next_from_corpus(directory=None, directories=None, version=None,
     :param end:
     :return: iterator yielding documents
     """
-    i = -1
-    for doc_name, path, text in itertools.chain(
-        get_next_from_directory(directory, directories, version, filenames, encoding),
-        get_next_from_connections(*connections or list())
+    for doc_name, path, text in get_next_record_from_corpus(
+            directory, directories, version, connections, skipper,
+            start, end, filenames, encoding, checkpoint, shard, shard_index
     ):
-        if skipper and doc_name in skipper:
-            continue
-        i += 1
-        if i < start:
-            continue
-        elif end and i >= end:
-            break
-        if not text and not path:  # one of these required
-            continue
-        yield Document(doc_name, file=path, text=text)
+        yield Document(doc_name, file=path, text=text, recording=recording)
 
 
 class Skipper:
@@ -103,6 +234,7 @@ class Skipper:
         self.fh = None
         self.rebuild = rebuild  # ignore, rebuild loginfo
         self.ignore = ignore  # don't read in skips
+        self.append = False  # continue existing file (e.g., resuming from a checkpoint)
         self.skips = self._read_skips()
 
     def _read_skips(self):
@@ -122,7 +254,9 @@ class Skipper:
 
     def __enter__(self):
         if self.fp:
-            self.fh = open(self.fp, 'w' if self.rebuild else 'a')
+            if self.append:  # file may have been truncated since read
+                self.skips = self._read_skips()
+            self.fh = open(self.fp, 'w' if self.rebuild and not self.append else 'a')
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
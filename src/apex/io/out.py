@@ -1,10 +1,25 @@
+import contextlib
 import csv
 import datetime
+import hashlib
+import logging
 import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import sqlalchemy as sqla
 
 from apex.io import sqlai
+from apex.io.shard import get_shard_name, get_worker_name
 
 DATETIME_STR = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+LOG_HEADER = ['name', 'algorithm', 'status', 'result', 'matches', 'text']
+SNIPPET_COLUMN = 'snippet'
+SNIPPETS_EXTENSION = '.snippets'
 
 
 class NullFileWrapper:
@@ -24,7 +39,10 @@ class NullFileWrapper:
 
 class FileWrapper:
 
-    def __init__(self, file, path=None, header=None, encoding='utf8', **kwargs):
+    def __init__(self, file, path=None, header=None, encoding='utf8', buffer_size=-1, **kwargs):
+        """
+        :param buffer_size: bytes held before writing to disk (default: system default)
+        """
         if path:
             self.fp = os.path.join(path, file)
             os.makedirs(path, exist_ok=True)
@@ -33,11 +51,15 @@ class FileWrapper:
         self.fh = None
         self.header = header or []
         self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.append = False  # continue existing file (e.g., resuming from a checkpoint)
 
     def __enter__(self):
         if self.fp:
-            self.fh = open(self.fp, 'w', encoding=self.encoding)
-            self.writeline(self.header)
+            self.fh = open(self.fp, 'a' if self.append else 'w', encoding=self.encoding,
+                           buffering=self.buffer_size)
+            if not self.append:
+                self.writeline(self.header)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -66,9 +88,10 @@ class CsvFileWrapper(FileWrapper):
 
     def __enter__(self):
         if self.fp:
-            self.fh = open(self.fp, 'w', newline='')
+            self.fh = open(self.fp, 'a' if self.append else 'w', newline='', buffering=self.buffer_size)
             self.writer = csv.writer(self.fh)
-            self.writeline(self.header)
+            if not self.append:
+                self.writeline(self.header)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -89,43 +112,389 @@ class TsvFileWrapper(FileWrapper):
         super().writeline(line, sep=sep)
 
 
-class TableWrapper:
+class SnippetFileWrapper(TsvFileWrapper):
+    """
+    Text log which stores each distinct snippet (the `text` column) once: log rows
+        reference snippets by a hash of their text, and each snippet is written to
+        a side file (`<log>.snippets`) the first time it is seen.
+
+    Hashes already seen are kept in a temporary sqlite index next to the log rather
+        than in memory, so memory does not grow with the number of distinct snippets
+        (only the most recently seen, e.g., boilerplate, are also kept in memory).
+
+    Use `iter_log_rows` to read either kind of log as the full tsv rows.
+    """
+
+    def __init__(self, file, path=None, header=None, recent_size=10000, **kwargs):
+        """
+        :param recent_size: number of most recently seen hashes also kept in memory
+        """
+        super().__init__(file, path=path, header=header[:-1] + [SNIPPET_COLUMN], **kwargs)
+        self.snippets_fp = f'{self.fp}{SNIPPETS_EXTENSION}'
+        self.snippets_fh = None
+        self.index_dir = None
+        self.seen = None  # sqlite connection to the index
+        self.recent = OrderedDict()  # hash -> None, least recently seen first
+        self.recent_size = recent_size
+        self.header_pending = False
+
+    def __enter__(self):
+        self.index_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(self.fp) or None)
+        # only used by one thread at a time, though possibly not this one (see BackgroundWriter)
+        self.seen = sqlite3.connect(os.path.join(self.index_dir.name, 'seen.db'), check_same_thread=False)
+        self.seen.execute('PRAGMA journal_mode=OFF')  # discarded on exit
+        self.seen.execute('CREATE TABLE seen (key BLOB PRIMARY KEY) WITHOUT ROWID')
+        self.snippets_fh = open(self.snippets_fp, 'w', encoding=self.encoding, buffering=self.buffer_size)
+        self.snippets_fh.write(f'{SNIPPET_COLUMN}\ttext\n')
+        self.header_pending = not self.append  # written by FileWrapper.__enter__
+        super().__enter__()
+        self.header_pending = False
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super().__exit__(exc_type, exc_val, exc_tb)
+        if self.snippets_fh:
+            self.snippets_fh.close()
+        if self.seen:
+            self.seen.close()
+            self.index_dir.cleanup()
+
+    def writeline(self, line, sep='\t'):
+        if self.header_pending:
+            super().writeline(line, sep=sep)
+            return
+        *fields, text = line
+        text = self.clean(text)
+        digest = _get_snippet_digest(text)
+        key = digest.hex()
+        if digest in self.recent:
+            self.recent.move_to_end(digest)
+        else:
+            if self.seen.execute('INSERT OR IGNORE INTO seen VALUES (?)', (digest,)).rowcount:
+                self.snippets_fh.write(f'{key}\t{text}\n')
+            self.recent[digest] = None
+            if len(self.recent) > self.recent_size:
+                self.recent.popitem(last=False)
+        super().writeline(fields + [key], sep=sep)
+
+
+def _get_snippet_digest(text):
+    return hashlib.blake2b(text.encode('utf8'), digest_size=16).digest()
+
+
+def get_snippet_key(text):
+    """
+    :return: key of a snippet in a log with deduplicated snippets (128-bit hash, as hex)
+    """
+    return _get_snippet_digest(text).hex()
+
+
+def is_deduplicated_log(path, encoding='utf8'):
+    """
+    :return: True if the log was written by SnippetFileWrapper
+    """
+    with open(path, encoding=encoding) as fh:
+        return next(fh).rstrip('\n').split('\t')[-1] == SNIPPET_COLUMN
+
+
+def iter_snippets(path, encoding='utf8'):
+    """
+    :param path: log with deduplicated snippets
+    :return: iterator of (key, snippet) from its side file
+    """
+    with open(f'{path}{SNIPPETS_EXTENSION}', encoding=encoding) as fh:
+        next(fh)  # header
+        for line in fh:
+            key, text = line.rstrip('\n').split('\t', 1)
+            yield key, text
+
+
+def read_snippets(path, keys, encoding='utf8'):
+    """
+    Look up only some snippets (e.g., a sample) in a single pass over the side file
+    :param keys: set of snippet keys
+    :return: dict of key -> snippet
+    """
+    return {key: text for key, text in iter_snippets(path, encoding) if key in keys}
+
+
+@contextlib.contextmanager
+def _snippet_index(path, encoding='utf8'):
+    """
+    Snippets of a deduplicated log in a temporary sqlite file, so that looking them up
+        does not hold every snippet in memory
+    :return: function of key -> snippet
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, 'snippets.db'))
+        try:
+            conn.execute('CREATE TABLE snippets (key TEXT PRIMARY KEY, text TEXT) WITHOUT ROWID')
+            conn.executemany('INSERT OR IGNORE INTO snippets VALUES (?, ?)', iter_snippets(path, encoding))
+            conn.commit()
+            yield lambda key: conn.execute('SELECT text FROM snippets WHERE key=?', (key,)).fetchone()[0]
+        finally:
+            conn.close()
+
+
+def iter_log_rows(path, encoding='utf8', resolve=True):
+    """
+    Read a text log written by either TsvFileWrapper or SnippetFileWrapper
+
+    For a log with deduplicated snippets, the snippets are first copied to a temporary
+        sqlite index (memory does not grow with the number of snippets, but each row
+        needs a lookup). To look up only some snippets, use `resolve=False` and then
+        `read_snippets`.
+
+    :param path: log file (for a SnippetFileWrapper, its snippets are read from `<path>.snippets`)
+    :param resolve: if False, the text column of a log with deduplicated snippets is
+        the snippet's key
+    :return: iterator of [name, algorithm, status, result, matches, text]
+    """
+    deduplicated = resolve and is_deduplicated_log(path, encoding)
+    with open(path, encoding=encoding) as fh, \
+            (_snippet_index(path, encoding) if deduplicated else contextlib.nullcontext()) as get_snippet:
+        n_columns = len(next(fh).split('\t'))
+        for line in fh:
+            row = line.rstrip('\n').split('\t', n_columns - 1)
+            if deduplicated:
+                row[-1] = get_snippet(row[-1])
+            yield row
+
+
+def expand_log(path, output, encoding='utf8'):
+    """
+    Write a log with deduplicated snippets as the full tsv log
+    """
+    with open(output, 'w', encoding=encoding) as out:
+        out.write('\t'.join(LOG_HEADER) + '\n')
+        for row in iter_log_rows(path, encoding):
+            out.write('\t'.join(row) + '\n')
+
+
+class BackgroundWriter:
+    """
+    Hand rows to a dedicated thread which formats and writes them, so that writing
+        overlaps with running the algorithms. The queue is bounded: once full,
+        `writeline` waits for the writer (rather than holding every row in memory).
+
+    Rows are written in the order they were added. Accessing `fh` (e.g., to flush
+        and fsync before a checkpoint) first waits until all queued rows are written.
+    """
+    _STOP = object()
+
+    def __init__(self, wrapper, queue_size=10000):
+        """
+        :param wrapper: FileWrapper or TableWrapper
+        :param queue_size: maximum number of rows waiting to be written
+        """
+        self.wrapper = wrapper
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.error = None
+
+    @property
+    def fp(self):
+        return getattr(self.wrapper, 'fp', None)
+
+    @fp.setter
+    def fp(self, value):
+        self.wrapper.fp = value
+
+    @property
+    def append(self):
+        return self.wrapper.append
+
+    @append.setter
+    def append(self, value):
+        self.wrapper.append = value
+
+    @property
+    def fh(self):
+        self.queue.join()
+        self._raise_error()
+        return getattr(self.wrapper, 'fh', None)
+
+    def __enter__(self):
+        self.wrapper.__enter__()
+        self.thread = threading.Thread(target=self._write, name='apex-writer', daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.queue.put(self._STOP)
+        self.thread.join()
+        self.wrapper.__exit__(exc_type, exc_val, exc_tb)
+        if exc_type is None:
+            self._raise_error()
+
+    def _write(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                if self.error is None:  # after an error, keep draining so writeline never blocks
+                    line, kwargs = item
+                    self.wrapper.writeline(line, **kwargs)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise IOError(f'Failed to write to {self.fp}') from self.error
+
+    def writeline(self, line, **kwargs):
+        self._raise_error()
+        self.queue.put((line, kwargs))
+
+    def flush(self):
+        self.queue.join()
+        self._raise_error()
+        if hasattr(self.wrapper, 'flush'):
+            self.wrapper.flush()
 
-    def __init__(self, tablename, driver, server, database, **kwargs):
-        self.eng = sqlai.get_engine(driver=driver, server=server, database=database)
+
+class TableWrapper:
+    """
+    Write rows to a new database table in batches: each batch is a single parameterized
+        `executemany` within its own transaction
+
+    NB: missing values (e.g., no date) are written as NULL; before batching, rows were
+        formatted into the statement, which wrote the text 'None'
+    """
+
+    def __init__(self, tablename, driver=None, server=None, database=None, connection_string=None,
+                 batch_size=1000, flush_interval=None, fast_executemany=False, **kwargs):
+        """
+        :param batch_size: number of rows written at once
+        :param flush_interval: if included, also write buffered rows once this many seconds
+            have passed since the last write (checked when a row is added)
+        :param fast_executemany: send each batch as a single bulk call (pyodbc only)
+        """
+        if connection_string:
+            self.eng = sqlai.get_engine(connection_string=connection_string)
+        else:
+            self.eng = sqlai.get_engine(driver=driver, server=server, database=database)
         self.tablename = f'{tablename}'
+        self.table = sqla.Table(
+            self.tablename, sqla.MetaData(),
+            sqla.Column('name', sqla.String(100)),
+            sqla.Column('algorithm', sqla.String(100)),
+            sqla.Column('value', sqla.Integer),
+            sqla.Column('category', sqla.String(100)),
+            sqla.Column('date', sqla.String(200)),
+            sqla.Column('extras', sqla.String(200)),
+        )
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.last_flush = time.monotonic()
+        if fast_executemany:
+            self._set_fast_executemany()
+
+    def _set_fast_executemany(self):
+        if self.eng.dialect.driver != 'pyodbc':
+            logging.warning(f'fast_executemany is only supported by pyodbc, not {self.eng.dialect.driver}')
+            return
+
+        @sqla.event.listens_for(self.eng, 'before_cursor_execute')
+        def set_fast_executemany(conn, cursor, statement, parameters, context, executemany):
+            if executemany:
+                cursor.fast_executemany = True
 
     def __enter__(self):
-        self.eng.execute(f'create table {self.tablename} '
-                         f'(name varchar(100), algorithm varchar(100), value int, '
-                         f'category varchar(100), date varchar(200), extras varchar(200))')
+        self.table.create(self.eng)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.eng.dispose()
+        try:
+            self.flush()  # rows of completed documents, even if the run failed
+        finally:
+            self.eng.dispose()
 
     def writeline(self, line):
-        self.eng.execute(f"insert into {self.tablename} (name, algorithm, value, category, date, extras) "
-                         f"VALUES ('{line[0]}', '{line[1]}', {line[2]}, '{line[3]}', '{line[4]}', '{line[5]}')")
+        name, algorithm, value, category, date, extras = line
+        self.rows.append({
+            'name': str(name),
+            'algorithm': algorithm,
+            'value': value,
+            'category': None if category is None else str(category),
+            'date': None if date is None else str(date),
+            'extras': None if extras is None else str(extras),
+        })
+        if len(self.rows) >= self.batch_size or (
+                self.flush_interval is not None and time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            with self.eng.begin() as conn:
+                conn.execute(self.table.insert(), self.rows)
+            self.rows = []
+        self.last_flush = time.monotonic()
 
 
 def get_file_wrapper(name=None, kind=None, path=None,
-                     driver=None, server=None, database=None, **kwargs):
+                     driver=None, server=None, database=None, shard=None, worker=None,
+                     background=False, queue_size=10000, buffer_size=-1, **kwargs):
+    """
+    :param shard: dict with index and count: output file is named for the shard
+    :param worker: output file is named for this worker (see `WorkQueue`)
+    :param background: if True, rows are formatted and written by a separate thread
+        (see `BackgroundWriter`)
+    :param queue_size: maximum number of rows waiting for the background thread
+    :param buffer_size: bytes held before writing to disk (file output)
+    :param kwargs: for sql output, connection_string, batch_size, flush_interval, and fast_executemany;
+        for parquet/arrow output, row_group_size and compression
+    """
     if not name:
         return NullFileWrapper()
     name = name.replace('{datetime}', DATETIME_STR)
+    if shard:
+        name = get_shard_name(name, **shard)
+    if worker:
+        name = get_worker_name(name, worker)
     if kind == 'csv':
-        return CsvFileWrapper(name, path, header=['name', 'algorithm', 'value', 'category', 'date', 'extras'])
+        wrapper = CsvFileWrapper(name, path, header=['name', 'algorithm', 'value', 'category', 'date', 'extras'],
+                                 buffer_size=buffer_size)
     elif kind == 'sql':
-        return TableWrapper(name, driver, server, database)
+        wrapper = TableWrapper(name, driver, server, database, **kwargs)
+    elif kind in ('parquet', 'arrow'):
+        from apex.io.arrow import ArrowFileWrapper  # only import pyarrow if needed
+        wrapper = ArrowFileWrapper(name, path, kind=kind, **kwargs)
     else:
         raise ValueError('Unrecognized output file type.')
-
-
-def get_logging(directory='.', ignore=False):
+    return BackgroundWriter(wrapper, queue_size) if background else wrapper
+
+
+def get_logging(directory='.', ignore=False, shard=None, worker=None, background=False, queue_size=10000,
+                buffer_size=-1, kind='tsv', row_group_size=100000, compression=None):
+    """
+    :param kind: tsv, dedup (tsv storing each distinct snippet once; see `SnippetFileWrapper`),
+        or parquet/arrow (see `ArrowFileWrapper`)
+    :param background: if True, rows are formatted and written by a separate thread
+        (see `BackgroundWriter`)
+    :param queue_size: maximum number of rows waiting for the background thread
+    :param buffer_size: bytes held before writing to disk
+    """
     if ignore:
         return NullFileWrapper()
     else:
-        return TsvFileWrapper(path=directory,
-                              file=f'text_{DATETIME_STR}.out',
-                              header=['name', 'algorithm', 'status', 'result', 'matches', 'text'])
+        file = f'text_{DATETIME_STR}.out' if kind in ('tsv', 'dedup') else f'text_{DATETIME_STR}.{kind}'
+        if shard:
+            file = get_shard_name(file, **shard)
+        if worker:
+            file = get_worker_name(file, worker)
+        if kind in ('parquet', 'arrow'):
+            from apex.io.arrow import ArrowFileWrapper, LOG_COLUMNS
+            wrapper = ArrowFileWrapper(file, directory, columns=LOG_COLUMNS, kind=kind,
+                                       row_group_size=row_group_size, compression=compression)
+        elif kind == 'tsv':
+            wrapper = TsvFileWrapper(path=directory, file=file, header=LOG_HEADER, buffer_size=buffer_size)
+        elif kind == 'dedup':
+            wrapper = SnippetFileWrapper(path=directory, file=file, header=LOG_HEADER, buffer_size=buffer_size)
+        else:
+            raise ValueError('Unrecognized log file type.')
+        return BackgroundWriter(wrapper, queue_size) if background else wrapper
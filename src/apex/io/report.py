@@ -1,4 +1,4 @@
-from apex.algo.iud_insertion import Result
+from apex.algo.result import Result
 
 
 class Reporter:
@@ -18,29 +18,42 @@ class Reporter:
         self.unk = 0
 
     def update(self, result: Result):
-        if result.result >= 1:
+        self.add(result.result, result.expected)
+
+    def add(self, result, expected=None):
+        """
+        :param result: value of the Result (e.g., replayed from a cache)
+        :param expected: annotated value
+        """
+        if result >= 1:
             self.pos += 1
-            if result.expected == result.result:
+            if expected == result:
                 self.tp += 1
-            elif result.expected == -1:
+            elif expected == -1:
                 self.fp += 1
-            elif result.expected is not None:
+            elif expected is not None:
                 self.error += 1
-        elif result.result == -1:
+        elif result == -1:
             self.neg += 1
-            if result.expected == 1:
+            if expected == 1:
                 self.fn += 1
-            elif result.expected == -1:
+            elif expected == -1:
                 self.tn += 1
-        elif result.result == 0:
+        elif result == 0:
             self.neutral += 1
-            if result.expected == 0:
+            if expected == 0:
                 self.tp += 1
-            elif result.expected == -1:
+            elif expected == -1:
                 self.fp += 1
         else:
             self.unk += 1
 
+    def __iadd__(self, other):
+        """Combine counts, e.g., from Reporters kept by separate workers"""
+        for key, value in vars(other).items():
+            setattr(self, key, getattr(self, key) + value)
+        return self
+
     def __repr__(self):
         return f'[{self.tp}-{self.fp} ({self.error})/{self.fn}-{self.tn}]:{self.pos}+{self.neutral}/{self.neg}:{self.unk}'
 
@@ -0,0 +1,169 @@
+"""
+Split a corpus across several runs (e.g., on different nodes sharing a filesystem)
+    and merge their output.
+
+Each document is assigned to a shard by a hash of its name, so every run agrees
+    without coordination and only reads the text of its own documents. Along with
+    its (csv) output, each shard writes:
+    * <output>.index: position in the corpus of each document with output rows
+    * <output>.json: Reporter counts
+
+`merge_shards` interleaves the shards' rows in corpus order and combines the
+    Reporters, giving the same result as a single run.
+"""
+import collections
+import csv
+import heapq
+import json
+import os
+import zlib
+
+from apex.io.report import Reporter
+
+
+def in_shard(doc_name, index, count):
+    """
+    :param doc_name: name of document (from file name or database)
+    :param index: this shard (0 to count - 1)
+    :param count: number of shards
+    :return: True if document belongs to this shard
+    """
+    return zlib.crc32(str(doc_name).encode('utf8')) % count == index
+
+
+def get_shard_name(name, index, count):
+    """
+    :param name: output file name; may include '{shard}'
+    :return: name of this shard's output file
+    """
+    return _add_to_name(name, 'shard', f'{index}of{count}')
+
+
+def get_worker_name(name, worker):
+    """
+    :param name: output file name; may include '{worker}'
+    :return: name of this worker's output file (see `WorkQueue`)
+    """
+    return _add_to_name(name, 'worker', worker)
+
+
+def _add_to_name(name, key, value):
+    if f'{{{key}}}' in name:
+        return name.replace(f'{{{key}}}', value)
+    root, ext = os.path.splitext(name)
+    return f'{root}_{value}{ext}'
+
+
+class ShardIndex:
+    """Position in the corpus of each document with output rows"""
+
+    def __init__(self, output_path):
+        self.fp = f'{output_path}.index'
+        self.fh = None
+        self.append = False  # continue existing file (e.g., resuming from a checkpoint)
+        self.positions = collections.deque()  # documents read, not completed
+        self.rows = 0
+
+    def __enter__(self):
+        self.fh = open(self.fp, 'a' if self.append else 'w')
+        if not self.append:
+            self.fh.write('position\trows\n')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.fh.close()
+
+    def read(self, position):
+        """
+        :param position: of the record in the corpus (see `get_next_record_from_corpus`)
+        """
+        self.positions.append(position)
+
+    def add_row(self):
+        self.rows += 1
+
+    def done(self):
+        """Mark the oldest document read as complete (all rows since the last are its own)"""
+        position = self.positions.popleft()
+        if self.rows:
+            self.fh.write(f'{position}\t{self.rows}\n')
+            self.rows = 0
+
+
+def write_shard_results(output_path, shard, results):
+    """
+    :param output_path: shard's output file
+    :param shard: dict with index and count
+    :param results: dict of algorithm name -> Reporter
+    """
+    with open(f'{output_path}.json', 'w') as out:
+        json.dump({
+            'shard': shard,
+            'results': {name: vars(reporter) for name, reporter in results.items()},
+        }, out)
+
+
+def iter_output_rows(path):
+    """
+    :param path: output file of a shard (or worker)
+    :return: (header, iterator of (position, rows of document))
+    """
+    fh = open(path, newline='')
+    reader = csv.reader(fh)
+    header = next(reader)
+
+    def iter_documents():
+        with fh, open(f'{path}.index') as index:
+            next(index)  # header
+            for line in index:
+                position, rows = line.split('\t')
+                yield int(position), [next(reader) for _ in range(int(rows))]
+
+    return header, iter_documents()
+
+
+def merge_shards(paths, output):
+    """
+    Combine the output of every shard as if from a single run
+    :param paths: output files of each shard
+    :param output: merged csv file
+    :return: dict of algorithm name -> Reporter
+    """
+    results = {}
+    shards = set()
+    count = None
+    iterators = []
+    header = None
+    for path in paths:
+        with open(f'{path}.json') as fh:
+            saved = json.load(fh)
+        count = count or saved['shard']['count']
+        if saved['shard']['count'] != count or saved['shard']['index'] in shards:
+            raise ValueError(f'Shard does not belong with others: {path}')
+        shards.add(saved['shard']['index'])
+        for name, state in saved['results'].items():
+            reporter = Reporter()
+            vars(reporter).update(state)
+            if name in results:
+                results[name] += reporter
+            else:
+                results[name] = reporter
+        header, iterator = iter_output_rows(path)
+        iterators.append(iterator)
+    if shards != set(range(count or 0)):
+        raise ValueError(f'Missing shards: {sorted(set(range(count or 0)) - shards)}')
+    write_merged(header, iterators, output)
+    return results
+
+
+def write_merged(header, iterators, output):
+    """
+    :param header: of the output files
+    :param iterators: of (position, rows of document) for each output file, see `iter_output_rows`
+    :param output: merged csv file
+    """
+    with open(output, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(header)
+        for _, rows in heapq.merge(*iterators, key=lambda x: x[0]):
+            writer.writerows(rows)
@@ -0,0 +1,391 @@
+"""
+Work queue for any number of runs (e.g., on machines sharing a filesystem), kept in
+    a sqlite file: no coordinator is needed.
+
+The first run lists the selected documents (without reading them) and splits them
+    into chunks of consecutive documents. Each run then repeatedly leases a chunk,
+    processes it, and marks it done. Leases are renewed while a chunk is in progress;
+    if a run crashes, its lease expires and another run reclaims the chunk.
+
+Each run writes its own output (named for the worker) and index of the corpus
+    position of its rows (see `ShardIndex`). The Reporter counts for each chunk are
+    kept in the queue. `merge_queue` combines the output of all runs in corpus order,
+    taking each chunk's rows (and counts) only from the run which completed it.
+
+NB: sqlite locking requires a filesystem which supports it (some network filesystems
+    do not), and lease expiry assumes the machines' clocks roughly agree
+"""
+import bisect
+import collections
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+from apex.io.corpus import iter_directory_entries, get_names_from_sql, get_texts_from_sql, read_file, \
+    get_connection_engine
+from apex.io.report import Reporter
+from apex.io.shard import iter_output_rows, write_merged
+
+TODO = 'todo'
+LEASED = 'leased'
+DONE = 'done'
+
+BUSY_TIMEOUT = 3600  # seconds to wait on other runs (e.g., while the first lists the corpus)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    position INTEGER PRIMARY KEY, chunk INTEGER, name, path TEXT, source INTEGER, occurrence INTEGER
+);
+CREATE INDEX IF NOT EXISTS documents_chunk ON documents (chunk);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY, status TEXT, worker TEXT, lease_until REAL, attempts INTEGER, results TEXT
+);
+CREATE TABLE IF NOT EXISTS workers (worker TEXT PRIMARY KEY, output TEXT);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+'''
+
+
+def iter_queue_entries(directory=None, directories=None, version=None, connections=None,
+                       skipper=None, start=0, end=None, filenames=None, **kwargs):
+    """
+    Documents selected as by `get_next_record_from_corpus`, without reading their text
+    :return: iterator of (position, doc_name, path, source, occurrence);
+        path for files; index of connection (source) and nth row with this name
+        (occurrence) for databases
+    """
+    sources = itertools.chain(
+        ((doc_name, path, None) for doc_name, path in
+         iter_directory_entries(directory, directories, version, filenames)),
+        ((doc_name, None, source) for source, connection in enumerate(connections or [])
+         for doc_name in get_names_from_sql(**connection))
+    )
+    seen = collections.Counter()
+    i = -1
+    for position, (doc_name, path, source) in enumerate(sources):
+        occurrence = None
+        if source is not None:
+            occurrence = seen[(source, doc_name)]
+            seen[(source, doc_name)] += 1
+        if skipper and doc_name in skipper:
+            continue
+        i += 1
+        if i < start:
+            continue
+        elif end and i >= end:
+            break
+        yield position, doc_name, path, source, occurrence
+
+
+class WorkQueue:
+
+    def __init__(self, path, chunksize=100, lease=600, worker=None):
+        """
+        :param path: sqlite file shared by all runs (created if missing)
+        :param chunksize: number of documents in each chunk
+        :param lease: seconds before a chunk which has not been completed (or renewed)
+            can be reclaimed
+        :param worker: name of this run (default: host, process id, and random suffix)
+        """
+        self.path = path
+        self.chunksize = chunksize
+        self.lease = lease
+        self.worker = worker or f'{socket.gethostname()}_{os.getpid()}_{uuid.uuid4().hex[:8]}'
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+        self.chunks = collections.deque()  # [chunk, documents not done, all read] in order read
+        self.files = []
+        self.results = {}
+        self.snapshot = {}  # Reporter counts when the last chunk was completed
+        self.renewed = time.time()
+        self.completed = 0
+        self.lost = 0
+        self.exhausted = False  # no chunks remain to be claimed (or reclaimed)
+
+    def _transaction(self):
+        self.conn.execute('BEGIN IMMEDIATE')  # only one run writes at a time
+
+    def fill(self, entries):
+        """
+        Add the corpus to the queue, unless another run already has
+        :param entries: iterator of (position, doc_name, path, source, occurrence), see `iter_queue_entries`
+        :return: True if this run filled the queue
+        """
+        self._transaction()
+        try:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key='filled'").fetchone():
+                self.conn.execute('COMMIT')
+                return False
+            n_docs = 0
+            for batch in iter(lambda: list(itertools.islice(entries, self.chunksize)), []):
+                chunk = n_docs // self.chunksize
+                self.conn.executemany('INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)',
+                                      ((position, chunk, doc_name, path, source, occurrence)
+                                       for position, doc_name, path, source, occurrence in batch))
+                self.conn.execute('INSERT INTO chunks VALUES (?, ?, NULL, NULL, 0, NULL)', (chunk, TODO))
+                n_docs += len(batch)
+            self.conn.execute("INSERT INTO meta VALUES ('filled', ?)", (str(n_docs),))
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        logging.info(f'Filled work queue with {n_docs} documents')
+        return True
+
+    def register(self, output_path, results, files):
+        """
+        :param output_path: this run's output file (for `merge_queue`)
+        :param results: dict of algorithm name -> Reporter (updated as documents are done)
+        :param files: output files flushed before a chunk is marked done
+        """
+        self.conn.execute('INSERT OR REPLACE INTO workers VALUES (?, ?)', (self.worker, os.path.abspath(output_path)))
+        self.results = results
+        self.files = files
+        self.snapshot = {name: dict(vars(reporter)) for name, reporter in results.items()}
+
+    def claim(self):
+        """
+        Lease the next chunk which is neither done nor leased (or whose lease has expired)
+
+        If other runs still hold leases, wait in case they crash and their chunks
+            need to be reclaimed. However, if this run still has chunks in progress,
+            return None instead: when documents are read ahead (e.g., a parallel run),
+            those chunks can only be done once reading stops, and waiting here would
+            hold up every run. `exhausted` is only set once no work remains.
+
+        :return: chunk id or None if no work remains (or this run must first finish its chunks)
+        """
+        while True:
+            now = time.time()
+            self._transaction()
+            row = self.conn.execute(
+                'SELECT id, attempts FROM chunks WHERE status=? OR (status=? AND lease_until<?) ORDER BY id LIMIT 1',
+                (TODO, LEASED, now)
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    'UPDATE chunks SET status=?, worker=?, lease_until=?, attempts=attempts + 1 WHERE id=?',
+                    (LEASED, self.worker, now + self.lease, row[0])
+                )
+            self.conn.execute('COMMIT')
+            if row:
+                if row[1]:
+                    logging.warning(f'Reclaimed chunk {row[0]} (lease expired)')
+                return row[0]
+            if not self.conn.execute('SELECT 1 FROM chunks WHERE status=? AND worker!=? LIMIT 1',
+                                     (LEASED, self.worker)).fetchone():
+                self.exhausted = True
+                return None
+            if self.chunks:  # finish (and release) this run's chunks before waiting on others
+                return None
+            time.sleep(min(self.lease / 10, 30))
+
+    def get_documents(self, chunk):
+        """
+        :return: list of (position, doc_name, path, source, occurrence) in corpus order
+        """
+        return self.conn.execute(
+            'SELECT position, name, path, source, occurrence FROM documents WHERE chunk=? ORDER BY position',
+            (chunk,)
+        ).fetchall()
+
+    def read(self, chunk):
+        """Record a document read from this chunk"""
+        if not self.chunks or self.chunks[-1][0] != chunk:
+            self.chunks.append([chunk, 0, False])
+        self.chunks[-1][1] += 1
+
+    def finish_reading(self, chunk):
+        """All documents in this chunk have been read"""
+        if not self.chunks or self.chunks[-1][0] != chunk:
+            self.chunks.append([chunk, 0, False])  # e.g., no text
+        self.chunks[-1][2] = True
+        self._complete_ready()
+
+    def done(self):
+        """Mark the oldest document read as complete"""
+        self.chunks[0][1] -= 1
+        self._complete_ready()
+        if time.time() - self.renewed > self.lease / 4:
+            self.renew()
+
+    def renew(self):
+        """Extend leases of chunks in progress"""
+        self.renewed = time.time()
+        self.conn.execute('UPDATE chunks SET lease_until=? WHERE worker=? AND status=?',
+                          (self.renewed + self.lease, self.worker, LEASED))
+
+    def _complete_ready(self):
+        while self.chunks and self.chunks[0][2] and not self.chunks[0][1]:
+            self._complete(self.chunks.popleft()[0])
+
+    def _complete(self, chunk):
+        for wrapper in self.files:  # output must be saved before the chunk is done
+            if wrapper.fh:
+                wrapper.fh.flush()
+                os.fsync(wrapper.fh.fileno())
+        counts = {}
+        for name, reporter in self.results.items():
+            current = dict(vars(reporter))
+            counts[name] = {key: value - self.snapshot[name].get(key, 0) for key, value in current.items()}
+            self.snapshot[name] = current
+        cur = self.conn.execute('UPDATE chunks SET status=?, results=? WHERE id=? AND worker=? AND status=?',
+                                (DONE, json.dumps(counts), chunk, self.worker, LEASED))
+        if cur.rowcount:
+            self.completed += 1
+        else:
+            self.lost += 1
+            logging.warning(f'Lease on chunk {chunk} was lost: output from this run will not be merged')
+
+    def get_progress(self):
+        """
+        :return: dict of status -> number of chunks
+        """
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM chunks GROUP BY status'))
+
+    def close(self):
+        self.conn.close()
+
+    def __str__(self):
+        return f'{self.worker}: {self.completed} chunks completed ({self.lost} lost)'
+
+
+def get_next_record_from_queue(queue: WorkQueue, connections=None, encoding='utf8', shard_index=None,
+                               engines=None):
+    """
+    Claim chunks until no work remains, or until this run must finish the chunks it
+        has read before waiting for other runs (see `WorkQueue.claim`)
+    :param connections: database connections of the corpus (see `iter_queue_entries`)
+    :param shard_index: report the position of each record read
+    :param engines: dict of source -> engine, filled as connections are first used;
+        include to reuse engines across calls
+    :return: iterator yielding (doc_name, path, text)
+    """
+    if engines is None:
+        engines = {}
+    while True:
+        chunk = queue.claim()
+        if chunk is None:
+            break
+        documents = queue.get_documents(chunk)
+        texts = {}
+        for source in {source for *_, source, _ in documents if source is not None}:
+            if source not in engines:
+                engines[source] = get_connection_engine(**connections[source])
+            texts[source] = get_texts_from_sql([doc_name for _, doc_name, _, src, _ in documents if src == source],
+                                               **connections[source], engine=engines[source])
+        for position, doc_name, path, source, occurrence in documents:
+            if path:
+                try:
+                    text = read_file(path, encoding)
+                except FileNotFoundError:
+                    continue
+            else:
+                text = texts[source][doc_name][occurrence]
+            if not text:
+                continue
+            queue.read(chunk)
+            if shard_index:
+                shard_index.read(position)
+            yield doc_name, None, text
+        queue.finish_reading(chunk)
+
+
+def get_work_queue(path=None, chunksize=100, lease=600):
+    """
+    :return: WorkQueue or None if no path
+    """
+    if not path:
+        return None
+    logging.info(f'Using work queue: {path}')
+    return WorkQueue(path, chunksize, lease)
+
+
+def merge_queue(path, output):
+    """
+    Combine the output of every run of a completed queue as if from a single run
+    :param path: sqlite file of the queue
+    :param output: merged csv file
+    :return: dict of algorithm name -> Reporter
+    """
+    conn = sqlite3.connect(path)
+    owners = {}
+    results = {}
+    for chunk, status, worker, counts in conn.execute('SELECT id, status, worker, results FROM chunks'):
+        if status != DONE:
+            raise ValueError(f'Work queue is not finished: chunk {chunk} is {status}')
+        owners[chunk] = worker
+        for name, state in json.loads(counts).items():
+            reporter = Reporter()
+            vars(reporter).update(state)
+            if name in results:
+                results[name] += reporter
+            else:
+                results[name] = reporter
+    chunk_of = _get_chunk_lookup(conn)
+    iterators = []
+    header = None
+    for worker, worker_output in conn.execute('SELECT worker, output FROM workers'):
+        if worker not in owners.values():  # completed no chunks
+            continue
+        header, owned = _get_owned_rows(worker_output, worker, owners, chunk_of)
+        iterators.extend(owned)
+    conn.close()
+    if header is None:
+        raise ValueError('No output to merge.')
+    write_merged(header, iterators, output)
+    return results
+
+
+def _get_chunk_lookup(conn):
+    """
+    Each chunk is a range of consecutive positions (see `WorkQueue.fill`), so only the
+        first position of each chunk is kept
+    :return: function of position -> chunk
+    """
+    starts, chunks = [], []
+    for chunk, start in conn.execute('SELECT chunk, MIN(position) FROM documents GROUP BY chunk ORDER BY 2'):
+        starts.append(start)
+        chunks.append(chunk)
+
+    def chunk_of(position):
+        return chunks[bisect.bisect_right(starts, position) - 1]
+
+    return chunk_of
+
+
+def _get_owned_rows(path, worker, owners, chunk_of):
+    """
+    Rows from chunks completed by this worker (others may have been reclaimed)
+
+    Reclaimed chunks are processed after later chunks: their rows are read into memory
+        so that each iterator is in corpus order.
+
+    :param chunk_of: function of position -> chunk (see `_get_chunk_lookup`)
+    :return: (header, list of iterators of (position, rows of document))
+    """
+    reclaimed = set()  # chunks processed after a later chunk
+    latest = -1
+    with open(f'{path}.index') as fh:
+        next(fh)  # header
+        for line in fh:
+            position = int(line.split('\t')[0])
+            chunk = chunk_of(position)
+            if owners[chunk] != worker:
+                continue
+            if position < latest:
+                reclaimed.add(chunk)
+            else:
+                latest = position
+    header, documents = iter_output_rows(path)
+    out_of_order = sorted((position, rows) for position, rows in documents if chunk_of(position) in reclaimed)
+    _, documents = iter_output_rows(path)
+    return header, [
+        ((position, rows) for position, rows in documents
+         if owners[chunk_of(position)] == worker and chunk_of(position) not in reclaimed),
+        iter(out_of_order),
+    ]
@@ -1,10 +1,20 @@
+import contextlib
+import itertools
 import logging
 from collections import defaultdict
 
-from apex.algo import ALGORITHMS
-from apex.io.corpus import get_next_from_corpus, Skipper
-from apex.io.out import get_file_wrapper, get_logging
+from apex.algo import get_algorithms
+from apex.algo.pattern import Document, RECORD_FULL, RECORD_OFF, set_regex_engine, set_sentence_cache
+from apex.algo.prefilter import Prefilter
+from apex.algo.profiler import enable_profiling, disable_profiling
+from apex.io.cache import get_result_cache
+from apex.io.checkpoint import get_checkpoint
+from apex.io.corpus import get_next_record_from_corpus, Skipper
+from apex.io.out import get_file_wrapper, get_logging, NullFileWrapper, BackgroundWriter
 from apex.io.report import Reporter
+from apex.io.shard import ShardIndex, write_shard_results
+from apex.io.workqueue import get_work_queue, get_next_record_from_queue, iter_queue_entries
+from apex.runner import process_serial, process_parallel, create_pool, OUTPUT, LOG, DONE
 from apex.schema import validate_config
 from apex.util import kw
 
@@ -26,47 +36,139 @@ def parse_annotation_files(*configs, data=None):
     return data
 
 
-def get_algorithms(names=None):
-    if not names:
-        return ALGORITHMS
-    return {x: ALGORITHMS[x] for x in ALGORITHMS if x in names}
+def validate_options(output, loginfo, shard=None, queue=None, checkpoint=None):
+    """
+    Check options which cannot be used together before anything is opened or created
+    :raises ValueError:
+    """
+    if shard and not 0 <= shard['index'] < shard['count']:
+        raise ValueError(f'Shard index must be less than count: {shard}')
+    if shard and output.get('kind') != 'csv':
+        raise ValueError('Sharding requires csv output.')
+    if queue.get('path') and (shard or checkpoint.get('path') or output.get('kind') != 'csv'):
+        raise ValueError('Work queue requires csv output (and cannot be used with shard or checkpoint).')
+    if checkpoint.get('path') and (output.get('kind') in ('sql', 'parquet', 'arrow')
+                                   or loginfo.get('kind', 'tsv') != 'tsv'):
+        raise ValueError('Checkpoint requires csv output (and tsv log).')
 
 
 def process(corpus=None, annotation=None, annotations=None, output=None, select=None,
-            algorithm=None, loginfo=None, skipinfo=None, logger=None):
+            algorithm=None, loginfo=None, skipinfo=None, logger=None, parallel=None,
+            regex=None, profile=None, cache=None, checkpoint=None, queue=None):
     if logger and not logger['verbose']:
         logging.basicConfig(level=logging.DEBUG)
     else:
         logging.basicConfig(level=logging.INFO)
+    loginfo = kw(loginfo)
+    select = kw(select)
+    shard = select.get('shard')
+    queue = kw(queue)
+    checkpoint = kw(checkpoint)
+    validate_options(output, loginfo, shard, queue, checkpoint)
+    if regex:
+        set_regex_engine(**regex)
+    profile = kw(profile)
+    profiler = enable_profiling() if profile.get('patterns') else None
+    cache = kw(cache)
+    sentence_cache = set_sentence_cache(cache.get('sentences'))
     truth = parse_annotation_file(**kw(annotation))
     truth = parse_annotation_files(*annotations or list(), data=truth)
-    algos = get_algorithms(**kw(algorithm))
+    algorithm = kw(algorithm)
+    use_prefilter = algorithm.pop('prefilter', False)
+    algos = get_algorithms(**algorithm)
     if not algos:
         raise ValueError('No algorithms specified!')
+    prefilter = Prefilter(algos) if use_prefilter else None
+    # matches are only used for the log
+    recording = loginfo.pop('matches', RECORD_OFF if loginfo.get('ignore') else RECORD_FULL)
+    result_cache = get_result_cache(cache.get('results'), algos, recording)
     results = {name: Reporter() for name in algos}
-    with get_file_wrapper(**output) as out, \
-            get_logging(**kw(loginfo)) as log, \
-            Skipper(**kw(skipinfo)) as skipper:
-        for i, doc in enumerate(get_next_from_corpus(**kw(corpus), **kw(select), skipper=skipper)):
-            for name, alg_func in algos.items():
-                max_res = None
-                for res in alg_func(doc, truth[doc.name]):
-                    if res:
-                        logging.debug(f'{i}: {doc.name}: {res}')
-                        out.writeline([doc.name, name, res.result, res.value, res.date, res.extras])
-                    elif res.is_skip():  # always skip
-                        skipper.add(doc.name)
-                        break
-                    log.writeline([doc.name, name, res.value, res.result, doc.matches, res.text])
-                    # only take max
-                    if not max_res or (res.result > max_res.result and res.confidence >= max_res.confidence ):
-                        max_res = res
-                else:  # avoid if skipped
-                    if max_res is not None:
-                        results[name].update(max_res)
-                        if max_res.expected is not None:
-                            logging.info(f'Validation for {doc.name}: {results}')
+    queue = get_work_queue(**queue)
+    worker = queue.worker if queue else None
+    out = get_file_wrapper(**output, shard=shard, worker=worker)
+    log = get_logging(**loginfo, shard=shard, worker=worker)
+    background_log = isinstance(log, BackgroundWriter)
+    skipper = Skipper(**kw(skipinfo))
+    shard_index = ShardIndex(out.fp) if shard or queue else None
+    checkpoint = get_checkpoint(**checkpoint)
+    if checkpoint:
+        checkpoint.resume_file('output', out)
+        checkpoint.resume_file('log', log)
+        checkpoint.resume_file('skips', skipper)
+        if shard_index:
+            checkpoint.resume_file('shard_index', shard_index)
+        checkpoint.resume_results(results)
+    with_log = not isinstance(log, NullFileWrapper)
+    # the same pool for every round (see `queue`)
+    pool = create_pool(algos, parallel.get('workers'), with_log, use_prefilter, recording,
+                       result_cache) if parallel else None
+    with out, log, skipper, shard_index or contextlib.nullcontext(), pool or contextlib.nullcontext():
+        if queue:
+            queue.fill(iter_queue_entries(**kw(corpus), **select, skipper=skipper))
+            queue.register(out.fp, results, [out, shard_index])
+            # records end early if this run must wait for other runs while its own chunks are
+            #  still being processed (i.e., read ahead by a parallel run): wait in the next round
+            engines = {}
+            rounds = (get_next_record_from_queue(queue, kw(corpus).get('connections'),
+                                                 select.get('encoding', 'utf8'), shard_index, engines)
+                      for _ in iter(lambda: queue.exhausted, True))
+        else:
+            rounds = [get_next_record_from_corpus(**kw(corpus), **select, skipper=skipper, checkpoint=checkpoint,
+                                                  shard_index=shard_index)]
+
+        def get_events(records):
+            if parallel:
+                return process_parallel(
+                    records, algos, results, truth, prefilter, with_log=with_log, recording=recording,
+                    result_cache=result_cache, pool=pool, **parallel
+                )
+            return process_serial(
+                (Document(doc_name, file=path, text=text, recording=recording) for doc_name, path, text in records),
+                algos, results, truth, prefilter, result_cache
+            )
+
+        events = itertools.chain.from_iterable(get_events(records) for records in rounds)
+        for kind, line in events:
+            if kind == OUTPUT:
+                out.writeline(line)
+                if shard_index:
+                    shard_index.add_row()
+            elif kind == LOG:
+                if background_log and not isinstance(line[4], str):
+                    line[4] = line[4].copy()  # matches are still accumulating (serial run)
+                log.writeline(line)
+            elif kind == DONE:
+                if shard_index:
+                    shard_index.done()
+                if queue:
+                    queue.done()
+                if checkpoint and checkpoint.done(line):
+                    if result_cache:
+                        result_cache.flush()
+                    checkpoint.save(results)
+            else:
+                skipper.add(line)
+        if shard:
+            write_shard_results(out.fp, shard, results)
+        if checkpoint:
+            checkpoint.save(results, complete=True)
+    if queue:
+        logging.warning(f'Work queue: {queue} {queue.get_progress()}')
+        queue.close()
+    if result_cache:
+        result_cache.close()
+        logging.warning(f'Result cache: {result_cache}')
+    if prefilter:
+        logging.warning(f'Documents spared by prefilter: {prefilter}')
     logging.warning(f'Final results: {results}')
+    if sentence_cache:
+        logging.warning(f'Sentence cache: {sentence_cache}')
+        set_sentence_cache(None)
+    if profiler:
+        logging.warning(f'Pattern profile (by total time):\n{profiler}')
+        if profile.get('path'):
+            profiler.write(profile['path'])
+        disable_profiling()
 
 
 def main(config_file):
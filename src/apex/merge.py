@@ -0,0 +1,33 @@
+"""
+Combine the output of runs over each shard of a corpus (see `select.shard` in the config),
+    or of the runs sharing a work queue (see `queue`), into the output of a single run.
+
+Usage: python -m apex merge OUTPUT SHARD_OUTPUT [SHARD_OUTPUT ...]
+       python -m apex merge --queue QUEUE OUTPUT
+"""
+import argparse
+import logging
+
+from apex.io.shard import merge_shards
+from apex.io.workqueue import merge_queue
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m apex merge', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', help='Merged csv file')
+    parser.add_argument('shards', nargs='*', help='Output csv file of each shard')
+    parser.add_argument('--queue', default=None, help='Work queue (sqlite file) shared by the runs')
+    args = parser.parse_args(argv)
+    if bool(args.queue) == bool(args.shards):
+        parser.error('Specify either shard output files or --queue')
+    logging.basicConfig(level=logging.INFO)
+    if args.queue:
+        results = merge_queue(args.queue, args.output)
+    else:
+        results = merge_shards(args.shards, args.output)
+    logging.warning(f'Final results: {results}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+Run the selected algorithms over documents, either serially or
+spread across a pool of worker processes.
+
+Both modes yield the same (kind, line) events in corpus order:
+    * OUTPUT: row for the output file/table
+    * LOG: row for the text log
+    * SKIP: name of a document to add to the Skipper
+    * DONE: number of documents completed (the Reporters include them)
+"""
+import collections
+import contextlib
+import logging
+import multiprocessing
+import queue
+import threading
+
+from apex.algo.pattern import Document, RECORD_FULL, get_regex_engine, set_regex_engine, \
+    get_sentence_cache, set_sentence_cache
+from apex.algo.prefilter import Prefilter
+from apex.algo.profiler import enable_profiling, get_profiler
+from apex.io.cache import ResultCache, get_text_hash
+
+OUTPUT = 'output'
+LOG = 'log'
+SKIP = 'skip'
+DONE = 'done'
+MATCHES = 'matches'  # only in the result cache: matches an algorithm added to the document
+
+_WORKER = {}
+_END = object()  # no more chunks (see `_read_in_thread`)
+POLL_INTERVAL = 0.05  # seconds between checks for finished chunks while waiting on input
+
+
+def process_document(doc: Document, algos, results, expected=None, prefilter: Prefilter = None,
+                     result_cache: ResultCache = None):
+    """
+    Run each algorithm over a single document
+    :param doc:
+    :param algos: dict of algorithm name -> confirm_* function
+    :param results: dict of algorithm name -> Reporter; updated in place
+    :param expected: annotated value for this document (if any)
+    :param prefilter: if included, algorithms which cannot trigger are spared
+    :param result_cache: if included, replay cached results and cache new ones
+    :return: iterator of (kind, line)
+    """
+    spared = prefilter.get_spared(doc) if prefilter else {}
+    text_hash = get_text_hash(doc.text) if result_cache else None
+    for name, alg_func in algos.items():
+        if result_cache:
+            cached = result_cache.get(text_hash, name)
+            if cached is not None:
+                yield from _replay(doc, name, *cached, results, expected)
+                continue
+        alg_func = spared.get(name, alg_func)
+        max_res = None
+        events = []  # for the cache
+        mark = doc.matches.mark()
+        for res in alg_func(doc, expected):
+            if res:
+                logging.debug(f'{doc.name}: {res}')
+                line = [doc.name, name, res.result, res.value, res.date, res.extras]
+                events.append((OUTPUT, line[1:]))
+                yield OUTPUT, line
+            elif res.is_skip():  # always skip
+                events.append((SKIP, None))
+                yield SKIP, doc.name
+                break
+            line = [doc.name, name, res.value, res.result, doc.matches, res.text]
+            if result_cache:
+                mark = _cache_matches(events, doc, mark)
+                events.append((LOG, [name, res.value, res.result, res.text]))
+            yield LOG, line
+            # only take max
+            if not max_res or (res.result > max_res.result and res.confidence >= max_res.confidence):
+                max_res = res
+        else:  # avoid if skipped
+            if max_res is not None:
+                results[name].update(max_res)
+                if max_res.expected is not None:
+                    logging.info(f'Validation for {doc.name}: {results}')
+        if result_cache:
+            skipped = any(kind == SKIP for kind, _ in events)
+            _cache_matches(events, doc, mark)
+            result_cache.put(text_hash, name, events, None if skipped or max_res is None else max_res.result)
+    yield DONE, 1
+
+
+def _cache_matches(events, doc, mark):
+    """
+    Record the matches added to the document since `mark` so that, when replayed,
+        the log (and later algorithms) see the same matches as in a fresh run
+    :return: new mark
+    """
+    labels = doc.matches.get_labels(mark)
+    if labels:
+        events.append((MATCHES, labels))
+    return doc.matches.mark()
+
+
+def _replay(doc, name, events, result, results, expected=None):
+    """Yield events from the result cache as `process_document` would"""
+    for kind, line in events:
+        if kind == SKIP:
+            yield SKIP, doc.name
+        elif kind == MATCHES:
+            doc.matches.add_labels(line)
+        elif kind == LOG:
+            algorithm, status, log_result, text = line
+            yield LOG, [doc.name, algorithm, status, log_result, doc.matches, text]
+        else:
+            yield kind, [doc.name] + line
+    if result is not None:
+        results[name].add(result, expected)
+
+
+def process_serial(documents, algos, results, truth, prefilter=None, result_cache=None):
+    """
+    :param documents: iterator of Document
+    :param algos: dict of algorithm name -> confirm_* function
+    :param results: dict of algorithm name -> Reporter; updated in place
+    :param truth: dict of document name -> expected value
+    :param prefilter: if included, algorithms which cannot trigger are spared
+    :param result_cache: if included, replay cached results and cache new ones
+    :return: iterator of (kind, line)
+    """
+    for doc in documents:
+        yield from process_document(doc, algos, results, truth[doc.name], prefilter, result_cache)
+
+
+def _init_worker(algos, with_log, use_prefilter, recording=RECORD_FULL, engine=None, profile=False,
+                 sentence_cache=None, result_cache=None):
+    if profile:
+        enable_profiling()
+    if engine and engine != get_regex_engine().config():  # not inherited (e.g., spawned)
+        set_regex_engine(**engine)
+    cache = get_sentence_cache()
+    if (cache.maxsize if cache else None) != sentence_cache:
+        set_sentence_cache(sentence_cache)
+    _WORKER['algos'] = algos
+    _WORKER['with_log'] = with_log
+    _WORKER['recording'] = recording
+    _WORKER['prefilter'] = Prefilter(algos) if use_prefilter else None
+    # only read: new entries are sent back to be written by the main process
+    _WORKER['result_cache'] = ResultCache(result_cache, algos, recording,
+                                          batch_size=float('inf')) if result_cache else None
+
+
+class _ReporterUpdates:
+    """Stands in for a worker's Reporter: updates are sent with each document's DONE event"""
+
+    def __init__(self, name, updates):
+        self.name = name
+        self.updates = updates
+
+    def update(self, result):
+        self.add(result.result, result.expected)
+
+    def add(self, result, expected=None):
+        self.updates.append((self.name, result, expected))
+
+
+def _process_chunk(chunk):
+    algos = _WORKER['algos']
+    prefilter = _WORKER['prefilter']
+    events = []
+    for doc_name, path, text, expected in chunk:
+        doc = Document(doc_name, file=path, text=text, recording=_WORKER['recording'])
+        updates = []
+        results = {name: _ReporterUpdates(name, updates) for name in algos}
+        for kind, line in process_document(doc, algos, results, expected, prefilter, _WORKER['result_cache']):
+            if kind == LOG:
+                if not _WORKER['with_log']:
+                    continue
+                # matches are still accumulating: render them now as a serial run would
+                line[4] = str(line[4])
+            elif kind == DONE:
+                line = updates
+            events.append((kind, line))
+    return events, _pop_counts(prefilter, _WORKER['result_cache'])
+
+
+def _pop_counts(prefilter=None, result_cache=None):
+    """Counts collected by a worker since the last chunk"""
+    counts = {}
+    if prefilter:
+        counts['spared'] = dict(prefilter.spared)
+        prefilter.spared.clear()
+    profiler = get_profiler()
+    if profiler:
+        counts['profile'] = profiler.pop_stats()
+    cache = get_sentence_cache()
+    if cache:
+        counts['sentence_cache'] = cache.get_stats()
+        cache.clear_stats()
+    if result_cache:
+        counts['result_cache'] = result_cache.get_stats()
+        counts['new_results'] = result_cache.pop_pending()
+        result_cache.clear_stats()
+    return counts
+
+
+def _get_chunks(records, truth, chunksize):
+    chunk = []
+    for doc_name, path, text in records:
+        chunk.append((doc_name, path, text, truth[doc_name]))
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _read_in_thread(chunks):
+    """
+    Read chunks in a separate thread (at most one ahead) so that reading slow input
+        does not hold up finished chunks
+    :return: queue.Queue of chunks, then `_END` (or the exception raised while reading)
+    """
+    read = queue.Queue(maxsize=1)
+
+    def target():
+        try:
+            for chunk in chunks:
+                read.put(chunk)
+        except BaseException as e:
+            read.put(e)
+        else:
+            read.put(_END)
+
+    threading.Thread(target=target, daemon=True).start()
+    return read
+
+
+def _iter_chunks(chunks, pending):
+    """
+    :return: iterator of chunks; None when a chunk is not yet available but the first
+        pending chunk is finished
+    """
+    read = _read_in_thread(chunks)
+    while True:
+        try:
+            chunk = read.get(timeout=POLL_INTERVAL if pending else None)
+        except queue.Empty:
+            if pending[0].ready():
+                yield None
+            continue
+        if chunk is _END:
+            return
+        elif isinstance(chunk, BaseException):
+            raise chunk
+        yield chunk
+
+
+def create_pool(algos, workers=None, with_log=True, use_prefilter=False, recording=RECORD_FULL,
+                result_cache=None):
+    """
+    Start worker processes with the algorithms loaded; the pool can be reused
+        across calls to `process_parallel` with the same settings
+    :param workers: number of processes (default: number of cpus)
+    :return: multiprocessing.Pool
+    """
+    cache = get_sentence_cache()
+    initargs = (algos, with_log, use_prefilter, recording, get_regex_engine().config(),
+                get_profiler() is not None, cache.maxsize if cache else None,
+                result_cache.path if result_cache else None)
+    return multiprocessing.Pool(workers or multiprocessing.cpu_count(), initializer=_init_worker,
+                                initargs=initargs)
+
+
+def process_parallel(records, algos, results, truth, prefilter=None, workers=None,
+                     chunksize=100, with_log=True, recording=RECORD_FULL, result_cache=None, pool=None,
+                     read_in_thread=False):
+    """
+    Distribute chunks of documents to a pool of worker processes. Events are
+        yielded in corpus order, so output is identical to `process_serial`.
+
+    NB: skips recorded during this run are only applied to records read afterwards,
+        and records are read ahead of processing (matters only for duplicate names)
+
+    :param records: iterator of (doc_name, path, text)
+    :param algos: dict of algorithm name -> confirm_* function
+    :param results: dict of algorithm name -> Reporter; updated in place
+    :param truth: dict of document name -> expected value
+    :param prefilter: if included, each worker uses its own copy and counts are merged
+        (as are pattern profiles and sentence cache statistics, if enabled)
+    :param workers: number of processes (default: number of cpus)
+    :param chunksize: number of documents sent to a worker at once
+    :param with_log: if False, drop LOG events in the workers
+    :param recording: how much of each match to keep (see `new_match_cask`)
+    :param result_cache: if included, workers replay cached results; new results are
+        written by this process
+    :param pool: if included, an already started pool (see `create_pool`) which is left
+        open; `workers` should be its number of processes
+    :param read_in_thread: if True, read records in a separate thread so that finished
+        chunks are yielded while waiting on slow input (e.g., a stream)
+    :return: iterator of (kind, line)
+    """
+    workers = workers or multiprocessing.cpu_count()
+    max_pending = workers * 2  # bound number of chunks read ahead
+    pending = collections.deque()
+    if pool is None:
+        pool = create_pool(algos, workers, with_log, prefilter is not None, recording, result_cache)
+    else:
+        pool = contextlib.nullcontext(pool)
+    chunks = _get_chunks(records, truth, chunksize)
+    if read_in_thread:
+        chunks = _iter_chunks(chunks, pending)
+    with pool as pool:
+        for chunk in chunks:
+            if chunk is not None:
+                pending.append(pool.apply_async(_process_chunk, (chunk,)))
+            if len(pending) >= max_pending:
+                yield from _merge_chunk(pending.popleft().get(), results, prefilter, result_cache)
+            while pending and pending[0].ready():  # don't hold finished chunks (e.g., slow input)
+                yield from _merge_chunk(pending.popleft().get(), results, prefilter, result_cache)
+        while pending:
+            yield from _merge_chunk(pending.popleft().get(), results, prefilter, result_cache)
+
+
+def _merge_chunk(chunk_result, results, prefilter=None, result_cache=None):
+    events, counts = chunk_result
+    if prefilter:
+        prefilter.spared.update(counts['spared'])
+    if 'profile' in counts:
+        get_profiler().update(counts['profile'])
+    if 'sentence_cache' in counts:
+        get_sentence_cache().update(counts['sentence_cache'])
+    if 'result_cache' in counts:
+        result_cache.update(counts['result_cache'])
+        result_cache.add_pending(counts['new_results'])
+    for kind, line in events:
+        if kind == DONE:  # apply the document's results so Reporters stay in step with events
+            for name, result, expected in line:
+                results[name].add(result, expected)
+            yield DONE, 1
+        else:
+            yield kind, line
@@ -58,11 +58,20 @@ JSON_SCHEMA = {
             'type': 'object',
             'properties': {
                 'name': {'type': 'string'},
-                'kind': {'type': 'string'},  # sql, csv, etc.
+                'kind': {'type': 'string'},  # sql, csv, parquet, arrow
                 'path': {'type': 'string'},
                 'driver': {'type': 'string'},
                 'server': {'type': 'string'},
                 'database': {'type': 'string'},
+                'connection_string': {'type': 'string'},  # instead of driver/server/database
+                'batch_size': {'type': 'integer', 'minimum': 1},  # sql: rows written at once
+                'flush_interval': {'type': 'number', 'minimum': 0},  # sql: max seconds rows are held
+                'fast_executemany': {'type': 'boolean'},  # sql: bulk calls (pyodbc only)
+                'background': {'type': 'boolean'},  # write from a separate thread
+                'queue_size': {'type': 'integer', 'minimum': 1},  # rows waiting for that thread
+                'buffer_size': {'type': 'integer'},  # bytes held before writing to disk
+                'row_group_size': {'type': 'integer', 'minimum': 1},  # parquet/arrow: rows written at once
+                'compression': {'type': 'string'},  # parquet/arrow: codec
             }
         },
         'select': {
@@ -74,20 +83,39 @@ JSON_SCHEMA = {
                 'filenames': {
                     'type': 'array',
                     'items': {'type': 'string'}
+                },
+                'shard': {
+                    'type': 'object',
+                    'properties': {
+                        'index': {'type': 'integer', 'minimum': 0},  # this run's shard
+                        'count': {'type': 'integer', 'minimum': 1},  # number of shards
+                    },
+                    'required': ['index', 'count'],
                 }
             }
         },
         'algorithm': {
             'type': 'object',
-            'names': {
-                'type': 'array',
-                'items': {'type': 'string'}
+            'properties': {
+                'names': {
+                    'type': 'array',
+                    'items': {'type': 'string'}
+                },
+                'prefilter': {'type': 'boolean'},  # skip algorithms which cannot trigger
             }
         },
         'loginfo': {
             'type': 'object',
             'properties': {
-                'directory': {'type': 'string'}
+                'directory': {'type': 'string'},
+                'ignore': {'type': 'boolean'},
+                'matches': {'enum': ['off', 'compact', 'full']},
+                'kind': {'enum': ['tsv', 'dedup', 'parquet', 'arrow']},
+                'row_group_size': {'type': 'integer', 'minimum': 1},
+                'compression': {'type': 'string'},
+                'background': {'type': 'boolean'},
+                'queue_size': {'type': 'integer', 'minimum': 1},
+                'buffer_size': {'type': 'integer'},
             }
         },
         'skipinfo': {
@@ -103,6 +131,49 @@ JSON_SCHEMA = {
             'properties': {
                 'verbose': {'type': 'boolean'}
             }
+        },
+        'parallel': {
+            'type': 'object',
+            'properties': {
+                'workers': {'type': 'integer'},  # default: number of cpus
+                'chunksize': {'type': 'integer'},  # documents per task
+            }
+        },
+        'regex': {
+            'type': 'object',
+            'properties': {
+                'engine': {'enum': ['re', 're2', 'regex']},
+                'timeout': {'type': 'number'},  # seconds, only for `regex`
+            }
+        },
+        'profile': {
+            'type': 'object',
+            'properties': {
+                'patterns': {'type': 'boolean'},
+                'path': {'type': 'string'},  # tsv of all patterns
+            }
+        },
+        'cache': {
+            'type': 'object',
+            'properties': {
+                'sentences': {'type': 'integer'},  # number of distinct sentences
+                'results': {'type': 'string'},  # path to sqlite file
+            }
+        },
+        'checkpoint': {
+            'type': 'object',
+            'properties': {
+                'path': {'type': 'string'},  # journal file
+                'interval': {'type': 'integer'},  # number of documents
+            }
+        },
+        'queue': {
+            'type': 'object',
+            'properties': {
+                'path': {'type': 'string'},  # sqlite file shared by all runs
+                'chunksize': {'type': 'integer', 'minimum': 1},  # number of documents
+                'lease': {'type': 'number'},  # seconds
+            }
         }
     }
 }
@@ -0,0 +1,256 @@
+"""
+Serve the selected algorithms over a local HTTP API (tcp or unix socket) so that
+    patterns are compiled once rather than per run.
+
+Endpoints (json):
+    POST /documents  {"name": ..., "text": ..., "expected": ...}
+                     -> {"name": ..., "results": [{"name": ..., "algorithm": ..., "value": ...,
+                                                    "category": ..., "date": ..., "extras": ...}, ...]}
+    POST /batch      {"documents": [{"name": ..., "text": ...}, ...]}
+                     -> {"documents": [{"name": ..., "results": [...]}, ...]}
+                     spread across the worker pool (if --workers)
+    GET  /stats      -> latency percentiles (ms) of each endpoint over recent requests
+
+Usage: python -m apex serve [--algorithms NAME [NAME ...]] [--port PORT | --unix PATH] [--workers N]
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import socketserver
+import stat
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from apex.algo import get_algorithms
+from apex.algo.pattern import Document, RECORD_OFF, set_regex_engine
+from apex.algo.prefilter import Prefilter
+from apex.io.report import Reporter
+from apex.runner import process_document, process_parallel, create_pool, OUTPUT, DONE
+from apex.stream import FIELDS
+
+LATENCY_WINDOW = 10000  # most recent requests included in percentiles
+
+
+class LatencyTracker:
+    """
+    Bounded record of request durations for each endpoint
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.durations = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, seconds):
+        with self.lock:
+            self.durations[endpoint].append(seconds)
+            self.counts[endpoint] += 1
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        :return: dict of endpoint -> {requests, p50, p90, p99, max} (in milliseconds)
+        """
+        with self.lock:
+            durations = {endpoint: sorted(values) for endpoint, values in self.durations.items()}
+            counts = dict(self.counts)
+        summary = {}
+        for endpoint, values in durations.items():
+            if not values:
+                continue
+            summary[endpoint] = {'requests': counts[endpoint]}
+            for p in percentiles:  # nearest rank
+                rank = max(0, -(-len(values) * p // 100) - 1)
+                summary[endpoint][f'p{p}'] = round(values[rank] * 1000, 3)
+            summary[endpoint]['max'] = round(values[-1] * 1000, 3)
+        return summary
+
+
+class ApexService:
+    """
+    Algorithms loaded once and, if workers are requested, a pool of worker processes
+        which is started once and shared by all batch requests
+    """
+
+    def __init__(self, algos, workers=None, chunksize=10, prefilter=False):
+        """
+        :param algos: dict of algorithm name -> confirm_* function
+        :param workers: if included, number of processes for batch requests
+        :param chunksize: number of documents (of a batch) sent to a worker at once
+        :param prefilter: if True, spare algorithms which cannot trigger
+        """
+        self.algos = algos
+        self.workers = workers
+        self.chunksize = chunksize
+        self.prefilter = Prefilter(algos) if prefilter else None
+        self.pool = create_pool(algos, workers, with_log=False, use_prefilter=prefilter,
+                                recording=RECORD_OFF) if workers else None
+        self.latency = LatencyTracker()
+        self.lock = threading.Lock()  # prefilter (and any sentence cache) is not thread-safe
+
+    def process(self, doc_name, text, expected=None):
+        """
+        :return: list of output rows (dicts)
+        """
+        results = {name: Reporter() for name in self.algos}
+        doc = Document(doc_name, text=text, recording=RECORD_OFF)
+        with self.lock:
+            return [dict(zip(FIELDS, line)) for kind, line
+                    in process_document(doc, self.algos, results, expected, self.prefilter)
+                    if kind == OUTPUT]
+
+    def process_batch(self, documents):
+        """
+        :param documents: list of (doc_name, text, expected)
+        :return: list of output rows (dicts) for each document, in order
+        """
+        if not self.pool:
+            return [self.process(*document) for document in documents]
+        results = {name: Reporter() for name in self.algos}
+        truth = collections.defaultdict(lambda: None)
+        truth.update({doc_name: expected for doc_name, _, expected in documents if expected is not None})
+        rows = [[]]
+        events = process_parallel(
+            ((doc_name, None, text) for doc_name, text, _ in documents), self.algos, results, truth,
+            workers=self.workers, chunksize=self.chunksize, with_log=False, recording=RECORD_OFF,
+            pool=self.pool,
+        )
+        for kind, line in events:
+            if kind == OUTPUT:
+                rows[-1].append(dict(zip(FIELDS, line)))
+            elif kind == DONE:
+                rows.append([])
+        return rows[:-1]
+
+    def get_stats(self):
+        return {
+            'algorithms': list(self.algos),
+            'workers': self.workers,
+            'latency': self.latency.summary(),
+        }
+
+    def close(self):
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+
+
+def _read_document(data):
+    """
+    :param data: json object with the document's name and text
+    :return: (doc_name, text, expected)
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('text'), str):
+        raise ValueError('Document must be a json object with "text"')
+    return data.get('name'), data['text'], data.get('expected')
+
+
+def get_handler(service: ApexService):
+    """
+    :return: request handler class bound to the service
+    """
+
+    class ApexRequestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, service.get_stats())
+            else:
+                self._send(404, {'error': f'Unknown endpoint: {self.path}'})
+
+        def do_POST(self):
+            start = time.perf_counter()
+            try:
+                data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if self.path == '/documents':
+                    doc_name, text, expected = _read_document(data)
+                    response = {'name': doc_name, 'results': service.process(doc_name, text, expected)}
+                elif self.path == '/batch':
+                    if not isinstance(data, dict) or not isinstance(data.get('documents'), list):
+                        raise ValueError('Batch must be a json object with a list of "documents"')
+                    documents = [_read_document(document) for document in data['documents']]
+                    response = {'documents': [
+                        {'name': doc_name, 'results': rows}
+                        for (doc_name, _, _), rows in zip(documents, service.process_batch(documents))
+                    ]}
+                else:
+                    self._send(404, {'error': f'Unknown endpoint: {self.path}'})
+                    return
+            except ValueError as e:  # includes invalid json
+                self._send(400, {'error': str(e)})
+                return
+            except Exception as e:
+                logging.exception(f'Failed to process request to {self.path}')
+                self._send(500, {'error': f'{type(e).__name__}: {e}'})
+                return
+            service.latency.add(self.path.strip('/'), time.perf_counter() - start)
+            self._send(200, response)
+
+        def _send(self, status, data):
+            body = json.dumps(data, default=str).encode('utf8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            return self.client_address[0] if self.client_address else 'unix'
+
+        def log_message(self, format, *args):
+            logging.debug(f'{self.address_string()} {format % args}')
+
+    return ApexRequestHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def get_server(service: ApexService, host='127.0.0.1', port=8765, unix=None):
+    """
+    :param unix: if included, path of a unix socket to listen on instead of host/port
+    :return: server; call `serve_forever`
+    """
+    if unix:
+        if os.path.exists(unix):
+            if not stat.S_ISSOCK(os.stat(unix).st_mode):
+                raise ValueError(f'Not a socket (refusing to replace it): {unix}')
+            os.remove(unix)  # stale socket from a previous run
+        return UnixHTTPServer(unix, get_handler(service))
+    return ThreadingHTTPServer((host, port), get_handler(service))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m apex serve', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--algorithms', nargs='+', default=None, help='Algorithms to run (default: all)')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--unix', default=None, help='Listen on this unix socket instead of host/port')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes for batch requests (default: run in the server process)')
+    parser.add_argument('--chunksize', type=int, default=10, help='Number of documents sent to a worker at once')
+    parser.add_argument('--prefilter', action='store_true', help='Spare algorithms which cannot trigger')
+    parser.add_argument('--regex', default=None, help='Regular expression engine: re, re2, or regex')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if args.regex:
+        set_regex_engine(args.regex)
+    algos = get_algorithms(args.algorithms)
+    if not algos:
+        raise ValueError('No algorithms specified!')
+    service = ApexService(algos, args.workers, args.chunksize, args.prefilter)
+    server = get_server(service, args.host, args.port, args.unix)
+    logging.info(f'Serving {", ".join(algos)} on {args.unix or f"{args.host}:{server.server_address[1]}"}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        logging.info(f'Latency (ms): {service.latency.summary()}')
@@ -0,0 +1,125 @@
+"""
+Run algorithms over documents streamed as newline-delimited json, e.g., between the
+    extraction and loading steps of a pipeline, without reading or writing files.
+
+Each input line is a json object with the document's name and text (and, optionally,
+    its expected value). Each output row is written as a json line as soon as its
+    document is done:
+    {"name": ..., "algorithm": ..., "value": ..., "category": ..., "date": ..., "extras": ...}
+
+Usage: python -m apex stream [--algorithms NAME [NAME ...]] [--workers N] < notes.jsonl > results.jsonl
+"""
+import argparse
+import json
+import logging
+import sys
+
+from apex.algo import get_algorithms
+from apex.algo.pattern import Document, RECORD_OFF, set_regex_engine
+from apex.algo.prefilter import Prefilter
+from apex.io.report import Reporter
+from apex.runner import process_serial, process_parallel, OUTPUT, DONE
+
+FIELDS = ('name', 'algorithm', 'value', 'category', 'date', 'extras')
+
+
+class ExpectedValues(dict):
+    """
+    Expected values of documents which have been read but not yet sent to the algorithms:
+        each is removed once looked up, so a long stream does not keep one per document
+    """
+
+    def __getitem__(self, doc_name):
+        return self.pop(doc_name, None)
+
+
+def read_records(lines, truth, name_field='name', text_field='text', expected_field='expected'):
+    """
+    :param lines: iterable of json lines
+    :param truth: dict of document name -> expected value; updated as documents are read
+        (see `ExpectedValues`)
+    :return: iterator of (doc_name, path, text)
+    """
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            logging.warning(f'Skipping line {i}: invalid json ({e})')
+            continue
+        if not isinstance(data, dict):
+            logging.warning(f'Skipping line {i}: expected a json object, not {type(data).__name__}')
+            continue
+        doc_name = data.get(name_field, str(i))
+        text = data.get(text_field)
+        if text is not None and not isinstance(text, str):
+            logging.warning(f'Skipping line {i}: "{text_field}" must be a string, not {type(text).__name__}')
+            continue
+        if not text:
+            continue
+        if data.get(expected_field) is not None:
+            truth[doc_name] = data[expected_field]
+        yield doc_name, None, text
+
+
+def to_json(line):
+    """
+    :param line: OUTPUT row from the runner
+    :return: json string
+    """
+    return json.dumps(dict(zip(FIELDS, line)), default=str)
+
+
+def process_stream(infile, outfile, algos, workers=None, chunksize=10, prefilter=False,
+                   name_field='name', text_field='text'):
+    """
+    :param infile: json lines, one document each
+    :param outfile: json lines, one for each output row
+    :param algos: dict of algorithm name -> confirm_* function
+    :param workers: if included, number of processes; documents are read (in a separate
+        thread, so output is not held up by slow input) ahead by at most (2 * workers + 2) * chunksize
+    :param chunksize: number of documents sent to a worker at once
+    :param prefilter: if True, spare algorithms which cannot trigger
+    :return: dict of algorithm name -> Reporter
+    """
+    results = {name: Reporter() for name in algos}
+    truth = ExpectedValues()
+    prefilter = Prefilter(algos) if prefilter else None
+    records = read_records(infile, truth, name_field, text_field)
+    if workers:
+        events = process_parallel(records, algos, results, truth, prefilter, workers=workers,
+                                  chunksize=chunksize, with_log=False, recording=RECORD_OFF, read_in_thread=True)
+    else:
+        events = process_serial(
+            (Document(doc_name, file=path, text=text, recording=RECORD_OFF) for doc_name, path, text in records),
+            algos, results, truth, prefilter
+        )
+    for kind, line in events:
+        if kind == OUTPUT:
+            outfile.write(to_json(line) + '\n')
+        elif kind == DONE:
+            outfile.flush()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m apex stream', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--algorithms', nargs='+', default=None, help='Algorithms to run (default: all)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes (default: run serially)')
+    parser.add_argument('--chunksize', type=int, default=10, help='Number of documents sent to a worker at once')
+    parser.add_argument('--prefilter', action='store_true', help='Spare algorithms which cannot trigger')
+    parser.add_argument('--regex', default=None, help='Regular expression engine: re, re2, or regex')
+    parser.add_argument('--name-field', default='name', help='Key of the document name in each json line')
+    parser.add_argument('--text-field', default='text', help='Key of the document text in each json line')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if args.regex:
+        set_regex_engine(args.regex)
+    algos = get_algorithms(args.algorithms)
+    if not algos:
+        raise ValueError('No algorithms specified!')
+    results = process_stream(sys.stdin, sys.stdout, algos, args.workers, args.chunksize, args.prefilter,
+                             args.name_field, args.text_field)
+    logging.warning(f'Final results: {results}')
@@ -0,0 +1,30 @@
+
+schema = {
+    'corpus': {
+        'directories': [
+            'files',
+        ],
+        'connections': [  # database connections
+            {
+                'name': 'example_text',
+                'connection_string': r'sqlite:///example.db',
+                'name_col': 'id',
+                'text_col': 'note_text'
+            },
+        ]
+    },
+    'output': {
+        'name': 'test_parallel_output',
+        'kind': 'csv',  # sql, csv, etc.
+        'path': '.',
+    },
+    'loginfo': {
+        'ignore': True,
+    },
+    'parallel': {
+        'workers': 2,
+        'chunksize': 1,
+    },
+}
+
+print(schema)  # required, or config will not be read
@@ -30,3 +30,14 @@ def test_config_sqlite():
     outpath = os.path.join(PATH, 'test_sqlite_output')
     with open(outpath) as fh:
         assert OUTPUT_FILE == fh.read().strip()
+
+
+def test_config_parallel():
+    """Output from worker processes is merged back in corpus order"""
+    os.chdir(PATH)
+    filename = 'config_parallel.py'
+    main(os.path.join(PATH, filename))
+    outpath = os.path.join(PATH, 'test_parallel_output')
+    with open(outpath) as fh:
+        expected = OUTPUT_FILE + '\n' + '\n'.join(OUTPUT_FILE.split('\n')[1:])  # files then sqlite
+        assert expected == fh.read().strip()
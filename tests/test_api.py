@@ -0,0 +1,57 @@
+import subprocess
+import sys
+
+import pytest
+
+import apex
+from apex.anlz.import_timing import _get_env
+from test_stream import DOCUMENTS, EXPECTED
+
+CHECK_IMPORTS = '''
+import sys
+import apex
+print(sorted(m for m in sys.modules if m.split('.')[0] in ('sqlalchemy', 'jsonschema') or m == 'apex.main'))
+'''
+CHECK_LAZY = '''
+import sys
+import apex.algo.pattern
+print(sorted(m for m in sys.modules if m in ('apex.api', 'apex.runner', 'multiprocessing')))
+apex.run
+print(sorted(m for m in sys.modules if m in ('apex.api', 'apex.runner')))
+'''
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_run(workers):
+    documents = [(doc['name'], doc.get('text')) for doc in DOCUMENTS]
+    results = {}
+    records = apex.run(documents, algorithms=['iud_expulsion', 'breastfeeding'], workers=workers,
+                       batch_size=1, expected={'b': 1}, results=results)
+    assert [record._asdict() for record in records] == EXPECTED
+    assert results['breastfeeding'].tp == 1
+
+
+def test_run_is_lazy():
+    read = []
+
+    def documents():
+        for doc in DOCUMENTS:
+            read.append(doc['name'])
+            yield doc['name'], doc.get('text')
+
+    records = apex.run(documents(), algorithms='iud_expulsion')
+    assert next(records).name == 'a'
+    assert read == ['a']
+
+
+def test_import_is_light():
+    proc = subprocess.run([sys.executable, '-c', CHECK_IMPORTS], capture_output=True, text=True,
+                          env=_get_env(), check=True)
+    assert proc.stdout.strip() == '[]'
+
+
+def test_run_is_imported_when_used():
+    proc = subprocess.run([sys.executable, '-c', CHECK_LAZY], capture_output=True, text=True,
+                          env=_get_env(), check=True)
+    assert proc.stdout.split('\n')[:2] == ['[]', "['apex.api', 'apex.runner']"]
+    assert apex.ResultRecord._fields == ('name', 'algorithm', 'value', 'category', 'date', 'extras')
@@ -0,0 +1,44 @@
+import pytest
+
+from apex.io.out import get_file_wrapper, get_logging
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+ROWS = [
+    ['note1', 'iud_expulsion', 2, 'MALPOSITION', None, ''],
+    ['note2', 'parity', 1, 'PARITY', '2020-01-01', 'G2P2\nnewline'],
+    ['note3', 'iud_expulsion', 12, 'LOWER_UTERINE_SEGMENT', None, ''],
+]
+
+
+def _read(path, kind):
+    if kind == 'parquet':
+        return pq.read_table(path)
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+@pytest.mark.parametrize('kind', ['parquet', 'arrow'])
+def test_output(tmp_path, kind):
+    out = get_file_wrapper(f'output.{kind}', kind=kind, path=str(tmp_path), row_group_size=2)
+    with out:
+        for row in ROWS:
+            out.writeline(row)
+    table = _read(tmp_path / f'output.{kind}', kind)
+    assert table.schema.field('value').type == pa.int32()
+    assert pa.types.is_dictionary(table.schema.field('algorithm').type)
+    assert pa.types.is_dictionary(table.schema.field('category').type)
+    assert [list(row.values()) for row in table.to_pylist()] == ROWS
+    if kind == 'parquet':
+        assert pq.ParquetFile(tmp_path / 'output.parquet').num_row_groups == 2
+
+
+@pytest.mark.parametrize('kind', ['parquet', 'arrow'])
+def test_log(tmp_path, kind):
+    log = get_logging(str(tmp_path), kind=kind)
+    with log:
+        log.writeline(['note1', 'iud_expulsion', 'MALPOSITION', 2, {'iud', 'lower uterine segment'}, 'text'])
+    table = _read(log.fp, kind)
+    assert table.column_names == ['name', 'algorithm', 'status', 'result', 'matches', 'text']
+    assert table.column('result').to_pylist() == [2]
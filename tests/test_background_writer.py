@@ -0,0 +1,62 @@
+import pytest
+
+from apex.io.out import BackgroundWriter, CsvFileWrapper, get_file_wrapper
+from apex.main import process
+
+TEXTS = [
+    'IUD was located in the lower uterine segment. IUD removed.',
+    'Mirena inserted without difficulty.',
+    'Patient is breastfeeding. G2P2.',
+]
+
+
+def test_rows_written_in_order(tmp_path):
+    out = get_file_wrapper('output.csv', kind='csv', path=str(tmp_path), background=True, queue_size=2)
+    assert isinstance(out, BackgroundWriter)
+    with out:
+        for i in range(100):
+            out.writeline([f'doc{i}', 'parity', i, 'PARITY', None, 'a,"b"'])
+        out.fh.flush()  # waits for queued rows
+        assert len((tmp_path / 'output.csv').read_text().splitlines()) == 101
+    lines = (tmp_path / 'output.csv').read_text().splitlines()
+    assert lines[0] == 'name,algorithm,value,category,date,extras'
+    assert [line.split(',')[0] for line in lines[1:]] == [f'doc{i}' for i in range(100)]
+
+
+class FailingWrapper(CsvFileWrapper):
+
+    def writeline(self, line, **kwargs):
+        if line and line[0] == 'bad':
+            raise ValueError('cannot write')
+        super().writeline(line)
+
+
+def test_error_is_raised(tmp_path):
+    out = BackgroundWriter(FailingWrapper('output.csv', str(tmp_path)), queue_size=1)
+    with pytest.raises(IOError):
+        with out:
+            for name in ['ok', 'bad'] + ['ok'] * 10:  # never blocks on a full queue
+                out.writeline([name])
+            out.flush()
+
+
+def _run(tmp_path, name, background, parallel=None):
+    outdir = tmp_path / name
+    process(
+        corpus={'directory': str(tmp_path / 'corpus')},
+        output={'name': 'output.csv', 'kind': 'csv', 'path': str(outdir), 'background': background,
+                'queue_size': 1},
+        loginfo={'directory': str(outdir), 'background': background, 'queue_size': 1},
+        algorithm={'names': ['iud_expulsion', 'iud_removal', 'breastfeeding']},
+        parallel=parallel,
+    )
+    return {p.name: p.read_text() for p in outdir.iterdir() if p.is_file()}
+
+
+@pytest.mark.parametrize('parallel', [None, {'workers': 2, 'chunksize': 2}])
+def test_same_output(tmp_path, parallel):
+    (tmp_path / 'corpus').mkdir()
+    for i in range(10):
+        (tmp_path / 'corpus' / f'doc{i}.txt').write_text(TEXTS[i % len(TEXTS)])
+    expected = _run(tmp_path, 'direct', False, parallel)
+    assert _run(tmp_path, 'background', True, parallel) == expected
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import apex.main
+from apex.main import process
+
+TEXTS = [
+    'IUD was located in the lower uterine segment.',
+    'Mirena inserted without difficulty.',
+    'Patient is breastfeeding. G2P2.',
+    'IUD expelled last week.',
+]
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _interrupt_after(func, n_docs):
+    """Stop a run after some documents have been completed"""
+
+    def wrapper(*args, **kwargs):
+        completed = 0
+        for kind, line in func(*args, **kwargs):
+            yield kind, line
+            if kind == apex.main.DONE:
+                completed += line
+                if completed >= n_docs:
+                    raise Interrupted()
+
+    return wrapper
+
+
+def _run(tmp_path, name, parallel=None, checkpoint=None):
+    outdir = tmp_path / name
+    process(
+        corpus={'directory': str(tmp_path / 'corpus')},
+        output={'name': 'output.csv', 'kind': 'csv', 'path': str(outdir)},
+        loginfo={'directory': str(outdir)},
+        skipinfo={'path': str(outdir / 'skips.txt')},
+        algorithm={'names': ['iud_expulsion', 'iud_brand', 'breastfeeding']},
+        parallel=parallel,
+        checkpoint=checkpoint,
+    )
+    return {p.name: p.read_text() for p in outdir.iterdir() if p.is_file()}
+
+
+def _get_final_results(caplog):
+    return [r.getMessage() for r in caplog.records if r.getMessage().startswith('Final results')][-1]
+
+
+@pytest.mark.parametrize('parallel', [None, {'workers': 2, 'chunksize': 2}])
+def test_resume_after_interruption(tmp_path, monkeypatch, caplog, parallel):
+    (tmp_path / 'corpus').mkdir()
+    for i in range(20):
+        (tmp_path / 'corpus' / f'doc{i:02d}.txt').write_text(f'{TEXTS[i % len(TEXTS)]} Note {i}.')
+    expected = _run(tmp_path, 'full', parallel)
+    expected_results = _get_final_results(caplog)
+    journal = tmp_path / 'checkpoint.json'
+    checkpoint = {'path': str(journal), 'interval': 4}
+    process_func = 'process_parallel' if parallel else 'process_serial'
+    original = getattr(apex.main, process_func)
+    monkeypatch.setattr(apex.main, process_func, _interrupt_after(original, 10))
+    with pytest.raises(Interrupted):
+        _run(tmp_path, 'resumed', parallel, checkpoint)
+    saved = json.loads(journal.read_text())
+    assert not saved['complete']
+    assert saved['offset'] == 8
+    monkeypatch.setattr(apex.main, process_func, original)
+    assert _run(tmp_path, 'resumed', parallel, checkpoint) == expected  # no duplicate rows
+    assert _get_final_results(caplog) == expected_results
+    assert json.loads(journal.read_text())['complete']
+
+
+@pytest.mark.parametrize('output, loginfo, select, queue, checkpoint', [
+    ({'kind': 'sql', 'name': 'output', 'connection_string': 'sqlite:///output.db'}, {}, {}, {}, 'checkpoint.json'),
+    ({'kind': 'csv'}, {'kind': 'dedup'}, {}, {}, 'checkpoint.json'),
+    ({'kind': 'sql', 'name': 'output'}, {}, {'shard': {'index': 0, 'count': 2}}, {}, None),
+    ({'kind': 'csv'}, {}, {'shard': {'index': 2, 'count': 2}}, {}, None),
+    ({'kind': 'csv'}, {}, {}, {'path': 'queue.db'}, 'checkpoint.json'),
+])
+def test_invalid_options_before_any_output(tmp_path, monkeypatch, output, loginfo, select, queue, checkpoint):
+    created = []
+    monkeypatch.setattr(apex.main, 'get_algorithms', lambda **kwargs: created.append('algorithms'))
+    monkeypatch.setattr(apex.main, 'get_file_wrapper', lambda **kwargs: created.append('output'))
+    monkeypatch.setattr(apex.main, 'get_logging', lambda **kwargs: created.append('log'))
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError):
+        process(corpus={'directory': str(tmp_path)}, output={'path': str(tmp_path / 'out'), **output},
+                loginfo=loginfo, select=select, queue=queue,
+                checkpoint={'path': checkpoint} if checkpoint else None,
+                cache={'results': 'results.db'})
+    assert not created
+    assert sorted(p.name for p in tmp_path.iterdir()) == []
@@ -1,4 +1,24 @@
-from apex.algo.pattern import Document
+import subprocess
+import sys
+
+from apex.algo import get_algorithms
+from apex.algo.pattern import Document, Pattern, RECORD_COMPACT, RECORD_OFF, set_sentence_cache, \
+    get_pattern_name, get_pattern_names
+from apex.algo.shared import boilerplate
+from apex.anlz.import_timing import _get_env
+from apex.io.report import Reporter
+from apex.runner import process_document, LOG
+
+COMPACT_LOG = '''
+import apex.algo.breastfeeding  # different ids for the same patterns
+from apex.algo import get_algorithms
+from apex.algo.pattern import Document, RECORD_COMPACT
+from apex.io.report import Reporter
+from apex.runner import process_document, LOG
+doc = Document('1', text=%r, recording=RECORD_COMPACT)
+events = process_document(doc, get_algorithms(['iud_expulsion']), {'iud_expulsion': Reporter()})
+print([str(line[4]) for kind, line in events if kind == LOG])
+'''
 
 
 def test_clean_breastfeeding_document():
@@ -13,3 +33,120 @@ def test_teaching_boilerplate_document():
     exp_text = 'Teaching/Guidance provided: Nutrition: whole milk'
     doc = Document(None, text=text)
     assert doc.new_text == exp_text
+
+
+def test_sentence_hit_index():
+    """Each (pattern, sentence) pair is only evaluated once per document"""
+    calls = []
+
+    class CountingPattern(Pattern):
+        def matches(self, text, ignore_negation=False, **kwargs):
+            calls.append(text)
+            return super().matches(text, ignore_negation=ignore_negation, **kwargs)
+
+    pat = CountingPattern(r'iud')
+    doc = Document(None, text='no mention\nIUD placed\nstrings cut')
+    assert doc.has_patterns(pat)
+    assert len(list(doc.select_sentences_with_patterns(pat))) == 1
+    assert doc.select_all_sentences_with_patterns(pat).text == 'IUD placed'
+    assert doc.has_patterns(pat)
+    assert len(calls) == 3
+
+
+def test_sentence_cache():
+    """Sentences repeated across documents are not searched again for patterns which did not match"""
+    calls = []
+
+    class CountingPattern(Pattern):
+        def matches(self, text, ignore_negation=False, **kwargs):
+            calls.append(text)
+            return super().matches(text, ignore_negation=ignore_negation, **kwargs)
+
+    pat = CountingPattern(r'iud')
+    cache = set_sentence_cache(10)
+    try:
+        for name in ('a', 'b'):
+            doc = Document(name, text='no mention\nIUD placed')
+            assert doc.has_patterns(pat)
+            assert [str(s) for s in doc.select_sentences_with_patterns(pat)] == ['IUD placed']
+    finally:
+        set_sentence_cache(None)
+    assert len(calls) == 2 + 1  # second document only searches the matching sentence (for its Match)
+    assert (cache.sentences, cache.repeated, cache.queries, cache.answered) == (4, 2, 4, 1)
+
+
+def test_shared_negation_cache():
+    """Patterns with the same negation share the compiled regex and its results"""
+    pat1 = Pattern(r'iud', negates=[boilerplate])
+    pat2 = Pattern(r'placed', negates=[boilerplate])
+    assert pat1.negates[0] is pat2.negates[0]
+    doc = Document(None, text='IUD placed\nrisk of IUD expulsion')
+    assert doc.has_patterns(pat1)
+    assert doc.has_patterns(pat2)
+    assert len(doc.negation_cache) == 1  # only 'IUD placed' required the negation
+
+
+def test_sentence_spans():
+    """Sentences and contiguous sections are views on the normalized text"""
+    doc = Document(None, text='IUD placed\n  \nstrings cut\nno complications')
+    assert [s.text for s in doc.sentences] == ['IUD placed', 'strings cut', 'no complications']
+    assert all(s.buffer is doc.new_text for s in doc.sentences)
+    section = doc.select_all_sentences_with_patterns(Pattern('cut'), Pattern('compl'), get_range=True)
+    assert section.span == (doc.new_text, 14, 42)
+    assert section.text == 'strings cut\nno complications'
+    section = doc.select_all_sentences_with_patterns(Pattern('iud'), Pattern('strings'))
+    assert section.span is None  # blank line between
+    assert section.text == 'IUD placed\nstrings cut'
+
+
+def test_lazy_document():
+    """Text is only cleaned and split when sentences are needed"""
+    doc = Document(None, text='Breastfeeding?\nYes')
+    assert doc.has_pattern(Pattern('breast'), by_sentence=False)
+    assert doc._new_text is None and doc._sentences is None
+    assert doc.has_pattern(Pattern('breast feeding: yes'))
+    assert len(doc.sentences) == 1
+
+
+def test_match_recording():
+    """Matches are kept in full, as (pattern id, start, end), or not at all"""
+    text = 'IUD placed\nstrings cut'
+    iud, cut = Pattern('iud'), Pattern('cut')
+    full = Document(None, text=text)
+    compact = Document(None, text=text, recording=RECORD_COMPACT)
+    off = Document(None, text=text, recording=RECORD_OFF)
+    for doc in (full, compact, off):
+        assert doc.has_patterns(iud, cut, has_all=True)
+        assert doc.split(r'(strings)').get_section('strings').has_pattern(cut)
+    assert str(full.matches) == str({'IUD', 'cut'})
+    assert list(compact.matches.iter_spans()) == [(iud.id, 0, 3), (cut.id, 19, 22)]
+    assert compact.matches.patterns == {iud.id: iud, cut.id: cut}
+    assert str(off.matches) == ''
+
+
+IUD, CUT = Pattern('iud'), Pattern('cut')
+
+
+def test_compact_log_names_patterns():
+    """Compact log has the same pattern names in every process, which can be read back"""
+    text = 'The IUD was partially expelled.'
+    doc = Document('1', text=text, recording=RECORD_COMPACT)
+    events = process_document(doc, get_algorithms(['iud_expulsion']), {'iud_expulsion': Reporter()})
+    logged = [str(line[4]) for kind, line in events if kind == LOG]
+    assert logged == ['{iud_expulsion.PARTIAL_EXP, shared.IUD}']
+    names = {name: pat for pat, name in get_pattern_names().items()}
+    assert {names[name].text for name in logged[0].strip('{}').split(', ')} == {
+        str(pat) for pat in doc.matches.patterns.values()}
+    proc = subprocess.run([sys.executable, '-c', COMPACT_LOG % text], capture_output=True, text=True,
+                          env=_get_env(), check=True)
+    assert proc.stdout.strip() == str(logged)
+
+
+def test_compact_log_unassigned_patterns():
+    """Patterns not assigned to a variable are named by their text rather than id"""
+    placed = Pattern('placed')
+    doc = Document(None, text='IUD placed\nstrings cut', recording=RECORD_COMPACT)
+    assert doc.has_patterns(IUD, CUT, placed, has_all=True)
+    assert str(doc.matches) == f'{{{get_pattern_name(placed)}, test_document.CUT, test_document.IUD}}'
+    assert get_pattern_name(placed).startswith('test_document.<')
+    assert get_pattern_name(placed) == get_pattern_name(Pattern('placed'))
@@ -0,0 +1,36 @@
+import io
+import re
+
+from apex.algo.pattern import get_pattern_names
+from apex.anlz.pattern_timing import get_adversarial_inputs, get_targets, run_timing, summarize, write_report
+
+
+def test_targets_include_negations():
+    names = {name for name, _, _ in get_targets()}
+    assert 'iud_expulsion.PARTIAL_EXP' in names
+    assert 'iud_expulsion.COMPLETE[negate0]' in names
+
+
+def test_negations_named_as_in_engine_tests():
+    targets = {name: text for name, text, _ in get_targets()}
+    for pat, name in get_pattern_names().items():
+        for i, negate in enumerate(pat.negate_texts):
+            assert targets[f'{name}[negate{i}]'] == negate
+
+
+def test_adversarial_input_length():
+    for kind, text in get_adversarial_inputs(r'iud\W*(was|is)\W*removed', 250):
+        assert len(text) == 250, kind
+    kinds = [kind for kind, _ in get_adversarial_inputs(r'iud\W*removed', 50)]
+    assert 'near_miss' in kinds
+
+
+def test_report():
+    targets = [(name, text, re.compile(text)) for name, text in [('linear', 'iud'), ('nested', r'(\w+\W*)+x$')]]
+    rows = summarize(run_timing(targets, lengths=(10, 20), corpus=['IUD placed'], repeat=1))
+    assert {(name, length) for name, length, *_ in rows} == {
+        ('linear', 10), ('linear', 20), ('nested', 10), ('nested', 20)
+    }
+    out = io.StringIO()
+    write_report(rows, out, top=1)
+    assert len(out.getvalue().splitlines()) == 3  # header + both lengths of one pattern
@@ -0,0 +1,46 @@
+import pytest
+
+from apex.algo import ALGORITHMS
+from apex.algo.pattern import Document, Pattern
+from apex.algo.prefilter import Prefilter, get_trigger_literals
+
+
+@pytest.mark.parametrize('pattern, exp', [
+    (r'(mirena|paragu?ard|skyla\b)', {'mirena', 'parag', 'skyla'}),
+    (r'(?<!not) in (place|situ)\b', {'place', 'situ'}),
+    (r'lactation (visit|consult)', {'lactation'}),
+    (r'(\w+ ){1,3}copper', {'copper'}),
+])
+def test_trigger_literals(pattern, exp):
+    assert get_trigger_literals(Pattern(pattern)) == exp
+
+
+@pytest.mark.parametrize('pattern', [
+    r'\d+[-/]\d+',
+    r'(copper )?\d+',
+    r'(copper|\bg\b)',
+])
+def test_no_trigger_literals(pattern):
+    assert get_trigger_literals(Pattern(pattern)) is None
+
+
+@pytest.mark.parametrize('text, exp', [
+    ('Patient seen for follow up of hypertension.', set()),
+    ('Mirena placed without difficulty.', {'iud_insertion', 'iud_brand', 'iud_expulsion',
+                                           'iud_difficult_insertion', 'iud_removal'}),
+    ('Nutrition: whole milk', {'breastfeeding'}),
+])
+def test_triggered(text, exp):
+    assert Prefilter(ALGORITHMS).get_triggered(text) == exp
+
+
+def test_spared_same_as_algorithm():
+    """Spared algorithms must return the same results as running the algorithm"""
+    prefilter = Prefilter(ALGORITHMS)
+    doc = Document('1', text='Patient seen for follow up of hypertension.')
+    spared = prefilter.get_spared(doc)
+    assert spared
+    for name, spare in spared.items():
+        exp = [(r.value, r.result) for r in ALGORITHMS[name](doc)]
+        assert exp == [(r.value, r.result) for r in spare(doc)]
+    assert prefilter.spared == {name: 1 for name in spared}
@@ -0,0 +1,34 @@
+from apex.algo.iud_expulsion import PARTIAL_EXP
+from apex.algo.pattern import Document, Pattern
+from apex.algo.profiler import enable_profiling, disable_profiling, get_profiler, FIELDS
+
+
+def test_profile_patterns():
+    matches = Pattern.matches
+    profiler = enable_profiling()
+    try:
+        pat = Pattern('iud', negates=['no iud'])
+        doc = Document(None, text='no IUD\nIUD placed')
+        assert doc.has_pattern(pat)
+        PARTIAL_EXP.matches('IUD partially expelled')
+        stats = profiler.get_stats()
+    finally:
+        disable_profiling()
+    assert Pattern.matches is matches
+    assert get_profiler() is None
+    calls, hits, vetoes, seconds, max_seconds, chars = stats[f'{__name__}.<{pat.id}>']
+    assert (calls, hits, vetoes, chars) == (2, 1, 1, len('no IUD') + len('IUD placed'))
+    assert stats['iud_expulsion.PARTIAL_EXP'][FIELDS.index('hits')] == 1
+
+
+def test_merge_profiles():
+    profiler = enable_profiling()
+    try:
+        PARTIAL_EXP.matches('IUD partially expelled')
+        profiler.update(profiler.pop_stats())
+        PARTIAL_EXP.matches('no match')
+        rows = profiler.get_table()
+    finally:
+        disable_profiling()
+    name, calls, hits, *_ = rows[0]
+    assert (name, calls, hits) == ('iud_expulsion.PARTIAL_EXP', 2, 1)
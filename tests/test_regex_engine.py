@@ -0,0 +1,103 @@
+"""
+Each Pattern (and negation) must match the same on the test corpus whatever the engine
+"""
+import ast
+import pathlib
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from apex.algo.engine import get_engine
+from apex.algo.pattern import Pattern, iter_lines, get_pattern_names
+from apex.anlz.import_timing import _get_env
+
+TEST_DIR = pathlib.Path(__file__).parent
+ENGINES = [('re2', 're2'), ('regex', 'regex')]  # (engine, module)
+CHECK_IMPORTS = '''
+import sys
+import apex.algo.pattern
+print(sorted(m for m in sys.modules if m in ('re2', 'regex')))
+'''
+
+
+def _load_corpus():
+    """Texts used in tests and the full run"""
+    texts = set()
+    for path in TEST_DIR.glob('test_*.py'):
+        for node in ast.walk(ast.parse(path.read_text(encoding='utf8'))):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value.strip():
+                texts.add(node.value)
+    for path in (TEST_DIR / 'full_run' / 'files').iterdir():
+        texts.add(path.read_text(encoding='utf8'))
+    with sqlite3.connect(str(TEST_DIR / 'full_run' / 'example.db')) as conn:
+        texts |= {text for text, in conn.execute('select note_text from example_text')}
+    texts = sorted(texts)
+    return texts + ['\n'.join(texts)]
+
+
+def _load_patterns():
+    """
+    :return: list of (name, pattern, flags) for all Patterns and negations in apex.algo
+    """
+    patterns = {}
+    for pat, name in get_pattern_names().items():
+        patterns.setdefault((pat.text, pat.flags), name)
+        for i, negate in enumerate(pat.negate_texts):
+            patterns.setdefault((negate, pat.flags), f'{name}[negate{i}]')
+    return sorted((name, pattern, flags) for (pattern, flags), name in patterns.items())
+
+
+CORPUS = _load_corpus()
+PATTERNS = _load_patterns()
+
+
+def _get_matches(rx, text):
+    """Matches from searching the whole text and each line"""
+    res = []
+    pos = 0
+    while pos <= len(text):
+        m = rx.search(text, pos)
+        if not m:
+            break
+        res.append((m.span(), m.groups()))
+        pos = max(m.end(), m.start() + 1)
+    for start, end in iter_lines(text):
+        m = rx.search(text, start, end)
+        res.append((m.span(), m.groups()) if m else None)
+    return res
+
+
+@pytest.mark.parametrize('engine, module', ENGINES)
+@pytest.mark.parametrize('name, pattern, flags', PATTERNS, ids=[name for name, *_ in PATTERNS])
+def test_engine_parity(engine, module, name, pattern, flags):
+    pytest.importorskip(module)
+    expected = get_engine('re').compile(pattern, flags)
+    actual = get_engine(engine).compile(pattern, flags)
+    for text in CORPUS:
+        assert _get_matches(actual, text) == _get_matches(expected, text), text
+
+
+@pytest.mark.parametrize('pattern, supported', [
+    (r'iud (\w+\s+){,4}expelled', True),
+    (r'(?<!no )iud', False),  # lookbehind
+    (r'iud$', False),  # `$` also matches before a trailing newline in re
+])
+def test_re2_fallback(pattern, supported):
+    pytest.importorskip('re2')
+    engine = get_engine('re2')
+    engine.compile(pattern, Pattern('x').flags)
+    assert (pattern not in engine.fallbacks) == supported
+
+
+def test_non_ascii_text():
+    pytest.importorskip('re2')
+    rx = get_engine('re2').compile(r'\bnaïve\w*', Pattern('x').flags)
+    assert rx.search('a NAÏVEly placed iud').group() == 'NAÏVEly'
+
+
+def test_engines_imported_when_selected():
+    proc = subprocess.run([sys.executable, '-c', CHECK_IMPORTS], capture_output=True, text=True,
+                          env=_get_env(), check=True)
+    assert proc.stdout.strip() == '[]'
@@ -0,0 +1,107 @@
+import subprocess
+import sys
+from importlib.metadata import EntryPoint
+
+import apex.algo
+from apex.algo import ALGORITHMS, AlgorithmRegistry
+from apex.anlz.import_timing import parse_importtime, _get_env
+from apex.main import get_algorithms, process
+
+CHECK_LOADED = '''
+import sys
+import apex.main
+before = sorted(m for m in sys.modules if m.startswith('apex.algo.'))
+apex.main.get_algorithms(['parity'])
+after = sorted(m for m in sys.modules if m.startswith('apex.algo.'))
+print(sorted(set(after) - set(before)))
+'''
+
+
+def test_only_selected_algorithms_imported():
+    proc = subprocess.run([sys.executable, '-c', CHECK_LOADED], capture_output=True, text=True,
+                          env=_get_env(), check=True)
+    assert proc.stdout.strip() == str(['apex.algo.parity'])
+
+
+def test_get_algorithms():
+    assert list(get_algorithms(['parity', 'iud_brand'])) == ['iud_brand', 'parity']
+    assert list(get_algorithms()) == list(ALGORITHMS)
+
+
+def test_register():
+    registry = AlgorithmRegistry({})
+    registry.register('parity', 'apex.algo.parity:get_parity')
+    assert not registry.is_loaded('parity')
+    assert registry['parity'].__name__ == 'get_parity'
+    assert registry.is_loaded('parity')
+
+
+def test_parse_importtime():
+    stderr = '\n'.join([
+        'import time: self [us] | cumulative | imported package',
+        'import time:       120 |        120 |   apex.algo.result',
+        'import time:      1750 |       3010 | apex.main',
+    ])
+    assert parse_importtime(stderr) == {'apex.algo.result': (120, 120), 'apex.main': (1750, 3010)}
+
+
+PLUGIN = """
+from apex.algo.pattern import Pattern
+from apex.algo.result import Result, Status
+
+SITE_IUD = Pattern('site iud')
+
+
+class SiteStatus(Status):
+    NONE = -1
+    SITE = 1
+    SKIP = 99
+
+
+def confirm_site(document, expected=None):
+    if document.has_pattern(SITE_IUD):
+        yield Result(SiteStatus.SITE, SiteStatus.SITE.value, expected, text=document.text)
+    else:
+        yield Result(SiteStatus.NONE, SiteStatus.NONE.value, expected)
+"""
+
+
+def _install_plugin(tmp_path, monkeypatch):
+    (tmp_path / 'site_plugin.py').write_text(PLUGIN)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    entry_point = EntryPoint(name='site_algo', value='site_plugin:confirm_site', group=apex.algo.ENTRY_POINT_GROUP)
+    monkeypatch.setattr(apex.algo, 'iter_entry_points', lambda group: [entry_point])
+    monkeypatch.delitem(sys.modules, 'site_plugin', raising=False)
+
+
+def test_entry_point_plugin(tmp_path, monkeypatch):
+    _install_plugin(tmp_path, monkeypatch)
+    registry = AlgorithmRegistry({'parity': 'apex.algo.parity:get_parity'},
+                                 entry_point_group=apex.algo.ENTRY_POINT_GROUP)
+    assert list(registry) == ['parity', 'site_algo']
+    assert 'site_plugin' not in sys.modules  # only imported once selected
+    func = registry['site_algo']
+    assert 'site_plugin' in sys.modules
+    assert func.__name__ == 'confirm_site'
+    monkeypatch.delitem(sys.modules, 'site_plugin')
+
+
+def test_run_entry_point_plugin(tmp_path, monkeypatch):
+    _install_plugin(tmp_path, monkeypatch)
+    monkeypatch.setattr(apex.algo, 'ALGORITHMS', AlgorithmRegistry(
+        {'parity': 'apex.algo.parity:get_parity'}, entry_point_group=apex.algo.ENTRY_POINT_GROUP
+    ))
+    (tmp_path / 'corpus').mkdir()
+    (tmp_path / 'corpus' / 'a.txt').write_text('Site IUD placed.')
+    (tmp_path / 'corpus' / 'b.txt').write_text('Nothing to report.')
+    process(
+        corpus={'directory': str(tmp_path / 'corpus')},
+        output={'name': 'output.csv', 'kind': 'csv', 'path': str(tmp_path / 'out')},
+        loginfo={'directory': str(tmp_path / 'out')},
+        algorithm={'names': ['site_algo']},
+    )
+    assert (tmp_path / 'out' / 'output.csv').read_text().splitlines() == [
+        'name,algorithm,value,category,date,extras',
+        'a,site_algo,1,SITE,None,',
+    ]
+    monkeypatch.delitem(sys.modules, 'site_plugin')
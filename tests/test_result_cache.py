@@ -0,0 +1,77 @@
+import json
+import sqlite3
+
+import pytest
+
+from apex.algo.pattern import Document, RECORD_COMPACT, RECORD_FULL
+from apex.io.cache import ResultCache, get_fingerprint
+from apex.io.report import Reporter
+from apex.main import get_algorithms
+from apex.runner import process_serial
+
+TEXTS = {
+    '1': 'IUD was located in the lower uterine segment.\nMirena inserted without difficulty.',
+    '2': 'Patient is breastfeeding. G2P2.',
+    '3': 'Patient is breastfeeding. G2P2.',  # same text, different name
+}
+
+
+def _run(algos, result_cache, recording=RECORD_FULL):
+    results = {name: Reporter() for name in algos}
+    documents = (Document(name, text=text, recording=recording) for name, text in TEXTS.items())
+    events = [(kind, [str(x) for x in line] if isinstance(line, list) else line)
+              for kind, line in process_serial(documents, algos, results, {name: None for name in TEXTS},
+                                               result_cache=result_cache)]
+    return events, {name: str(reporter) for name, reporter in results.items()}
+
+
+def test_replay_cached_results(tmp_path):
+    algos = get_algorithms()
+    expected = _run(algos, None)
+    with ResultCache(str(tmp_path / 'results.db'), algos) as cache:
+        assert _run(algos, cache) == expected
+        assert sum(cache.hits.values()) == len(algos)  # duplicate text
+    with ResultCache(str(tmp_path / 'results.db'), algos) as cache:
+        assert _run(algos, cache) == expected
+        assert not cache.misses
+
+
+@pytest.mark.parametrize('recording', [RECORD_FULL, RECORD_COMPACT])
+def test_replayed_matches(tmp_path, recording):
+    """Cached log rows have the same matches as a fresh run, whichever algorithms ran before"""
+    algos = get_algorithms()
+    expected = _run(algos, None, recording)
+    subset = get_algorithms(['iud_brand', 'breastfeeding'])
+    with ResultCache(str(tmp_path / 'results.db'), subset, recording) as cache:
+        _run(subset, cache, recording)
+    with ResultCache(str(tmp_path / 'results.db'), algos, recording) as cache:
+        assert _run(algos, cache, recording) == expected
+        assert cache.hits['iud_brand'] == cache.hits['breastfeeding'] == len(TEXTS)
+
+
+def test_stored_as_json(tmp_path):
+    algos = get_algorithms(['iud_brand'])
+    with ResultCache(str(tmp_path / 'results.db'), algos) as cache:
+        _run(algos, cache)
+    with sqlite3.connect(str(tmp_path / 'results.db')) as conn:
+        events = [json.loads(events) for events, in conn.execute('SELECT events FROM results')]
+    assert ['matches', ['Mirena', 'Mirena', 'Mirena', 'inserted']] in events[0]
+    assert ['log', ['iud_brand', 'MIRENA', 2, 'Mirena inserted without difficulty.']] in events[0]
+
+
+def test_changed_algorithm(tmp_path):
+    algos = get_algorithms(['parity', 'breastfeeding'])
+    with ResultCache(str(tmp_path / 'results.db'), algos) as cache:
+        _run(algos, cache)
+    with ResultCache(str(tmp_path / 'results.db'), algos) as cache:
+        cache.fingerprints['parity'] = 'changed'
+        _run(algos, cache)
+        assert cache.misses == {'parity': 2}
+        assert cache.hits == {'parity': 1, 'breastfeeding': 3}
+
+
+def test_fingerprint():
+    algos = get_algorithms()
+    fingerprints = {name: get_fingerprint(func) for name, func in algos.items()}
+    assert len(set(fingerprints.values())) == len(algos)
+    assert fingerprints == {name: get_fingerprint(func) for name, func in algos.items()}
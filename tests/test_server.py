@@ -0,0 +1,92 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from apex.main import get_algorithms
+from apex.server import ApexService, LatencyTracker, get_server
+from test_stream import DOCUMENTS, EXPECTED
+
+
+@pytest.fixture(params=[None, 2], ids=['serial', 'workers'])
+def url(request):
+    service = ApexService(get_algorithms(['iud_expulsion', 'breastfeeding']), workers=request.param, chunksize=1)
+    server = get_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def _request(url, data=None):
+    req = urllib.request.Request(url, data=json.dumps(data).encode('utf8') if data is not None else None)
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read())
+
+
+def test_documents(url):
+    for document in DOCUMENTS[:2]:
+        response = _request(f'{url}/documents', document)
+        assert response == {'name': document['name'],
+                            'results': [row for row in EXPECTED if row['name'] == document['name']]}
+    stats = _request(f'{url}/stats')
+    assert stats['algorithms'] == ['iud_expulsion', 'breastfeeding']
+    assert stats['latency']['documents']['requests'] == 2
+
+
+def test_batch(url):
+    documents = DOCUMENTS[:2] * 3
+    response = _request(f'{url}/batch', {'documents': documents})
+    assert response == {'documents': [
+        {'name': document['name'], 'results': [row for row in EXPECTED if row['name'] == document['name']]}
+        for document in documents
+    ]}
+
+
+def test_invalid_document(url):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        _request(f'{url}/documents', DOCUMENTS[2])  # no text
+    assert e.value.code == 400
+
+
+def test_internal_error(monkeypatch):
+    service = ApexService(get_algorithms(['breastfeeding']))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('algorithm failed')
+
+    monkeypatch.setattr(service, 'process', fail)
+    server = get_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as e:
+            _request(f'http://127.0.0.1:{server.server_address[1]}/documents', DOCUMENTS[0])
+        assert e.value.code == 500
+        assert json.loads(e.value.read()) == {'error': 'RuntimeError: algorithm failed'}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_latency_percentiles():
+    latency = LatencyTracker(window=100)
+    for i in range(1, 201):
+        latency.add('documents', i / 1000)
+    assert latency.summary()['documents'] == {'requests': 200, 'p50': 150, 'p90': 190, 'p99': 199, 'max': 200}
+
+
+def test_unix_socket_path(tmp_path):
+    service = ApexService(get_algorithms(['breastfeeding']))
+    path = tmp_path / 'apex.sock'
+    get_server(service, unix=str(path)).server_close()  # leaves a stale socket
+    server = get_server(service, unix=str(path))
+    server.server_close()
+    path.unlink()
+    path.write_text('not a socket')
+    with pytest.raises(ValueError):
+        get_server(service, unix=str(path))
+    assert path.read_text() == 'not a socket'
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from apex.io.shard import in_shard, get_shard_name, merge_shards
+from apex.main import process
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'full_run')
+
+TEXTS = [
+    'IUD was located in the lower uterine segment.',
+    'Mirena inserted without difficulty.',
+    'Patient is breastfeeding. G2P2.',
+    'IUD expelled last week.',
+]
+
+
+def _run(tmp_path, name, parallel=None, shard=None):
+    outdir = tmp_path / name
+    process(
+        corpus={
+            'directory': str(tmp_path / 'corpus'),
+            'connections': [{  # names also used by files
+                'name': 'example_text',
+                'connection_string': f'sqlite:///{os.path.join(PATH, "example.db")}',
+                'name_col': 'id',
+                'text_col': 'note_text',
+            }],
+        },
+        output={'name': 'output.csv', 'kind': 'csv', 'path': str(outdir)},
+        loginfo={'ignore': True},
+        select={'shard': shard} if shard else None,
+        parallel=parallel,
+    )
+    return outdir
+
+
+def _get_final_results(caplog):
+    return [r.getMessage() for r in caplog.records if r.getMessage().startswith('Final results')][-1]
+
+
+def test_shards_partition_names():
+    names = [f'doc{i}' for i in range(100)]
+    shards = [{name for name in names if in_shard(name, index, 3)} for index in range(3)]
+    assert sum(len(shard) for shard in shards) == len(names)
+    assert set.union(*shards) == set(names)
+    assert in_shard(1, 0, 3) == in_shard('1', 0, 3)  # database ids match file names
+
+
+def test_shard_name():
+    assert get_shard_name('output.csv', 1, 4) == 'output_1of4.csv'
+    assert get_shard_name('output_{shard}.csv', 1, 4) == 'output_1of4.csv'
+
+
+@pytest.mark.parametrize('parallel', [None, {'workers': 2, 'chunksize': 3}])
+def test_merge_equals_single_run(tmp_path, caplog, parallel):
+    (tmp_path / 'corpus').mkdir()
+    for i in range(20):
+        (tmp_path / 'corpus' / f'{i}.txt').write_text(f'{TEXTS[i % len(TEXTS)]} Note {i}.')
+    expected = (_run(tmp_path, 'full') / 'output.csv').read_text()
+    expected_results = _get_final_results(caplog)
+    count = 3
+    paths = []
+    for index in range(count):
+        outdir = _run(tmp_path, 'shards', parallel, {'index': index, 'count': count})
+        paths.append(str(outdir / f'output_{index}of{count}.csv'))
+    results = merge_shards(paths, str(tmp_path / 'merged.csv'))
+    assert (tmp_path / 'merged.csv').read_text() == expected
+    assert f'Final results: {results}' == expected_results
+    with pytest.raises(ValueError):
+        merge_shards(paths[:-1], str(tmp_path / 'merged.csv'))
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+
+from apex.io.out import get_logging, iter_log_rows, read_snippets, SnippetFileWrapper, LOG_HEADER
+
+ROWS = [
+    ['note1', 'iud_expulsion', 'MALPOSITION', '2', "{'iud'}", 'IUD is low.'],
+    ['note1', 'iud_expulsion', 'PARTIAL', '3', "{'iud'}", 'IUD is low.'],
+    ['note2', 'iud_expulsion', 'MALPOSITION', '2', "{'iud'}", 'IUD is low.'],  # boilerplate
+    ['note2', 'parity', 'PARITY', '1', "{'g2p2'}", 'G2P2\twith tab'],
+]
+
+
+@pytest.mark.parametrize('background', [False, True])
+@pytest.mark.parametrize('kind', ['tsv', 'dedup'])
+def test_log_rows(tmp_path, kind, background):
+    log = get_logging(str(tmp_path), kind=kind, background=background)
+    with log:
+        for row in ROWS:
+            log.writeline(row)
+    assert list(iter_log_rows(log.fp)) == ROWS
+
+
+def test_snippets_stored_once(tmp_path):
+    log = get_logging(str(tmp_path), kind='dedup')
+    with log:
+        for row in ROWS:
+            log.writeline(row)
+    snippets = Path(f'{log.fp}.snippets').read_text().splitlines()
+    assert len(snippets) == 3  # header and 2 distinct snippets
+    assert 'IUD is low.' not in Path(log.fp).read_text()
+
+
+def test_look_up_some_snippets(tmp_path):
+    log = get_logging(str(tmp_path), kind='dedup')
+    with log:
+        for row in ROWS:
+            log.writeline(row)
+    keys = [row[-1] for row in iter_log_rows(log.fp, resolve=False)]
+    assert len(set(keys)) == 2
+    assert read_snippets(log.fp, {keys[-1]}) == {keys[-1]: 'G2P2\twith tab'}
+
+
+def test_snippets_stored_once_beyond_recent(tmp_path):
+    """Snippets no longer among the most recent (held in memory) are still only stored once"""
+    log = SnippetFileWrapper('text.out', path=str(tmp_path), header=LOG_HEADER, recent_size=1)
+    with log:
+        for row in ROWS * 3:
+            log.writeline(row)
+        assert len(log.recent) == 1
+    snippets = Path(f'{log.fp}.snippets').read_text().splitlines()
+    assert len(snippets) == 3
+    assert all(len(line.split('\t')[0]) == 32 for line in snippets[1:])  # 128-bit keys
+    assert list(iter_log_rows(log.fp)) == ROWS * 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['text.out', 'text.out.snippets']  # index removed
@@ -0,0 +1,76 @@
+import io
+import json
+import threading
+
+import pytest
+
+import apex.stream
+from apex.main import get_algorithms
+from apex.stream import process_stream, ExpectedValues
+
+DOCUMENTS = [
+    {'name': 'a', 'text': 'IUD was located in the lower uterine segment.'},
+    {'name': 'b', 'text': 'Patient is breastfeeding. G2P2.', 'expected': 1},
+    {'name': 'c'},  # no text
+]
+
+EXPECTED = [
+    {'name': 'a', 'algorithm': 'iud_expulsion', 'value': 2, 'category': 'MALPOSITION', 'date': None, 'extras': ''},
+    {'name': 'a', 'algorithm': 'iud_expulsion', 'value': 12, 'category': 'LOWER_UTERINE_SEGMENT', 'date': None,
+     'extras': ''},
+    {'name': 'b', 'algorithm': 'breastfeeding', 'value': 1, 'category': 'BREASTFEEDING', 'date': None, 'extras': ''},
+]
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_stream(workers):
+    infile = io.StringIO('\n'.join([json.dumps(doc) for doc in DOCUMENTS] + ['not json', '']))
+    outfile = io.StringIO()
+    results = process_stream(infile, outfile, get_algorithms(['iud_expulsion', 'breastfeeding']),
+                             workers=workers, chunksize=1)
+    assert [json.loads(line) for line in outfile.getvalue().splitlines()] == EXPECTED
+    assert results['breastfeeding'].tp == 1
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_invalid_records_are_skipped(workers, caplog):
+    lines = ['[1, 2]', '"x"', '5', json.dumps({'name': 'd', 'text': 5}), json.dumps(DOCUMENTS[0])]
+    outfile = io.StringIO()
+    process_stream(io.StringIO('\n'.join(lines)), outfile, get_algorithms(['iud_expulsion']), workers=workers)
+    assert [json.loads(line)['name'] for line in outfile.getvalue().splitlines()] == ['a', 'a']
+    assert sum('Skipping line' in r.getMessage() for r in caplog.records) == 4
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_expected_values_not_kept(workers, monkeypatch):
+    truths = []
+
+    class Recorded(ExpectedValues):
+        def __init__(self):
+            super().__init__()
+            truths.append(self)
+
+    monkeypatch.setattr(apex.stream, 'ExpectedValues', Recorded)
+    lines = [json.dumps({'name': str(i), 'text': 'Patient is breastfeeding. G2P2.', 'expected': 1}) for i in range(50)]
+    results = process_stream(io.StringIO('\n'.join(lines)), io.StringIO(), get_algorithms(['breastfeeding']),
+                             workers=workers, chunksize=3)
+    assert results['breastfeeding'].tp == 50
+    assert truths == [{}]
+
+
+def test_output_not_held_by_slow_input():
+    """With workers, a finished document is written while waiting for the next input line"""
+    written = threading.Event()
+
+    class Output(io.StringIO):
+        def write(self, text):
+            written.set()
+            return super().write(text)
+
+    def lines():
+        yield json.dumps(DOCUMENTS[0])
+        yield json.dumps(DOCUMENTS[1]) if written.wait(timeout=30) else 'timed out'
+
+    outfile = Output()
+    process_stream(lines(), outfile, get_algorithms(['iud_expulsion', 'breastfeeding']), workers=2, chunksize=1)
+    assert [json.loads(line) for line in outfile.getvalue().splitlines()] == EXPECTED
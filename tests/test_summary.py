@@ -0,0 +1,66 @@
+import pytest
+
+import apex.io.out
+
+from apex.anlz.summary import SnippetSample, sample_log, sample_logs
+from apex.io.out import get_logging
+
+
+def _write_log(path, rows, kind='tsv'):
+    log = get_logging(str(path), kind=kind)
+    with log:
+        for row in rows:
+            log.writeline(row)
+    return log.fp
+
+
+def _rows(start, stop):
+    for i in range(start, stop):
+        yield [f'note{i}', 'iud_expulsion', 'MALPOSITION' if i % 3 else 'PARTIAL', '2', '{}', f'snippet {i % 50}']
+
+
+def test_sample_is_bounded_and_distinct():
+    sample = SnippetSample(5, seed=1)
+    for i in range(1000):
+        sample.add(f'snippet {i % 20}')
+    texts = sample.get_sample()
+    assert len(texts) == 5 == len(set(texts))
+    other = SnippetSample(5, seed=1)
+    for i in reversed(range(20)):  # order does not matter
+        other.add(f'snippet {i}')
+    assert other.get_sample() == texts
+    small = SnippetSample(25, seed=1)
+    for i in range(20):
+        small.add(f'snippet {i}')
+    assert len(small) == 20
+
+
+@pytest.mark.parametrize('kind', ['tsv', 'dedup'])
+def test_sample_log(tmp_path, kind):
+    samples = sample_log(_write_log(tmp_path, _rows(0, 300), kind), sample=10, seed=7)
+    assert list(samples) == ['iud_expulsion']
+    assert list(samples['iud_expulsion']) == ['PARTIAL', 'MALPOSITION']
+    assert all(len(s) == 10 for s in samples['iud_expulsion'].values())
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_sample_across_logs(tmp_path, workers):
+    (tmp_path / 'all').mkdir()
+    (tmp_path / 'shard0').mkdir()
+    (tmp_path / 'shard1').mkdir()
+    expected = sample_logs([_write_log(tmp_path / 'all', _rows(0, 300))], sample=10, seed=3)
+    paths = [_write_log(tmp_path / 'shard0', _rows(0, 120)), _write_log(tmp_path / 'shard1', _rows(120, 300))]
+    samples = sample_logs(paths, sample=10, seed=3, workers=workers)
+    assert {cat: s.get_sample() for cat, s in samples['iud_expulsion'].items()} == \
+           {cat: s.get_sample() for cat, s in expected['iud_expulsion'].items()}
+
+
+def test_sample_deduplicated_log(tmp_path, monkeypatch):
+    (tmp_path / 'tsv').mkdir()
+    (tmp_path / 'dedup').mkdir()
+    expected = sample_log(_write_log(tmp_path / 'tsv', _rows(0, 300)), sample=10, seed=5)
+    path = _write_log(tmp_path / 'dedup', _rows(0, 300), kind='dedup')
+    monkeypatch.setattr(apex.io.out, '_snippet_index', None)  # never resolve every row
+    samples = sample_log(path, sample=10, seed=5)
+    assert {cat: s.get_sample() for cat, s in samples['iud_expulsion'].items()} == \
+           {cat: s.get_sample() for cat, s in expected['iud_expulsion'].items()}
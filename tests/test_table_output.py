@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from apex.io.out import get_file_wrapper
+
+ROWS = [
+    ['note1', 'iud_expulsion', 2, 'MALPOSITION', None, ''],
+    ["note'2", 'parity', 1, 'PARITY', '2020-01-01', "G2P2 (patient's)"],  # quotes
+    ['note3', 'breastfeeding', 1, 'BREASTFEEDING', None, 'a "quote"'],
+]
+
+
+def _read(path):
+    with sqlite3.connect(path) as conn:
+        return [list(row) for row in conn.execute('SELECT * FROM results')]
+
+
+def test_batches(tmp_path):
+    path = str(tmp_path / 'results.db')
+    out = get_file_wrapper('results', kind='sql', connection_string=f'sqlite:///{path}', batch_size=2)
+    with out:
+        out.writeline(ROWS[0])
+        assert _read(path) == []
+        out.writeline(ROWS[1])
+        assert _read(path) == ROWS[:2]
+        out.writeline(ROWS[2])
+        assert _read(path) == ROWS[:2]
+    assert _read(path) == ROWS  # flushed on exit
+
+
+def test_flush_interval(tmp_path):
+    path = str(tmp_path / 'results.db')
+    out = get_file_wrapper('results', kind='sql', connection_string=f'sqlite:///{path}', flush_interval=0)
+    with out:
+        out.writeline(ROWS[0])
+        assert _read(path) == ROWS[:1]
+
+
+def test_flushed_on_error(tmp_path):
+    path = str(tmp_path / 'results.db')
+    out = get_file_wrapper('results', kind='sql', connection_string=f'sqlite:///{path}')
+    with pytest.raises(KeyboardInterrupt):
+        with out:
+            out.writeline(ROWS[0])
+            raise KeyboardInterrupt
+    assert _read(path) == ROWS[:1]
+
+
+def test_none_is_null(tmp_path):
+    path = str(tmp_path / 'results.db')
+    out = get_file_wrapper('results', kind='sql', connection_string=f'sqlite:///{path}')
+    with out:
+        out.writeline(ROWS[0])  # no date
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM results WHERE date IS NULL').fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM results WHERE date = 'None'").fetchone()[0] == 0
@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import apex.io.workqueue
+import apex.main
+import apex.runner
+from apex.anlz.import_timing import _get_env
+from apex.io.workqueue import WorkQueue, merge_queue, DONE, _get_chunk_lookup
+from apex.main import process
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'full_run')
+
+TEXTS = [
+    'IUD was located in the lower uterine segment.',
+    'Mirena inserted without difficulty.',
+    'Patient is breastfeeding. G2P2.',
+    'IUD expelled last week.',
+]
+
+
+class Crashed(Exception):
+    pass
+
+
+def _crash_after(func, n_docs):
+
+    def wrapper(*args, **kwargs):
+        completed = 0
+        for kind, line in func(*args, **kwargs):
+            yield kind, line
+            if kind == apex.main.DONE:
+                completed += line
+                if completed >= n_docs:
+                    raise Crashed()
+
+    return wrapper
+
+
+def _run(tmp_path, name, parallel=None, queue=None):
+    outdir = tmp_path / name
+    process(
+        corpus={
+            'directory': str(tmp_path / 'corpus'),
+            'connections': [{  # names also used by files
+                'name': 'example_text',
+                'connection_string': f'sqlite:///{os.path.join(PATH, "example.db")}',
+                'name_col': 'id',
+                'text_col': 'note_text',
+            }],
+        },
+        output={'name': 'output.csv', 'kind': 'csv', 'path': str(outdir)},
+        loginfo={'ignore': True},
+        parallel=parallel,
+        queue=queue,
+    )
+    return outdir
+
+
+def _get_final_results(caplog):
+    return [r.getMessage() for r in caplog.records if r.getMessage().startswith('Final results')][-1]
+
+
+@pytest.mark.parametrize('parallel', [None, {'workers': 2, 'chunksize': 2}])
+def test_crashed_worker_is_reclaimed(tmp_path, monkeypatch, caplog, parallel):
+    (tmp_path / 'corpus').mkdir()
+    for i in range(20):
+        (tmp_path / 'corpus' / f'{i}.txt').write_text(f'{TEXTS[i % len(TEXTS)]} Note {i}.')
+    expected = (_run(tmp_path, 'full') / 'output.csv').read_text()
+    expected_results = _get_final_results(caplog)
+    queue = {'path': str(tmp_path / 'queue.db'), 'chunksize': 3, 'lease': 0.5}
+    original = apex.main.process_serial
+    monkeypatch.setattr(apex.main, 'process_serial', _crash_after(original, 7))
+    with pytest.raises(Crashed):  # leaves its third chunk leased
+        _run(tmp_path, 'workers', queue=queue)
+    monkeypatch.setattr(apex.main, 'process_serial', original)
+    _run(tmp_path, 'workers', parallel, queue=queue)
+    with sqlite3.connect(queue['path']) as conn:
+        workers = [row[0] for row in conn.execute('SELECT worker FROM chunks ORDER BY id')]
+        assert len(workers) == 8  # 22 documents
+        assert len(set(workers[:2])) == 1 and len(set(workers)) == 2
+        assert conn.execute('SELECT MAX(attempts) FROM chunks').fetchone()[0] == 2
+    results = merge_queue(queue['path'], str(tmp_path / 'merged.csv'))
+    assert (tmp_path / 'merged.csv').read_text() == expected
+    assert f'Final results: {results}' == expected_results
+
+
+RUN_WORKER = '''
+import sys
+from apex.main import process
+process(corpus={'directory': sys.argv[1], 'connections': [{'name': 'example_text', 'connection_string': sys.argv[4],
+                                                            'name_col': 'id', 'text_col': 'note_text'}]},
+        output={'name': 'output.csv', 'kind': 'csv', 'path': sys.argv[2]},
+        loginfo={'ignore': True}, parallel={'workers': 2, 'chunksize': 50},
+        queue={'path': sys.argv[3], 'chunksize': 20, 'lease': 20})
+'''
+
+
+def test_parallel_workers_share_queue(tmp_path):
+    (tmp_path / 'corpus').mkdir()
+    for i in range(400):
+        (tmp_path / 'corpus' / f'{i}.txt').write_text(f'{TEXTS[i % len(TEXTS)]} Note {i}.')
+    expected = (_run(tmp_path, 'full') / 'output.csv').read_text()
+    queue = str(tmp_path / 'queue.db')
+    runs = [subprocess.Popen([sys.executable, '-c', RUN_WORKER, str(tmp_path / 'corpus'), str(tmp_path / name), queue,
+                              f'sqlite:///{os.path.join(PATH, "example.db")}'],
+                             env=_get_env(), stderr=subprocess.DEVNULL)
+            for name in ('worker1', 'worker2')]
+    for run in runs:
+        assert run.wait(timeout=90) == 0  # neither waits on the other's read-ahead
+    with sqlite3.connect(queue) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM chunks WHERE status!=?', (DONE,)).fetchone()[0] == 0
+    merge_queue(queue, str(tmp_path / 'merged.csv'))
+    assert (tmp_path / 'merged.csv').read_text() == expected
+
+
+def test_chunk_lookup(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'), chunksize=2)
+    queue.fill(iter([(position, f'doc{position}', None, None, 0) for position in (0, 3, 4, 9, 12)]))
+    chunk_of = _get_chunk_lookup(queue.conn)
+    assert [chunk_of(position) for position in (0, 3, 4, 9, 12)] == [0, 0, 1, 1, 2]
+    queue.close()
+
+
+def test_parallel_rounds_share_pool(tmp_path, monkeypatch, caplog):
+    """A parallel run which waits on other runs (in rounds) starts its pool and engines once"""
+    (tmp_path / 'corpus').mkdir()
+    for i in range(20):
+        (tmp_path / 'corpus' / f'{i}.txt').write_text(f'{TEXTS[i % len(TEXTS)]} Note {i}.')
+    expected = (_run(tmp_path, 'full') / 'output.csv').read_text()
+    calls = []
+    claim = WorkQueue.claim
+
+    def claim_in_rounds(self):  # as if waiting on another run every other claim
+        calls.append('claim')
+        if self.chunks and calls.count('claim') % 2:
+            return None
+        return claim(self)
+
+    def count(name, func):
+        def wrapper(*args, **kwargs):
+            calls.append(name)
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(WorkQueue, 'claim', claim_in_rounds)
+    monkeypatch.setattr(apex.main, 'create_pool', count('pool', apex.main.create_pool))
+    monkeypatch.setattr(apex.runner, 'create_pool', count('pool', apex.runner.create_pool))
+    monkeypatch.setattr(apex.io.workqueue, 'get_connection_engine',
+                        count('engine', apex.io.workqueue.get_connection_engine))
+    monkeypatch.setattr(apex.main, 'get_next_record_from_queue',
+                        count('round', apex.main.get_next_record_from_queue))
+    outdir = _run(tmp_path, 'workers', {'workers': 2, 'chunksize': 2},
+                  queue={'path': str(tmp_path / 'queue.db'), 'chunksize': 3})
+    assert calls.count('round') > 2
+    assert calls.count('pool') == 1
+    assert calls.count('engine') == 1
+    merge_queue(str(tmp_path / 'queue.db'), str(tmp_path / 'merged.csv'))
+    assert (tmp_path / 'merged.csv').read_text() == expected